@@ -1,4 +1,8 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager, nullcontext
+import asyncio
+import time
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.routers import (
     auth_routes,
@@ -6,8 +10,32 @@ from app.routers import (
     upload_routes,
     query_routes,
     viewer_routes,
+    document_routes,
+    metrics_routes,
+    admin_routes,
 )
+from app.services.llm_service import LLM_CLIENT
+from app.services.risk_report import RISK_REPORTS
+from app.services.warmup import READINESS, warm_up
+from app.services.metrics import REGISTRY
+from app.services.profiler import PROFILER
 
+HTTP_SECONDS = REGISTRY.histogram(
+    "aorisk_http_request_duration_seconds", "Durée des requêtes HTTP", ("method", "route", "status"),
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    RISK_REPORTS.attach(asyncio.get_running_loop())
+    # Index (BM25, catalogue) chargés avant d'accepter des requêtes
+    await READINESS.load_indexes()
+    # Warm-up des modèles et d'Ollama en tâche de fond: /healthz répond tout de suite, /readyz une fois prêt
+    warmup_task = asyncio.create_task(warm_up())
+    yield
+    if not warmup_task.done():
+        warmup_task.cancel()
+    await LLM_CLIENT.aclose()
 
 
 app = FastAPI(
@@ -15,6 +43,7 @@ app = FastAPI(
     description="API d'analyse DCE et détection de clauses critiques",
     version="1.0.0",
     root_path="/api",
+    lifespan=lifespan,
 )
 
 # CORS: autoriser le front Next.js en dev
@@ -29,13 +58,49 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def observe_requests(request: Request, call_next):
+    t0 = time.perf_counter()
+    status = 500
+    # Profil admin armé: les requêtes /query* comptent dans les N requêtes échantillonnées
+    # (l'ingestion est comptée par fichier dans le pool; pour un flux SSE, jusqu'aux en-têtes)
+    is_query = request.url.path.endswith(("/query", "/query/stream", "/query/batch"))
+    profiled = PROFILER.request("query") if is_query else nullcontext()
+    try:
+        with profiled:
+            response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Gabarit de route (ex: /documents/{document_id}) pour borner la cardinalité
+        route = request.scope.get("route")
+        HTTP_SECONDS.observe(
+            time.perf_counter() - t0,
+            method=request.method,
+            route=getattr(route, "path", "unmatched"),
+            status=str(status),
+        )
+
 @app.get("/")
 async def read_root():
     return {"message": "AO Risk est prêt."}
 
+@app.get("/healthz")
+async def healthz():
+    """Vivacité: le process répond (aucun modèle requis)."""
+    return {"status": "ok"}
+
+@app.get("/readyz")
+async def readyz():
+    """Disponibilité: 200 une fois le warm-up terminé (index, tokenizer, modèle d'embedding)."""
+    return JSONResponse(status_code=200 if READINESS.ready else 503, content=READINESS.to_dict())
+
 # Routes existantes
 app.include_router(auth_routes.router)
 app.include_router(protected.router)
 app.include_router(upload_routes.router)
 app.include_router(query_routes.router)
 app.include_router(viewer_routes.router)
+app.include_router(document_routes.router)
+app.include_router(metrics_routes.router)
+app.include_router(admin_routes.router)
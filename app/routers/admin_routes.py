@@ -0,0 +1,35 @@
+from fastapi import APIRouter, Depends, HTTPException
+from pydantic import BaseModel
+from typing import Optional
+
+from app.services.auth import get_admin_user
+from app.services.profiler import PROFILER
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(get_admin_user)])
+
+
+class ProfileRequest(BaseModel):
+    requests: int = 20
+    interval_ms: Optional[float] = None
+
+
+@router.post("/profiler")
+def start_profiler(payload: ProfileRequest):
+    """Profile les N prochaines requêtes (/query*, fichiers ingérés); piles dans PROFILE_DIR."""
+    try:
+        return PROFILER.arm(payload.requests, payload.interval_ms)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.get("/profiler")
+def profiler_status():
+    return PROFILER.status()
+
+
+@router.delete("/profiler")
+def stop_profiler():
+    """Arrêt anticipé: les piles déjà collectées sont écrites."""
+    return PROFILER.cancel()
@@ -0,0 +1,44 @@
+from fastapi import APIRouter, Depends, HTTPException
+from app.services.auth import get_user_if_required
+from app.services.catalog import get_catalog
+from app.services.vector_service import delete_document
+from app.services.risk_report import RISK_REPORTS, RISK_REPORT_ENABLED
+
+router = APIRouter(dependencies=[Depends(get_user_if_required)])
+
+@router.get("/documents")
+def list_documents():
+    catalog = get_catalog()
+    documents = catalog.list()
+    return {"count": len(documents), "documents": documents}
+
+
+@router.get("/documents/{document_id}")
+def get_document(document_id: str):
+    entry = get_catalog().get(document_id)
+    if not entry:
+        raise HTTPException(status_code=404, detail="Document inconnu")
+    return entry
+
+
+@router.delete("/documents/{document_id}")
+def remove_document(document_id: str):
+    if not delete_document(document_id):
+        raise HTTPException(status_code=404, detail="Document inconnu")
+    RISK_REPORTS.remove(document_id)
+    return {"document_id": document_id, "deleted": True}
+
+
+@router.get("/documents/{document_id}/risk-report")
+def get_risk_report(document_id: str):
+    """Rapport de risques pré-calculé (checklist évaluée après indexation)."""
+    if document_id not in get_catalog():
+        raise HTTPException(status_code=404, detail="Document inconnu")
+    report = RISK_REPORTS.get(document_id)
+    if report is not None:
+        return report
+    if RISK_REPORTS.is_pending(document_id):
+        return {"document_id": document_id, "status": "pending", "entries": []}
+    if not RISK_REPORT_ENABLED:
+        raise HTTPException(status_code=404, detail="Rapports de risques désactivés (RISK_REPORT_ENABLED)")
+    raise HTTPException(status_code=404, detail="Rapport non disponible")
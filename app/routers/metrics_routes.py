@@ -0,0 +1,59 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.services.metrics import REGISTRY
+from app.services.embedder import QUERY_CACHE
+from app.services.answer_cache import ANSWER_CACHE
+from app.services.flat_index import FLAT_CACHE
+from app.services.llm_scheduler import LLM_SCHEDULER
+from app.services.jobs import JOBS
+from app.services.bm25_service import BM25_GLOBAL
+from app.services.catalog import CATALOG
+from app.services.warmup import READINESS
+
+router = APIRouter()
+
+
+def _cache_samples():
+    caches = {
+        "query_embedding": QUERY_CACHE.stats(),
+        "answer": ANSWER_CACHE.stats(),
+        "flat_index": FLAT_CACHE.stats(),
+    }
+    for name, stats in caches.items():
+        hits = stats.get("hits", 0) + stats.get("disk_hits", 0) + stats.get("semantic_hits", 0)
+        lookups = hits + stats.get("misses", 0)
+        yield (name, "hits"), hits
+        yield (name, "misses"), stats.get("misses", 0)
+        yield (name, "hit_rate"), (hits / lookups) if lookups else 0.0
+
+
+def _queue_samples():
+    llm = LLM_SCHEDULER.stats()
+    yield ("llm", "active"), llm["active"]
+    yield ("llm", "waiting"), llm["waiting"]
+    yield ("ingestion", "pending"), JOBS.pending()
+
+
+REGISTRY.callback(
+    "aorisk_cache", "Caches: hits, misses et taux de succès", ("cache", "value"), _cache_samples,
+)
+REGISTRY.callback(
+    "aorisk_queue_depth", "Profondeur des files (LLM: en cours / en attente; ingestion: jobs)", ("queue", "state"), _queue_samples,
+)
+REGISTRY.callback(
+    "aorisk_llm_rejected_total", "Requêtes refusées par l'admission LLM", (), lambda: [((), LLM_SCHEDULER.rejected)], kind="counter",
+)
+REGISTRY.callback(
+    "aorisk_index_size", "Taille des index (documents du catalogue, chunks BM25)", ("index",),
+    lambda: [(("documents",), len(CATALOG)), (("bm25_chunks",), len(BM25_GLOBAL))],
+)
+REGISTRY.callback(
+    "aorisk_ready", "1 une fois le warm-up terminé", (), lambda: [((), 1 if READINESS.ready else 0)],
+)
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métriques au format texte Prometheus."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -1,9 +1,21 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+import asyncio
+import json
 
-from app.services.retriever import retrieve_top_chunks
-from app.services.rag_engine import generate_answer
+from app.services.retriever import retrieve_top_chunks, retrieve_top_chunks_batch
+from app.services.rag_engine import (
+    generate_answer,
+    generate_answer_stream,
+    generate_answers_batch,
+    QUERY_BATCH_MAX_QUESTIONS,
+)
+from app.services.llm_service import LLMError
+from app.services.llm_scheduler import LLM_SCHEDULER, LLMBusyError
+from app.services.tracing import start_trace, trace_requested
 
 router = APIRouter()
 
@@ -13,20 +25,70 @@ class QueryRequest(BaseModel):
     question: str
     document_id: str  
 
+class QueryBatchRequest(BaseModel):
+    questions: List[str]
+    document_id: str
+
 class QueryResponse(BaseModel):
     question: str
     answer: Dict[str, Any]
     sources: list[Dict[str, Any]]
+    # Arbre des étapes (durées, tailles) si ?trace=1 ou en-tête X-Trace: 1
+    trace: Optional[Dict[str, Any]] = None
+
+def _build_sources(metadatas: List[Dict[str, Any]], ids: List[str]) -> List[Dict[str, Any]]:
+    sources = []
+    for meta, cid in zip(metadatas, ids):
+        sources.append({
+            "id": cid,
+            "filename": meta.get("filename", "inconnu"),
+            "document_id": meta.get("document_id", "inconnu"),
+            "chunk_index": meta.get("chunk_index"),
+            "doc_type": meta.get("doc_type", "non précisé"),
+        })
+    return sources
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+async def _cancel_on_disconnect(request: Request, coro):
+    """Exécute `coro` mais l'annule si le client se déconnecte (ex: requête en file LLM)."""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=0.5)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                print("[QUERY] client déconnecté, requête annulée")
+                raise HTTPException(status_code=499, detail="Client déconnecté")
+    finally:
+        if not task.done():
+            task.cancel()
+
+def _busy_exception(e: LLMBusyError) -> HTTPException:
+    return HTTPException(status_code=503, detail=e.to_dict(), headers={"Retry-After": str(e.retry_after)})
 
-# Endpoint
+# Endpoints
 
 @router.post("/query", response_model=QueryResponse)
-async def query_endpoint(payload: QueryRequest):
+async def query_endpoint(payload: QueryRequest, request: Request):
+    with start_trace("query", enabled=trace_requested(request), document_id=payload.document_id) as trace:
+        response = await _answer_query(payload, request)
+        if trace is not None:
+            response.trace = trace.to_dict()
+        return response
+
+
+async def _answer_query(payload: QueryRequest, request: Request) -> QueryResponse:
     try:
         if not payload.document_id:
             raise HTTPException(status_code=400, detail="document_id requis")
-        # 1) Récupération des chunks pertinents (une seule fois ici)
-        chunks, metadatas, ids, params = retrieve_top_chunks(
+        # 1) Récupération des chunks pertinents (une seule fois ici), hors boucle d'événements:
+        #    embedding + BM25 sont synchrones et bloqueraient les autres requêtes
+        chunks, metadatas, ids, params = await run_in_threadpool(
+            retrieve_top_chunks,
             payload.question,
             target_doc_id=payload.document_id,
         )
@@ -38,25 +100,18 @@ async def query_endpoint(payload: QueryRequest):
                 sources=[]
             )
 
-        # 2) Génération de la réponse via RAG sans re-récupérer
-        answer = await generate_answer(
+        # 2) Génération de la réponse via RAG sans re-récupérer (passe par la file LLM)
+        LLM_SCHEDULER.check_admission()
+        answer = await _cancel_on_disconnect(request, generate_answer(
             payload.question,
             payload.document_id,
             chunks=chunks,
             metas=metadatas,
             ids=ids,
-        )
+        ))
 
         # 3) Préparation des sources
-        sources = []
-        for meta, cid in zip(metadatas, ids):
-            sources.append({
-                "id": cid,
-                "filename": meta.get("filename", "inconnu"),
-                "document_id": meta.get("document_id", "inconnu"),
-                "chunk_index": meta.get("chunk_index"),
-                "doc_type": meta.get("doc_type", "non précisé"),
-            })
+        sources = _build_sources(metadatas, ids)
 
         return QueryResponse(
             question=payload.question,
@@ -64,5 +119,124 @@ async def query_endpoint(payload: QueryRequest):
             sources=sources
         )
 
+    except HTTPException:
+        raise
+    except LLMBusyError as e:
+        raise _busy_exception(e)
+    except LLMError as e:
+        raise HTTPException(status_code=504 if e.kind == "timeout" else 502, detail=e.to_dict())
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Erreur interne: {str(e)}")
+
+
+@router.post("/query/stream")
+async def query_stream_endpoint(payload: QueryRequest, request: Request):
+    """Server-Sent Events: `sources`, puis `token`* au fil de la génération, puis `done`."""
+    if not payload.document_id:
+        raise HTTPException(status_code=400, detail="document_id requis")
+    try:
+        LLM_SCHEDULER.check_admission()
+    except LLMBusyError as e:
+        raise _busy_exception(e)
+
+    chunks, metadatas, ids, _ = await run_in_threadpool(
+        retrieve_top_chunks,
+        payload.question,
+        target_doc_id=payload.document_id,
+    )
+
+    async def events():
+        yield _sse("sources", {"question": payload.question, "sources": _build_sources(metadatas, ids)})
+        if not chunks:
+            yield _sse("done", {"reponse": "❌ Aucun extrait trouvé", "used_chunks": 0, "source": {}})
+            return
+        stream = generate_answer_stream(payload.question, payload.document_id, chunks=chunks, metas=metadatas, ids=ids)
+        try:
+            async for kind, value in stream:
+                if kind == "queue":
+                    # Position dans la file LLM (affichée par le front)
+                    yield _sse("queue", {"position": value})
+                elif kind == "token":
+                    # Client parti: on arrête la génération (fermeture du flux Ollama)
+                    if await request.is_disconnected():
+                        print("[QUERY][STREAM] client déconnecté, arrêt de la génération")
+                        return
+                    yield _sse("token", {"text": value})
+                else:
+                    yield _sse("done", value)
+        except (LLMError, LLMBusyError) as e:
+            yield _sse("error", {"detail": e.to_dict()})
+        except Exception as e:
+            yield _sse("error", {"detail": f"Erreur interne: {str(e)}"})
+        finally:
+            await stream.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Pas de buffering côté nginx pour que les tokens arrivent immédiatement
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/query/batch")
+async def query_batch_endpoint(payload: QueryBatchRequest, request: Request):
+    """Checklist de questions sur un document, en Server-Sent Events:
+    un `result` (ou `error`) par question dans l'ordre de fin, puis `done`."""
+    if not payload.document_id:
+        raise HTTPException(status_code=400, detail="document_id requis")
+    questions = [q.strip() for q in payload.questions if q and q.strip()]
+    if not questions:
+        raise HTTPException(status_code=400, detail="Aucune question")
+    if len(questions) > QUERY_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"Au plus {QUERY_BATCH_MAX_QUESTIONS} questions par lot")
+    try:
+        LLM_SCHEDULER.check_admission()
+    except LLMBusyError as e:
+        raise _busy_exception(e)
+
+    # Embeddings en un appel modèle + recherche hybride de toutes les questions en une passe
+    retrievals = await run_in_threadpool(
+        retrieve_top_chunks_batch,
+        questions,
+        target_doc_id=payload.document_id,
+    )
+
+    async def events():
+        errors = 0
+        results = generate_answers_batch(questions, payload.document_id, retrievals)
+        try:
+            async for idx, answer, error in results:
+                if await request.is_disconnected():
+                    print("[QUERY][BATCH] client déconnecté, arrêt du lot")
+                    return
+                _, metadatas, ids, _ = retrievals[idx]
+                if error is None:
+                    yield _sse("result", {
+                        "index": idx,
+                        "question": questions[idx],
+                        "answer": answer,
+                        "sources": _build_sources(metadatas, ids),
+                    })
+                    continue
+                errors += 1
+                if isinstance(error, (LLMError, LLMBusyError)):
+                    detail = error.to_dict()
+                else:
+                    detail = f"Erreur interne: {str(error)}"
+                yield _sse("error", {"index": idx, "question": questions[idx], "detail": detail})
+            yield _sse("done", {"count": len(questions), "errors": errors})
+        finally:
+            await results.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/llm/queue")
+def llm_queue_status():
+    """Charge courante du LLM: requêtes en cours, en attente, limites."""
+    return LLM_SCHEDULER.stats()
@@ -1,61 +1,32 @@
-from fastapi import APIRouter, File, UploadFile, Depends, HTTPException
+from fastapi import APIRouter, File, UploadFile, Depends, HTTPException, Request
 from typing import List
 from app.services.auth import get_user_if_required
-from app.services.parsers import extract_text_from_file
-from app.services.classifier import classify_piece
-from app.services.vector_service import index_document_in_chroma
-import uuid
-import os
-import json
+from app.services.jobs import JOBS, QueueFullError
+from app.services.tracing import trace_requested
 
 router = APIRouter()
 
-@router.post("/upload-index", dependencies=[Depends(get_user_if_required)])
-async def upload_and_index(files: List[UploadFile] = File(...)):
-    results = []
-
+@router.post("/upload-index", status_code=202, dependencies=[Depends(get_user_if_required)])
+async def upload_and_index(request: Request, files: List[UploadFile] = File(...)):
+    payloads = []
     for file in files:
         if not (file.filename or "").lower().endswith(".pdf"):
             raise HTTPException(status_code=400, detail="Fichier non PDF.")
+        payloads.append((file.filename, await file.read()))
 
-        # 🔹 Générer un ID unique
-        document_id = str(uuid.uuid4())
-
-        # 1️⃣ Extraction texte et pages
-        extracted = extract_text_from_file(file)
-        full_text = extracted["full_text"]
-        pages_data = extracted["pages"]
-
-        # Sauvegarder texte brut
-        os.makedirs("storage", exist_ok=True)
-        with open(f"storage/{document_id}.txt", "w", encoding="utf-8") as f:
-            f.write(full_text)
-
-        # Sauvegarder pages
-        with open(f"storage/{document_id}_pages.json", "w", encoding="utf-8") as f:
-            json.dump(pages_data, f, ensure_ascii=False, indent=2)
-
-        # Sauvegarder le PDF original pour l'affichage (#page=)
-        try:
-            file.file.seek(0)
-            with open(f"storage/{document_id}.pdf", "wb") as out:
-                out.write(file.file.read())
-        except Exception as e:
-            print(f"[UPLOAD][WARN] Impossible de sauvegarder le PDF original: {e}")
-
-        # 2️⃣ Classification
-        doc_type = classify_piece(full_text)
+    # Extraction, OCR, chunking, embeddings et indexation tournent dans le pool d'ingestion;
+    # avec ?trace=1 les arbres d'étapes sont renvoyés par /jobs/{job_id} ("traces")
+    try:
+        job = JOBS.submit(payloads, trace=trace_requested(request))
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
-        # 3️⃣ Indexation dans ChromaDB (avec doc_type et retour chunks)
-        chunk_count = index_document_in_chroma(document_id, full_text, doc_type, file.filename, pages=pages_data)
+    return {"status": "queued", "job_id": job.id, "status_url": f"/jobs/{job.id}"}
 
-        # 4️⃣ Ajouter au résultat
-        results.append({
-            "filename": file.filename,
-            "document_id": document_id,
-            "type": doc_type,
-            "chunks": chunk_count,  
-            "indexed": True
-        })
 
-    return {"status": "success", "results": results}
+@router.get("/jobs/{job_id}", dependencies=[Depends(get_user_if_required)])
+def get_job(job_id: str):
+    job = JOBS.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job inconnu")
+    return job.to_dict()
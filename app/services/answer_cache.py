@@ -0,0 +1,165 @@
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
+import copy
+import hashlib
+import os
+import threading
+import time
+import numpy as np
+
+from app.services.embedding_cache import normalize_query
+
+# Cache des réponses LLM: même document + même question normalisée + mêmes chunks + même modèle
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "512"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+# Niveau sémantique optionnel: questions paraphrasées sur le même document
+ANSWER_CACHE_SEMANTIC = os.getenv("ANSWER_CACHE_SEMANTIC", "false").lower() == "true"
+ANSWER_CACHE_SEMANTIC_THRESHOLD = float(os.getenv("ANSWER_CACHE_SEMANTIC_THRESHOLD", "0.95"))
+
+
+class _Entry:
+    def __init__(self, document_id: str, model: str, answer: Dict[str, Any], expires_at: float, embedding: Optional[np.ndarray]):
+        self.document_id = document_id
+        self.model = model
+        self.answer = answer
+        self.expires_at = expires_at
+        self.embedding = embedding
+
+
+class AnswerCache:
+    """LRU à TTL des réponses, invalidable par document.
+
+    Clé exacte: (document_id, question normalisée, ensemble des ids de chunks, modèle).
+    Niveau sémantique (optionnel): sur le même document et le même modèle, une question
+    dont l'embedding est assez proche d'une question déjà répondue réutilise sa réponse.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl: float,
+        semantic: bool = False,
+        semantic_threshold: float = 0.95,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.semantic = semantic
+        self.semantic_threshold = semantic_threshold
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._by_document: Dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(document_id: Optional[str], question: str, ids: List[str], model: str) -> str:
+        raw = "\x1f".join([document_id or "*", normalize_query(question), ",".join(sorted(ids)), model])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            keys = self._by_document.get(entry.document_id)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_document[entry.document_id]
+
+    def _semantic_lookup(self, document_id: str, model: str, embedding: np.ndarray) -> Optional[Tuple[str, _Entry]]:
+        best: Optional[Tuple[float, str, _Entry]] = None
+        for key in self._by_document.get(document_id, ()):
+            entry = self._entries[key]
+            if entry.embedding is None or entry.model != model:
+                continue
+            sim = float(entry.embedding @ embedding)
+            if sim >= self.semantic_threshold and (best is None or sim > best[0]):
+                best = (sim, key, entry)
+        return (best[1], best[2]) if best else None
+
+    def get(
+        self,
+        document_id: Optional[str],
+        question: str,
+        ids: List[str],
+        model: str,
+        embed: Optional[Callable[[str], List[float]]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        key = self.make_key(document_id, question, ids, model)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at < now:
+                self._drop(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry.answer)
+
+        if self.semantic and document_id and embed is not None:
+            vec = self._unit(embed(question))
+            with self._lock:
+                found = self._semantic_lookup(document_id, model, vec)
+                if found and found[1].expires_at >= now:
+                    self._entries.move_to_end(found[0])
+                    self.semantic_hits += 1
+                    return copy.deepcopy(found[1].answer)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(
+        self,
+        document_id: Optional[str],
+        question: str,
+        ids: List[str],
+        model: str,
+        answer: Dict[str, Any],
+        embed: Optional[Callable[[str], List[float]]] = None,
+    ) -> None:
+        if self.max_entries <= 0:
+            return
+        key = self.make_key(document_id, question, ids, model)
+        embedding = self._unit(embed(question)) if (self.semantic and embed is not None) else None
+        entry = _Entry(document_id or "*", model, copy.deepcopy(answer), time.time() + self.ttl, embedding)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = entry
+            self._by_document.setdefault(entry.document_id, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    def invalidate_document(self, document_id: str) -> int:
+        """Oublie toutes les réponses d'un document (ré-indexation ou suppression)."""
+        with self._lock:
+            keys = list(self._by_document.get(document_id, ()))
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    @staticmethod
+    def _unit(vec) -> np.ndarray:
+        v = np.asarray(vec, dtype=np.float32)
+        return v / max(float(np.linalg.norm(v)), 1e-12)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.semantic_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_entries,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": ((self.hits + self.semantic_hits) / lookups) if lookups else 0.0,
+        }
+
+
+ANSWER_CACHE = AnswerCache(
+    ANSWER_CACHE_SIZE,
+    ANSWER_CACHE_TTL,
+    semantic=ANSWER_CACHE_SEMANTIC,
+    semantic_threshold=ANSWER_CACHE_SEMANTIC_THRESHOLD,
+)
@@ -1,4 +1,5 @@
 from datetime import datetime, timedelta
+from functools import lru_cache
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException
@@ -13,16 +14,19 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-# Fake user (MVP only)
-fake_user = {
-    "username": "admin",
-    "hashed_password": pwd_context.hash("admin123")
-}
+# Fake user (MVP only) — hash bcrypt calculé au premier login, pas à l'import
+@lru_cache(maxsize=1)
+def get_fake_user() -> dict:
+    return {
+        "username": "admin",
+        "hashed_password": pwd_context.hash("admin123")
+    }
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
 def authenticate_user(username: str, password: str) -> bool:
+    fake_user = get_fake_user()
     return (
         username == fake_user["username"]
         and verify_password(password, fake_user["hashed_password"])
@@ -61,3 +65,13 @@ def get_user_if_required(token: str | None = Depends(oauth2_scheme)) -> str:
         return username
     except JWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+
+
+def get_admin_user(token: str | None = Depends(oauth2_scheme)) -> str:
+    """Routes d'administration (profilage): token obligatoire, même si AUTH_REQUIRED=false."""
+    if not token:
+        raise HTTPException(status_code=401, detail="Token requis")
+    username = get_current_user(token)
+    if username != get_fake_user()["username"]:
+        raise HTTPException(status_code=403, detail="Réservé à l'administrateur")
+    return username
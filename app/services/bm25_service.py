@@ -1,41 +1,366 @@
 from __future__ import annotations
-from typing import List, Dict, Any
-from rank_bm25 import BM25Okapi
+from typing import List, Dict, Any, Tuple, Iterable, Optional
+from collections import Counter
+import json
+import math
+import os
 import re
+import shutil
+import threading
+import uuid
+import numpy as np
 
 # Tokenizer simple FR/EN
 _tok = re.compile(r"[A-Za-zÀ-ÖØ-öø-ÿ0-9]+", re.UNICODE)
 
+# Segments persistés à côté de ./chroma_db
+BM25_INDEX_DIR = os.getenv("BM25_INDEX_DIR", "./bm25_index")
+SEGMENT_FORMAT_VERSION = 1
+
+
+class _Segment:
+    """Index inversé figé d'un lot de chunks (un document en pratique).
+
+    Format (mémoire et disque): dictionnaire de termes term -> (offset, n) dans
+    deux tableaux de postings concaténés (indices locaux, tf), plus la longueur
+    de chaque chunk. Sur disque, les tableaux sont des .npy ouverts en mmap et
+    les textes/métadonnées des chunks ne sont chargés qu'au premier résultat.
+    """
+
+    def __init__(
+        self,
+        ids: List[str],
+        document_ids: List[Optional[str]],
+        doc_len: np.ndarray,
+        terms: Dict[str, Tuple[int, int]],
+        post_idx: np.ndarray,
+        post_tf: np.ndarray,
+        docs: Optional[List[str]] = None,
+        metas: Optional[List[Dict[str, Any]]] = None,
+        path: Optional[str] = None,
+    ):
+        self.ids = ids
+        self.document_ids = document_ids
+        self.doc_len = doc_len
+        self.terms = terms
+        self.post_idx = post_idx
+        self.post_tf = post_tf
+        self.path = path
+        self._docs = docs
+        self._metas = metas
+
+        # Partition par document_id: indices locaux des chunks de chaque document
+        by_doc: Dict[Optional[str], List[int]] = {}
+        for i, d in enumerate(document_ids):
+            by_doc.setdefault(d, []).append(i)
+        self.by_document: Dict[Optional[str], np.ndarray] = {
+            d: np.asarray(idxs, dtype=np.int32) for d, idxs in by_doc.items()
+        }
+
+    @classmethod
+    def build(cls, ids: List[str], docs: List[str], metas: List[Dict[str, Any]], tokenized: List[List[str]]) -> "_Segment":
+        raw: Dict[str, Tuple[List[int], List[int]]] = {}
+        for local_idx, toks in enumerate(tokenized):
+            for term, tf in Counter(toks).items():
+                idxs, tfs = raw.setdefault(term, ([], []))
+                idxs.append(local_idx)
+                tfs.append(tf)
+
+        terms: Dict[str, Tuple[int, int]] = {}
+        flat_idx: List[int] = []
+        flat_tf: List[int] = []
+        for term in sorted(raw):
+            idxs, tfs = raw[term]
+            terms[term] = (len(flat_idx), len(idxs))
+            flat_idx.extend(idxs)
+            flat_tf.extend(tfs)
+
+        return cls(
+            ids=ids,
+            document_ids=[(m or {}).get("document_id") for m in metas],
+            doc_len=np.asarray([len(toks) for toks in tokenized], dtype=np.float32),
+            terms=terms,
+            post_idx=np.asarray(flat_idx, dtype=np.int32),
+            post_tf=np.asarray(flat_tf, dtype=np.float32),
+            docs=docs,
+            metas=metas,
+        )
+
+    def save(self, path: str):
+        """Écrit le segment dans `path` (écriture dans un dossier temporaire puis rename atomique)."""
+        tmp = f"{path}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, "doc_len.npy"), self.doc_len)
+        np.save(os.path.join(tmp, "post_idx.npy"), self.post_idx)
+        np.save(os.path.join(tmp, "post_tf.npy"), self.post_tf)
+        with open(os.path.join(tmp, "segment.json"), "w", encoding="utf-8") as f:
+            json.dump({
+                "version": SEGMENT_FORMAT_VERSION,
+                "ids": self.ids,
+                "document_ids": self.document_ids,
+                "terms": list(self.terms),
+                "offsets": [list(v) for v in self.terms.values()],
+            }, f, ensure_ascii=False)
+        with open(os.path.join(tmp, "chunks.json"), "w", encoding="utf-8") as f:
+            json.dump({"docs": self.docs, "metas": self.metas}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        self.path = path
+
+    @classmethod
+    def load(cls, path: str) -> "_Segment":
+        with open(os.path.join(path, "segment.json"), "r", encoding="utf-8") as f:
+            head = json.load(f)
+        if head.get("version") != SEGMENT_FORMAT_VERSION:
+            raise ValueError(f"Version de segment non supportée: {head.get('version')}")
+        return cls(
+            ids=head["ids"],
+            document_ids=head["document_ids"],
+            doc_len=np.load(os.path.join(path, "doc_len.npy"), mmap_mode="r"),
+            terms={t: (o, n) for t, (o, n) in zip(head["terms"], head["offsets"])},
+            post_idx=np.load(os.path.join(path, "post_idx.npy"), mmap_mode="r"),
+            post_tf=np.load(os.path.join(path, "post_tf.npy"), mmap_mode="r"),
+            path=path,
+        )
+
+    def _load_chunks(self):
+        with open(os.path.join(self.path, "chunks.json"), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        self._docs, self._metas = data["docs"], data["metas"]
+
+    @property
+    def docs(self) -> List[str]:
+        if self._docs is None:
+            self._load_chunks()
+        return self._docs
+
+    @property
+    def metas(self) -> List[Dict[str, Any]]:
+        if self._metas is None:
+            self._load_chunks()
+        return self._metas
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def score(self, idfs: Dict[str, float], k1: float, b: float, avgdl: float) -> np.ndarray:
+        scores = np.zeros(len(self), dtype=np.float32)
+        norm = k1 * (1 - b + b * self.doc_len / avgdl)
+        for term, idf in idfs.items():
+            entry = self.terms.get(term)
+            if entry is None:
+                continue
+            off, n = entry
+            idxs = self.post_idx[off:off + n]
+            tfs = self.post_tf[off:off + n]
+            # Un terme n'apparaît qu'une fois par chunk dans ses postings: pas de doublons dans idxs
+            scores[idxs] += idf * tfs * (k1 + 1) / (tfs + norm[idxs])
+        return scores
+
+
 class BM25Store:
-    def __init__(self):
-        self.docs: List[str] = []
-        self.metas: List[Dict[str, Any]] = []
-        self.ids: List[str] = []
-        self._bm25: BM25Okapi | None = None
+    """Index BM25 incrémental, partitionné par document.
+
+    Chaque `add_batch` ne tokenise que les nouveaux chunks et produit un segment;
+    les statistiques du corpus (N, longueur totale, df) sont mises à jour en
+    O(termes du lot), l'IDF est calculé à la requête à partir du df courant.
+    Une requête ciblée (`document_ids`) ne score que les segments de ces documents.
+    Si `index_dir` est défini, chaque segment y est persisté et `load()` le rouvre en mmap.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75, index_dir: Optional[str] = None):
+        self.k1 = k1
+        self.b = b
+        self.index_dir = index_dir
+        self._segments: List[_Segment] = []
+        self._doc_segments: Dict[str, List[_Segment]] = {}
+        self._df: Dict[str, int] = {}
+        self._n_docs = 0
+        self._total_len = 0
+        self._lock = threading.Lock()
 
     def _tokenize(self, s: str) -> List[str]:
         return [w.lower() for w in _tok.findall(s)]
 
+    def __len__(self) -> int:
+        return self._n_docs
+
+    def document_ids(self) -> set[str]:
+        return {d for d in self._doc_segments if d}
+
+    def _register(self, segment: _Segment):
+        with self._lock:
+            for term, (_, n) in segment.terms.items():
+                self._df[term] = self._df.get(term, 0) + n
+            self._n_docs += len(segment)
+            self._total_len += int(segment.doc_len.sum())
+            self._segments = self._segments + [segment]
+            for doc_id in segment.by_document:
+                self._doc_segments[doc_id] = self._doc_segments.get(doc_id, []) + [segment]
+
+    def _unregister(self, segment: _Segment):
+        # Appelé sous self._lock
+        for term, (_, n) in segment.terms.items():
+            left = self._df.get(term, 0) - n
+            if left > 0:
+                self._df[term] = left
+            else:
+                self._df.pop(term, None)
+        self._n_docs -= len(segment)
+        self._total_len -= int(segment.doc_len.sum())
+        self._segments = [s for s in self._segments if s is not segment]
+        for doc_id in segment.by_document:
+            left_segs = [s for s in self._doc_segments.get(doc_id, []) if s is not segment]
+            if left_segs:
+                self._doc_segments[doc_id] = left_segs
+            else:
+                self._doc_segments.pop(doc_id, None)
+
+    def remove_document(self, document_id: str) -> int:
+        """Retire les chunks d'un document (segments supprimés du disque; les éventuels
+        autres documents d'un segment mixte sont ré-indexés dans un nouveau segment)."""
+        with self._lock:
+            segments = list(self._doc_segments.get(document_id, []))
+            for seg in segments:
+                self._unregister(seg)
+        removed = 0
+        for seg in segments:
+            keep = [i for i, d in enumerate(seg.document_ids) if d != document_id]
+            removed += len(seg) - len(keep)
+            if keep:
+                self.add_batch([seg.ids[i] for i in keep], [seg.docs[i] for i in keep], [seg.metas[i] for i in keep])
+            if seg.path:
+                shutil.rmtree(seg.path, ignore_errors=True)
+        return removed
+
     def add_batch(self, ids: List[str], docs: List[str], metas: List[Dict[str, Any]]):
-        self.ids.extend(ids)
-        self.docs.extend(docs)
-        self.metas.extend(metas)
-        tokenized = [self._tokenize(d) for d in self.docs]
-        self._bm25 = BM25Okapi(tokenized)
-
-    def query(self, text: str, top_k: int = 20):
-        if not self._bm25 or not self.docs:
+        if not ids:
+            return
+        tokenized = [self._tokenize(d) for d in docs]
+        segment = _Segment.build(list(ids), list(docs), list(metas), tokenized)
+        self._register(segment)
+        if self.index_dir:
+            try:
+                os.makedirs(self.index_dir, exist_ok=True)
+                segment.save(os.path.join(self.index_dir, f"seg_{uuid.uuid4().hex}"))
+            except Exception as e:
+                print(f"[BM25][WARN] Persistance du segment impossible: {e}")
+
+    def stored_document_ids(self) -> set[str]:
+        """Documents des segments présents sur disque (en-têtes lus, postings non chargés)."""
+        found: set[str] = set()
+        if not self.index_dir or not os.path.isdir(self.index_dir):
+            return found
+        for name in os.listdir(self.index_dir):
+            if not name.startswith("seg_") or name.endswith(".tmp"):
+                continue
+            try:
+                with open(os.path.join(self.index_dir, name, "segment.json"), "r", encoding="utf-8") as f:
+                    found.update(d for d in json.load(f).get("document_ids") or [] if d)
+            except Exception as e:
+                print(f"[BM25][WARN] En-tête de segment illisible {name}: {e}")
+        return found
+
+    def load(self, keep_document_ids: Optional[Iterable[str]] = None) -> int:
+        """Charge les segments présents dans `index_dir`.
+
+        Si `keep_document_ids` est fourni, les segments ne contenant aucun de ces
+        documents sont considérés obsolètes et supprimés du disque; dans un segment
+        conservé, les documents absents de la liste sont retirés (df/avgdl à jour).
+        Retourne le nombre de segments chargés.
+        """
+        if not self.index_dir or not os.path.isdir(self.index_dir):
+            return 0
+        keep = set(keep_document_ids) if keep_document_ids is not None else None
+        loaded = 0
+        stale: set[str] = set()
+        for name in sorted(os.listdir(self.index_dir)):
+            path = os.path.join(self.index_dir, name)
+            if not name.startswith("seg_") or name.endswith(".tmp"):
+                continue
+            # Segment déjà en mémoire (écrit par un add_batch concurrent): ne pas le compter deux fois
+            if any(seg.path == path for seg in self._segments):
+                continue
+            try:
+                segment = _Segment.load(path)
+            except Exception as e:
+                print(f"[BM25][WARN] Segment illisible ignoré {name}: {e}")
+                continue
+            if keep is not None and not keep.intersection(segment.by_document):
+                print(f"[BM25] Segment obsolète supprimé: {name}")
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            self._register(segment)
+            loaded += 1
+            if keep is not None:
+                stale.update(d for d in segment.by_document if d and d not in keep)
+        # Documents supprimés pendant l'arrêt: segment réécrit sans eux
+        for document_id in sorted(stale):
+            removed = self.remove_document(document_id)
+            print(f"[BM25] Document obsolète retiré: {document_id} | chunks={removed}")
+        return loaded
+
+    def _idf(self, term: str) -> float:
+        # Variante non négative (Lucene) de l'IDF BM25
+        df = self._df.get(term, 0)
+        return math.log1p((self._n_docs - df + 0.5) / (df + 0.5))
+
+    def query(self, text: str, top_k: int = 20, document_ids: Optional[Iterable[str]] = None):
+        """Top-k BM25. Si `document_ids` est fourni, seuls les chunks de ces documents sont scorés."""
+        if not self._n_docs or top_k <= 0:
+            return []
+        terms = set(self._tokenize(text))
+        idfs = {t: self._idf(t) for t in terms if t in self._df}
+        if not idfs:
             return []
-        tokens = self._tokenize(text)
-        scores = self._bm25.get_scores(tokens)
-        # top_k indices
-        idxs = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
-        return [{"id": self.ids[i], "score": float(scores[i]), "metadata": self.metas[i], "document": self.docs[i]} for i in idxs]
+        avgdl = self._total_len / self._n_docs or 1.0
 
-BM25_GLOBAL = BM25Store()
+        # (segment, indices locaux ou None pour tout le segment)
+        if document_ids is None:
+            candidates = [(seg, None) for seg in self._segments]
+        else:
+            candidates = []
+            for doc_id in dict.fromkeys(document_ids):
+                for seg in self._doc_segments.get(doc_id, []):
+                    candidates.append((seg, seg.by_document[doc_id]))
+        if not candidates:
+            return []
+
+        all_scores, owners, locals_ = [], [], []
+        for n, (seg, local) in enumerate(candidates):
+            scores = seg.score(idfs, self.k1, self.b, avgdl)
+            if local is None:
+                local = np.arange(len(seg), dtype=np.int32)
+            else:
+                scores = scores[local]
+            all_scores.append(scores)
+            locals_.append(local)
+            owners.append(np.full(len(local), n, dtype=np.int32))
+        scores = np.concatenate(all_scores)
+        local_idx = np.concatenate(locals_)
+        owner = np.concatenate(owners)
+
+        # Sélection top-k en O(n) puis tri des seuls k retenus
+        k = min(top_k, int(np.count_nonzero(scores > 0)))
+        if k == 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        results = []
+        for j in top:
+            seg = candidates[owner[j]][0]
+            i = int(local_idx[j])
+            results.append({"id": seg.ids[i], "score": float(scores[j]), "metadata": seg.metas[i], "document": seg.docs[i]})
+        return results
+
+BM25_GLOBAL = BM25Store(index_dir=BM25_INDEX_DIR)
 
 def bm25_add(ids: List[str], docs: List[str], metas: List[Dict[str, Any]]):
     BM25_GLOBAL.add_batch(ids, docs, metas)
 
-def bm25_query(q: str, top_k: int = 20):
-    return BM25_GLOBAL.query(q, top_k=top_k)
+def bm25_remove(document_id: str) -> int:
+    return BM25_GLOBAL.remove_document(document_id)
+
+def bm25_query(q: str, top_k: int = 20, document_ids: Optional[Iterable[str]] = None):
+    return BM25_GLOBAL.query(q, top_k=top_k, document_ids=document_ids)
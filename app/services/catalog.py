@@ -0,0 +1,89 @@
+from __future__ import annotations
+from typing import Dict, Any, List, Optional
+import json
+import os
+import threading
+
+CATALOG_PATH = os.getenv("CATALOG_PATH", os.path.join("storage", "catalog.json"))
+
+
+class DocumentCatalog:
+    """Catalogue léger des documents indexés (un enregistrement par document_id).
+
+    Lectures O(1) en mémoire; chaque écriture réécrit le fichier JSON de façon atomique.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._by_hash: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._entries = json.load(f)
+            except Exception as e:
+                print(f"[CATALOG][WARN] Catalogue illisible, repart de zéro: {e}")
+        for doc_id, entry in self._entries.items():
+            if entry.get("content_sha256"):
+                self._by_hash[entry["content_sha256"]] = doc_id
+
+    def _persist(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def upsert(self, document_id: str, **fields: Any) -> Dict[str, Any]:
+        with self._lock:
+            entry = {**self._entries.get(document_id, {}), **fields, "document_id": document_id}
+            self._entries[document_id] = entry
+            if entry.get("content_sha256"):
+                self._by_hash[entry["content_sha256"]] = document_id
+            self._persist()
+            return dict(entry)
+
+    def remove(self, document_id: str) -> bool:
+        with self._lock:
+            entry = self._entries.pop(document_id, None)
+            if entry is None:
+                return False
+            if self._by_hash.get(entry.get("content_sha256")) == document_id:
+                del self._by_hash[entry["content_sha256"]]
+            self._persist()
+            return True
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(document_id)
+        return dict(entry) if entry else None
+
+    def find_by_hash(self, content_sha256: str) -> Optional[Dict[str, Any]]:
+        """Document déjà indexé pour ce contenu (SHA-256 du fichier), s'il existe."""
+        doc_id = self._by_hash.get(content_sha256)
+        return self.get(doc_id) if doc_id else None
+
+    def chunk_count(self, document_id: str) -> Optional[int]:
+        entry = self._entries.get(document_id)
+        return entry.get("chunk_count") if entry else None
+
+    def list(self) -> List[Dict[str, Any]]:
+        # Instantané sous verrou: upsert/remove modifient le dict depuis les workers d'ingestion
+        with self._lock:
+            entries = list(self._entries.values())
+        return sorted((dict(e) for e in entries), key=lambda e: e.get("created_at") or "", reverse=True)
+
+    def __contains__(self, document_id: str) -> bool:
+        return document_id in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+CATALOG = DocumentCatalog(CATALOG_PATH)
+
+def get_catalog() -> DocumentCatalog:
+    """Expose le catalogue partagé."""
+    return CATALOG
@@ -1,8 +1,48 @@
+from __future__ import annotations
+from bisect import bisect_left
+from typing import Any, Dict, List, Tuple
 import os
 import re
-from transformers import CamembertTokenizer
+import threading
+
+from app.services.embedding_backends import EMBEDDING_MODEL_NAME
+
+# Tokenizer rapide (Rust) du modèle d'embedding: les fenêtres de chunking sont comptées
+# avec les mêmes tokens que ceux que le modèle verra
+CHUNKER_TOKENIZER = os.getenv("CHUNKER_TOKENIZER", EMBEDDING_MODEL_NAME)
+
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+
+
+def get_tokenizer():
+    """Tokenizer du chunker, chargé au premier appel (ou au warm-up)."""
+    global _tokenizer
+    if _tokenizer is None:
+        with _tokenizer_lock:
+            if _tokenizer is None:
+                from transformers import AutoTokenizer
+                _tokenizer = AutoTokenizer.from_pretrained(CHUNKER_TOKENIZER, use_fast=True)
+    return _tokenizer
+
+
+# Repères structurels d'un DCE (début d'article ou de pièce)
+_STRUCTURE_RE = re.compile(r"(?=Article\s+\d+)|(?=CAHIER)|(?=RÈGLEMENT)|(?=ACTE D'ENGAGEMENT)", re.IGNORECASE)
+
+
+def _section_spans(text: str) -> List[Tuple[int, int]]:
+    """Bornes (début, fin) en caractères des sections, espaces de bord exclus."""
+    cuts = sorted({0, len(text), *(m.start() for m in _STRUCTURE_RE.finditer(text))})
+    spans = []
+    for start, end in zip(cuts, cuts[1:]):
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            spans.append((start, end))
+    return spans
 
-tokenizer = CamembertTokenizer.from_pretrained("camembert-base")
 
 def split_by_structure(text: str) -> list[str]:
     """
@@ -11,43 +51,68 @@ def split_by_structure(text: str) -> list[str]:
     - Sections en majuscules (ex: "CAHIER DES CLAUSES...")
     - Retourne une liste de blocs textuels bruts.
     """
-    # Normaliser les séparateurs
-    text = re.sub(r"\n{2,}", "\n\n", text)
+    return [text[start:end] for start, end in _section_spans(text)]
 
-    # Split par repères structurels
-    parts = re.split(r"(?=Article\s+\d+)|(?=CAHIER)|(?=RÈGLEMENT)|(?=ACTE D'ENGAGEMENT)", text, flags=re.IGNORECASE)
 
-    # Nettoyer les morceaux vides
-    parts = [p.strip() for p in parts if p.strip()]
-    return parts
-
-def chunk_text(text: str, max_tokens: int = 480, overlap_tokens: int = 50) -> list[str]:
+def chunk_document(text: str, max_tokens: int = 480, overlap_tokens: int = 50) -> List[Dict[str, Any]]:
     """
-    Chunker hybride :
-    1. Découpe d'abord par structure DCE (articles, sections).
-    2. Si une section est trop longue (> max_tokens), on la re-chunke par sliding window.
+    Chunker hybride en une passe :
+    1. Tokenise le document UNE fois (offsets caractères du tokenizer rapide).
+    2. Découpe par structure DCE (articles, sections).
+    3. Si une section est trop longue (> max_tokens), fenêtres glissantes sur ses tokens.
+
+    Chaque chunk est une tranche du texte original (mise en forme conservée):
+    {"text", "char_start", "char_end", "token_start", "token_end"} (fins exclusives,
+    tokens comptés sur le document entier sans tokens spéciaux).
     """
-    structured_chunks = split_by_structure(text)
-    final_chunks = []
-
-    for section in structured_chunks:
-        tokens = tokenizer.encode(section, add_special_tokens=False)
-        if len(tokens) <= max_tokens:
-            final_chunks.append(section)
-        else:
-            # Sliding window sur les longues sections
-            i = 0
-            while i < len(tokens):
-                chunk_tokens = tokens[i:i + max_tokens]
-                chunk_text_str = tokenizer.decode(chunk_tokens)
-                final_chunks.append(chunk_text_str)
-                i += max_tokens - overlap_tokens
+    if not text or not text.strip():
+        return []
+    enc = get_tokenizer()(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+    offsets: List[Tuple[int, int]] = [tuple(o) for o in enc["offset_mapping"]]
+    starts = [s for s, _ in offsets]
+    step = max(1, max_tokens - overlap_tokens)
+
+    chunks: List[Dict[str, Any]] = []
+
+    def _add(tok_start: int, tok_end: int, char_start: int, char_end: int) -> None:
+        chunks.append({
+            "text": text[char_start:char_end],
+            "char_start": char_start,
+            "char_end": char_end,
+            "token_start": tok_start,
+            "token_end": tok_end,
+        })
+
+    for sec_start, sec_end in _section_spans(text):
+        # Tokens de la section: ceux qui commencent dans [sec_start, sec_end)
+        t0 = bisect_left(starts, sec_start)
+        t1 = bisect_left(starts, sec_end, lo=t0)
+        if t1 <= t0:
+            continue
+        if t1 - t0 <= max_tokens:
+            _add(t0, t1, sec_start, sec_end)
+            continue
+        # Sliding window sur les longues sections
+        i = t0
+        while i < t1:
+            j = min(i + max_tokens, t1)
+            char_start = sec_start if i == t0 else offsets[i][0]
+            char_end = sec_end if j == t1 else offsets[j - 1][1]
+            _add(i, j, char_start, char_end)
+            if j == t1:
+                break
+            i += step
 
     # Debug (activable via DEBUG_CHUNKER=1)
     if os.getenv("DEBUG_CHUNKER") == "1":
-        print(f"[DEBUG] Total structured chunks créés : {len(final_chunks)}")
-        for idx, ch in enumerate(final_chunks):
-            t_count = len(tokenizer.encode(ch, add_special_tokens=False))
-            print(f"[DEBUG] Chunk {idx}: {t_count} tokens | Début: {ch[:60]}...")
+        print(f"[DEBUG] Total structured chunks créés : {len(chunks)}")
+        for idx, ch in enumerate(chunks):
+            t_count = ch["token_end"] - ch["token_start"]
+            print(f"[DEBUG] Chunk {idx}: {t_count} tokens | Début: {ch['text'][:60]}...")
+
+    return chunks
 
-    return final_chunks
+
+def chunk_text(text: str, max_tokens: int = 480, overlap_tokens: int = 50) -> list[str]:
+    """Textes des chunks de `chunk_document` (sans les offsets)."""
+    return [c["text"] for c in chunk_document(text, max_tokens, overlap_tokens)]
@@ -0,0 +1,93 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+from functools import lru_cache
+import math
+import os
+
+# Tokenizer du LLM servi par Ollama (comptes stockés à l'indexation, jamais au moment de la requête)
+LLM_TOKENIZER = os.getenv("LLM_TOKENIZER", "Qwen/Qwen2.5-1.5B-Instruct")
+# Budget de tokens LLM pour les extraits injectés dans le prompt
+LLM_CONTEXT_BUDGET = int(os.getenv("LLM_CONTEXT_BUDGET", "3000"))
+# Estimation si le tokenizer est indisponible (ou pour la question, non tokenisée)
+LLM_CHARS_PER_TOKEN = float(os.getenv("LLM_CHARS_PER_TOKEN", "3.5"))
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+
+@lru_cache(maxsize=1)
+def get_llm_tokenizer():
+    """Tokenizer LLM chargé au premier appel (indexation ou warm-up); None si indisponible."""
+    try:
+        from transformers import AutoTokenizer
+        return AutoTokenizer.from_pretrained(LLM_TOKENIZER, use_fast=True)
+    except Exception as e:
+        print(f"[CONTEXT][WARN] tokenizer LLM indisponible ({LLM_TOKENIZER}), estimation par caractères: {e}")
+        return None
+
+
+def normalize_chunk(text: str) -> str:
+    """Forme injectée dans le prompt: espaces et retours multiples compactés."""
+    return " ".join((text or "").split())
+
+
+def estimate_tokens(text: str) -> int:
+    return int(math.ceil(len(text or "") / LLM_CHARS_PER_TOKEN))
+
+
+def count_llm_tokens(texts: List[str]) -> List[int]:
+    """Tokens LLM de chaque texte (à l'indexation; en lot via le tokenizer rapide)."""
+    if not texts:
+        return []
+    llm_tokenizer = get_llm_tokenizer()
+    if llm_tokenizer is None:
+        return [estimate_tokens(t) for t in texts]
+    return [len(ids) for ids in llm_tokenizer(list(texts), add_special_tokens=False)["input_ids"]]
+
+
+@lru_cache(maxsize=None)
+def fixed_tokens(text: str) -> int:
+    """Coût d'un texte fixe (séparateur, gabarit de prompt), compté une fois."""
+    return count_llm_tokens([text])[0]
+
+
+def chunk_llm_tokens(text: str, meta: Optional[Dict[str, Any]]) -> int:
+    n = (meta or {}).get("n_llm_tokens")
+    if isinstance(n, int):
+        return n
+    # Chunk indexé avant le stockage des comptes
+    return estimate_tokens(normalize_chunk(text))
+
+
+def pack_context(
+    chunks: List[str],
+    metas: List[Dict[str, Any]],
+    budget: int = LLM_CONTEXT_BUDGET,
+) -> Dict[str, Any]:
+    """Remplit le budget de tokens avec les chunks dans l'ordre du score fusionné (RRF).
+
+    Glouton: un chunk qui ne tient pas est sauté, les suivants (plus courts) peuvent encore
+    entrer. Le premier chunk est toujours gardé, tronqué au budget si besoin.
+    Retourne {"indices", "texts", "context_tokens", "truncated"}: `texts` est le texte
+    effectivement injecté (normalisé, éventuellement tronqué) de chaque chunk retenu.
+    """
+    indices: List[int] = []
+    texts: List[str] = []
+    used = 0
+    truncated = False
+    for i, (text, meta) in enumerate(zip(chunks, metas)):
+        cost = chunk_llm_tokens(text, meta) + (fixed_tokens(CONTEXT_SEPARATOR) if indices else 0)
+        if used + cost > budget:
+            if indices:
+                continue
+            # Premier chunk plus grand que le budget: coupe proportionnelle en caractères
+            clean = normalize_chunk(text)
+            keep = max(1, int(len(clean) * budget / max(cost, 1)))
+            indices.append(i)
+            texts.append(clean[:keep].strip())
+            used = min(cost, budget)
+            truncated = True
+            continue
+        indices.append(i)
+        texts.append(normalize_chunk(text))
+        used += cost
+    return {"indices": indices, "texts": texts, "context_tokens": used, "truncated": truncated}
@@ -1,16 +1,103 @@
-from sentence_transformers import SentenceTransformer
 from typing import List
+import hashlib
+import os
+import threading
 
-# On charge UNE SEULE fois le modèle
-model = SentenceTransformer("dangvantuan/sentence-camembert-large")
+from app.services.embedding_cache import LRUEmbeddingCache, SqliteEmbeddingStore, normalize_query
+from app.services.embedding_backends import load_backend, backend_name, EMBEDDING_MODEL_NAME
+from app.services.metrics import REGISTRY
 
-def generate_embeddings(chunks: List[str]) -> List[List[float]]:
-    """Génère les embeddings pour une liste de chunks."""
-    return model.encode(
+CHUNK_EMBEDDINGS = REGISTRY.counter(
+    "aorisk_chunk_embeddings_total", "Embeddings de chunks (source: computed | reused)", ("source",),
+)
+
+# Cache des embeddings de questions (les mêmes questions reviennent sur chaque DCE)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH", "")  # ex: storage/embeddings.sqlite pour survivre aux redémarrages
+# Store persistant hash(chunk) -> embedding: seuls les chunks jamais vus passent dans le modèle
+CHUNK_CACHE_PATH = os.getenv("CHUNK_CACHE_PATH", os.path.join("storage", "embeddings.sqlite"))
+
+# On charge UNE SEULE fois le modèle (backend choisi par EMBEDDING_BACKEND: torch | onnx-int8),
+# au premier usage ou au warm-up du démarrage
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                _model = load_backend(EMBEDDING_MODEL_NAME)
+                print(f"[EMBED] backend={_model.name} | model={EMBEDDING_MODEL_NAME}")
+    return _model
+
+# Les vecteurs diffèrent légèrement d'un backend à l'autre: caches séparés
+_CACHE_NS = f"{EMBEDDING_MODEL_NAME}:{backend_name()}"
+
+QUERY_CACHE = LRUEmbeddingCache(
+    QUERY_CACHE_SIZE,
+    disk=SqliteEmbeddingStore(QUERY_CACHE_PATH, namespace=f"query:{_CACHE_NS}") if QUERY_CACHE_PATH else None,
+)
+
+# Store des chunks ouvert à la première indexation (pas de fichier SQLite créé à l'import)
+_chunk_store = None
+_chunk_store_lock = threading.Lock()
+
+def get_chunk_store():
+    global _chunk_store
+    if _chunk_store is None and CHUNK_CACHE_PATH:
+        with _chunk_store_lock:
+            if _chunk_store is None:
+                _chunk_store = SqliteEmbeddingStore(CHUNK_CACHE_PATH, namespace=f"chunk:{_CACHE_NS}")
+    return _chunk_store
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _encode_chunks(chunks: List[str]) -> List[List[float]]:
+    return get_model().encode(
         chunks,
         batch_size=8
     ).tolist()
 
+def generate_embeddings(chunks: List[str]) -> List[List[float]]:
+    """Génère les embeddings pour une liste de chunks (réutilise ceux déjà calculés par hash de contenu)."""
+    store = get_chunk_store()
+    if store is None:
+        return _encode_chunks(chunks)
+
+    keys = [chunk_hash(c) for c in chunks]
+    try:
+        known = store.get_many(keys)
+    except Exception as e:
+        print(f"[EMBED CACHE][WARN] lecture disque: {e}")
+        known = {}
+
+    todo = {k: c for k, c in zip(keys, chunks) if k not in known}
+    if todo:
+        fresh = dict(zip(todo.keys(), _encode_chunks(list(todo.values()))))
+        known.update(fresh)
+        try:
+            store.put_many(fresh)
+        except Exception as e:
+            print(f"[EMBED CACHE][WARN] écriture disque: {e}")
+    CHUNK_EMBEDDINGS.inc(len(todo), source="computed")
+    CHUNK_EMBEDDINGS.inc(len(chunks) - len(todo), source="reused")
+    print(f"[EMBED] chunks={len(chunks)} | calculés={len(todo)} | réutilisés={len(chunks) - len(todo)}")
+    return [known[k] for k in keys]
+
+def embed_queries(queries: List[str]) -> List[List[float]]:
+    """Embeddings de plusieurs questions: les absentes du cache passent en UN appel modèle."""
+    keys = [normalize_query(q) for q in queries]
+    found = {k: QUERY_CACHE.get(k) for k in dict.fromkeys(keys)}
+    todo = {k: q for k, q in zip(keys, queries) if found[k] is None}
+    if todo:
+        vecs = get_model().encode(list(todo.values()), batch_size=16).tolist()
+        for k, vec in zip(todo.keys(), vecs):
+            QUERY_CACHE.put(k, vec)
+            found[k] = vec
+    return [found[k] for k in keys]
+
 def embed_query(query: str) -> List[float]:
-    """Embeddings pour une query (retriever)."""
-    return model.encode([query])[0].tolist()
+    """Embeddings pour une query (retriever), mis en cache par texte normalisé."""
+    return embed_queries([query])[0]
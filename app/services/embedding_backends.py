@@ -0,0 +1,94 @@
+from __future__ import annotations
+from typing import List, Protocol
+import os
+import numpy as np
+
+EMBEDDING_MODEL_NAME = "dangvantuan/sentence-camembert-large"
+
+# Sélection du backend d'embedding au démarrage (même modèle, runtimes différents)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "./models/sentence-camembert-large-onnx-int8")
+EMBEDDING_MAX_LENGTH = int(os.getenv("EMBEDDING_MAX_LENGTH", "512"))
+ONNX_MODEL_FILE = "model_int8.onnx"
+
+
+class EmbeddingBackend(Protocol):
+    name: str
+
+    def encode(self, texts: List[str], batch_size: int = 8) -> np.ndarray: ...
+
+
+# ---------- Implémentations ----------
+class TorchBackend:
+    """SentenceTransformer PyTorch (référence)."""
+
+    name = "torch"
+
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: List[str], batch_size: int = 8) -> np.ndarray:
+        return np.asarray(self.model.encode(texts, batch_size=batch_size), dtype=np.float32)
+
+
+class OnnxInt8Backend:
+    """Export ONNX du même modèle, quantifié en int8 dynamique, exécuté par ONNX Runtime (CPU).
+
+    Reproduit le pooling du SentenceTransformer (moyenne des tokens masquée).
+    Le dossier est produit par `python -m tools.onnx_embeddings export`.
+    """
+
+    name = "onnx-int8"
+
+    def __init__(self, model_dir: str, max_length: int = EMBEDDING_MAX_LENGTH):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        path = os.path.join(model_dir, ONNX_MODEL_FILE)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Modèle ONNX introuvable: {path} (lancer python -m tools.onnx_embeddings export)")
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_length = max_length
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        threads = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+        if threads > 0:
+            opts.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts: List[str], batch_size: int = 8) -> np.ndarray:
+        out: List[np.ndarray] = []
+        for start in range(0, len(texts), batch_size):
+            enc = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_length,
+                return_tensors="np",
+            )
+            feeds = {k: enc[k].astype(np.int64) for k in ("input_ids", "attention_mask", "token_type_ids") if k in self.input_names}
+            hidden = self.session.run(None, feeds)[0]
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            out.append((hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None))
+        if not out:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(out).astype(np.float32)
+
+
+# Factory
+def backend_name(backend: str | None = None) -> str:
+    """Nom canonique du backend (sans charger le modèle)."""
+    backend = (backend or EMBEDDING_BACKEND).lower()
+    if backend == "torch":
+        return TorchBackend.name
+    if backend in {"onnx", "onnx-int8"}:
+        return OnnxInt8Backend.name
+    raise ValueError(f"Backend d'embedding inconnu : {backend}")
+
+
+def load_backend(model_name: str, backend: str | None = None) -> EmbeddingBackend:
+    if backend_name(backend) == TorchBackend.name:
+        return TorchBackend(model_name)
+    return OnnxInt8Backend(EMBEDDING_ONNX_DIR)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+from typing import List, Dict, Any, Optional, Iterable
+from collections import OrderedDict
+import os
+import sqlite3
+import threading
+import unicodedata
+import numpy as np
+
+
+def normalize_query(query: str) -> str:
+    """Clé de cache d'une question: Unicode NFC, casse et espaces normalisés."""
+    return " ".join(unicodedata.normalize("NFC", query or "").casefold().split())
+
+
+class SqliteEmbeddingStore:
+    """Stockage disque clé -> embedding (float32), partitionné par espace de noms (ex: modèle)."""
+
+    def __init__(self, path: str, namespace: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " namespace TEXT NOT NULL, key TEXT NOT NULL, vec BLOB NOT NULL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+            self._conn.commit()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, List[float]]:
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, List[float]] = {}
+        # Requêtes par paquets (limite SQLite sur le nombre de paramètres)
+        for start in range(0, len(keys), 500):
+            part = keys[start:start + 500]
+            marks = ",".join("?" * len(part))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT key, vec FROM embeddings WHERE namespace = ? AND key IN ({marks})",
+                    [self.namespace, *part],
+                ).fetchall()
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def get(self, key: str) -> Optional[List[float]]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Dict[str, List[float]]) -> None:
+        if not items:
+            return
+        rows = [(self.namespace, k, np.asarray(v, dtype=np.float32).tobytes()) for k, v in items.items()]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings (namespace, key, vec) VALUES (?, ?, ?)", rows)
+            self._conn.commit()
+
+    def put(self, key: str, vec: List[float]) -> None:
+        self.put_many({key: vec})
+
+
+class LRUEmbeddingCache:
+    """Cache mémoire LRU borné, avec niveau disque optionnel et compteurs hit/miss."""
+
+    def __init__(self, max_size: int, disk: Optional[SqliteEmbeddingStore] = None):
+        self.max_size = max_size
+        self.disk = disk
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _remember(self, key: str, vec: List[float]):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = vec
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vec = self._entries.get(key)
+            if vec is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vec
+        if self.disk is not None:
+            try:
+                vec = self.disk.get(key)
+            except Exception as e:
+                print(f"[EMBED CACHE][WARN] lecture disque: {e}")
+                vec = None
+            if vec is not None:
+                self.disk_hits += 1
+                self._remember(key, vec)
+                return vec
+        self.misses += 1
+        return None
+
+    def put(self, key: str, vec: List[float]) -> None:
+        self._remember(key, vec)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, vec)
+            except Exception as e:
+                print(f"[EMBED CACHE][WARN] écriture disque: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": ((self.hits + self.disk_hits) / lookups) if lookups else 0.0,
+        }
@@ -0,0 +1,120 @@
+from __future__ import annotations
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+import os
+import threading
+import numpy as np
+
+# Cache optionnel de matrices d'embeddings par document (recherche exacte ciblée).
+# Chroma reste la source de vérité et sert la recherche multi-documents.
+FLAT_INDEX_ENABLED = os.getenv("FLAT_INDEX_ENABLED", "false").lower() == "true"
+FLAT_INDEX_MAX_MB = float(os.getenv("FLAT_INDEX_MAX_MB", "256"))
+FLAT_INDEX_DTYPE = os.getenv("FLAT_INDEX_DTYPE", "float32")
+
+
+class _DocMatrix:
+    def __init__(self, ids: List[str], docs: List[str], metas: List[Dict[str, Any]], matrix: np.ndarray):
+        self.ids = ids
+        self.docs = docs
+        self.metas = metas
+        self.matrix = matrix
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.matrix.nbytes)
+
+
+class FlatIndexCache:
+    """LRU de matrices d'embeddings normalisées, une par document, bornée en mémoire.
+
+    Une requête ciblée calcule les similarités cosinus exactes en un seul produit
+    matriciel (rappel parfait, pas de HNSW ni de filtre `where`).
+    """
+
+    def __init__(self, max_bytes: int, dtype: str = "float32"):
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self._entries: "OrderedDict[str, _DocMatrix]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, document_id: str, ids: List[str], docs: List[str], metas: List[Dict[str, Any]], embeddings) -> Optional[_DocMatrix]:
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2 or not len(matrix):
+            return None
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix = np.ascontiguousarray((matrix / np.maximum(norms, 1e-12)).astype(self.dtype))
+        entry = _DocMatrix(list(ids), list(docs), list(metas), matrix)
+        if entry.nbytes > self.max_bytes:
+            return None
+        with self._lock:
+            old = self._entries.pop(document_id, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[document_id] = entry
+            self._bytes += entry.nbytes
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.nbytes
+        return entry
+
+    def get(self, document_id: str) -> Optional[_DocMatrix]:
+        with self._lock:
+            entry = self._entries.get(document_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(document_id)
+            self.hits += 1
+            return entry
+
+    def invalidate(self, document_id: str) -> None:
+        with self._lock:
+            old = self._entries.pop(document_id, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    @staticmethod
+    def search(entry: _DocMatrix, query_embedding, top_k: int) -> List[Tuple[str, float, Dict[str, Any], str]]:
+        """Top-k exact: [(document, distance cosinus, metadata, id)] triés par distance croissante."""
+        q = np.asarray(query_embedding, dtype=np.float32)
+        q = q / max(float(np.linalg.norm(q)), 1e-12)
+        sims = entry.matrix @ q.astype(entry.matrix.dtype)
+        k = min(top_k, len(sims))
+        if k <= 0:
+            return []
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind="stable")]
+        return [(entry.docs[i], 1.0 - float(sims[i]), entry.metas[i], entry.ids[i]) for i in top]
+
+    @staticmethod
+    def search_many(entry: _DocMatrix, query_embeddings, top_k: int) -> List[List[Tuple[str, float, Dict[str, Any], str]]]:
+        """Comme `search`, pour plusieurs questions en un seul produit matriciel."""
+        q = np.asarray(query_embeddings, dtype=np.float32)
+        q = q / np.maximum(np.linalg.norm(q, axis=1, keepdims=True), 1e-12)
+        sims_all = entry.matrix @ q.astype(entry.matrix.dtype).T
+        k = min(top_k, sims_all.shape[0])
+        out: List[List[Tuple[str, float, Dict[str, Any], str]]] = []
+        for j in range(sims_all.shape[1]):
+            if k <= 0:
+                out.append([])
+                continue
+            sims = sims_all[:, j]
+            top = np.argpartition(-sims, k - 1)[:k]
+            top = top[np.argsort(-sims[top], kind="stable")]
+            out.append([(entry.docs[i], 1.0 - float(sims[i]), entry.metas[i], entry.ids[i]) for i in top])
+        return out
+
+
+FLAT_CACHE = FlatIndexCache(int(FLAT_INDEX_MAX_MB * 1024 * 1024), FLAT_INDEX_DTYPE)
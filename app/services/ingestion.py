@@ -0,0 +1,130 @@
+from __future__ import annotations
+from typing import Dict, Any, Optional, Callable
+import hashlib
+import json
+import os
+import threading
+import uuid
+
+from app.services.parsers import parse_document
+from app.services.classifier import classify_piece
+from app.services.vector_service import index_document_in_chroma
+from app.services.catalog import CATALOG
+from app.services.risk_report import RISK_REPORTS, RISK_REPORT_ENABLED
+
+# progress(stage, **infos) — ex: progress("embedding", embedded=64, total_chunks=210)
+ProgressFn = Callable[..., None]
+
+
+def _noop(stage: str, **info: Any) -> None:
+    pass
+
+
+# Contenus en cours d'ingestion (SHA-256 → Event levé à la fin): un doublon soumis en
+# parallèle attend le premier au lieu de ré-extraire et ré-indexer le même fichier
+_inflight: Dict[str, threading.Event] = {}
+_inflight_lock = threading.Lock()
+
+
+def _claim_hash(content_sha256: str) -> Optional[Dict[str, Any]]:
+    """Réserve le hash pour cet appel; retourne l'entrée du catalogue si déjà indexé.
+
+    Vérification du catalogue et réservation sous le même verrou: l'ingestion en cours
+    enregistre le hash dans le catalogue avant de libérer la réservation.
+    """
+    while True:
+        with _inflight_lock:
+            existing = CATALOG.find_by_hash(content_sha256)
+            if existing and existing.get("chunk_count"):
+                return existing
+            waiter = _inflight.get(content_sha256)
+            if waiter is None:
+                _inflight[content_sha256] = threading.Event()
+                return None
+        print(f"[UPLOAD] même contenu en cours d'ingestion → attente (sha256={content_sha256[:12]})")
+        waiter.wait()
+
+
+def _release_hash(content_sha256: str) -> None:
+    with _inflight_lock:
+        event = _inflight.pop(content_sha256, None)
+    if event is not None:
+        event.set()
+
+
+def ingest_file(filename: str, file_bytes: bytes, progress: Optional[ProgressFn] = None) -> Dict[str, Any]:
+    """Pipeline complet d'un fichier: extraction → stockage → classification → indexation.
+
+    Retourne le résultat renvoyé au client pour ce fichier.
+    """
+    progress = progress or _noop
+
+    # 🔹 Même fichier déjà indexé (ou en cours) ? on renvoie le résultat existant (SHA-256 du contenu)
+    content_sha256 = hashlib.sha256(file_bytes).hexdigest()
+    existing = _claim_hash(content_sha256)
+    if existing:
+        print(f"[UPLOAD] doublon détecté → document_id={existing['document_id']}")
+        return {
+            "filename": filename,
+            "document_id": existing["document_id"],
+            "type": existing.get("doc_type"),
+            "chunks": existing.get("chunk_count"),
+            "indexed": True,
+            "deduplicated": True,
+        }
+    try:
+        return _ingest_new(filename, file_bytes, content_sha256, progress)
+    finally:
+        # Succès: le hash est au catalogue; échec: un doublon en attente reprend l'ingestion
+        _release_hash(content_sha256)
+
+
+def _ingest_new(filename: str, file_bytes: bytes, content_sha256: str, progress: ProgressFn) -> Dict[str, Any]:
+    # 🔹 Générer un ID unique
+    document_id = str(uuid.uuid4())
+
+    # 1️⃣ Extraction texte et pages
+    progress("parsing")
+    document = parse_document(filename, file_bytes)
+    full_text = document.full_text
+    progress("parsed", pages=len(document))
+
+    # Sauvegarder texte brut
+    os.makedirs("storage", exist_ok=True)
+    with open(f"storage/{document_id}.txt", "w", encoding="utf-8") as f:
+        f.write(full_text)
+
+    # Sauvegarder pages
+    with open(f"storage/{document_id}_pages.json", "w", encoding="utf-8") as f:
+        json.dump(document.to_dict()["pages"], f, ensure_ascii=False, indent=2)
+
+    # Sauvegarder le PDF original pour l'affichage (#page=)
+    try:
+        with open(f"storage/{document_id}.pdf", "wb") as out:
+            out.write(file_bytes)
+    except Exception as e:
+        print(f"[UPLOAD][WARN] Impossible de sauvegarder le PDF original: {e}")
+
+    # 2️⃣ Classification
+    doc_type = classify_piece(full_text)
+
+    # 3️⃣ Indexation dans ChromaDB (avec doc_type et retour chunks)
+    chunk_count = index_document_in_chroma(
+        document_id, document, doc_type, filename, progress=progress,
+    )
+    if chunk_count:
+        CATALOG.upsert(document_id, content_sha256=content_sha256)
+    progress("indexed", document_id=document_id)
+
+    # 4️⃣ Rapport de risques en tâche de fond (n'allonge pas l'ingestion)
+    if RISK_REPORT_ENABLED and chunk_count:
+        RISK_REPORTS.schedule(document_id)
+
+    return {
+        "filename": filename,
+        "document_id": document_id,
+        "type": doc_type,
+        "chunks": chunk_count,
+        "indexed": True,
+        "deduplicated": False,
+    }
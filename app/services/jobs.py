@@ -0,0 +1,143 @@
+from __future__ import annotations
+from typing import Dict, Any, List, Optional, Tuple
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import os
+import threading
+import uuid
+
+from app.services.ingestion import ingest_file
+from app.services.profiler import PROFILER
+from app.services.tracing import start_trace
+
+# Pool borné: threads (Chroma, BM25 et catalogue sont des singletons du process;
+# les étapes lourdes — modèle d'embedding, Tesseract — relâchent le GIL)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) // 2)))))
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "32"))
+JOBS_HISTORY = int(os.getenv("JOBS_HISTORY", "200"))
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class IngestionJob:
+    """Un upload (un ou plusieurs fichiers) et l'avancement de chaque fichier.
+
+    Les résultats sont ajoutés dans l'ordre de fin de traitement. Avec `trace=True`,
+    chaque fichier produit un arbre d'étapes (parse, OCR, chunking, embeddings, index).
+    """
+
+    def __init__(self, files: List[Tuple[str, bytes]], trace: bool = False):
+        self.id = uuid.uuid4().hex
+        self.created_at = datetime.utcnow().isoformat()
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.status = "queued"  # queued | running | done | error
+        self.error: Optional[str] = None
+        self._payloads: Optional[List[Tuple[str, bytes]]] = list(files)
+        self._remaining = len(files)
+        self.files: List[Dict[str, Any]] = [
+            {"filename": name, "stage": "queued", "embedded": 0, "total_chunks": None, "document_id": None, "error": None}
+            for name, _ in files
+        ]
+        self.results: List[Dict[str, Any]] = []
+        self.trace = trace
+        self.traces: List[Optional[Dict[str, Any]]] = [None] * len(files)
+        self._lock = threading.Lock()
+
+    def _progress_for(self, idx: int):
+        def progress(stage: str, **info: Any) -> None:
+            with self._lock:
+                self.files[idx]["stage"] = stage
+                self.files[idx].update({k: v for k, v in info.items() if k in self.files[idx]})
+        return progress
+
+    def take_payloads(self) -> List[Tuple[str, bytes]]:
+        # Les octets ne sont gardés que jusqu'à la prise en charge par le pool
+        payloads, self._payloads = self._payloads or [], None
+        self._remaining = len(payloads)
+        return payloads
+
+    def run_file(self, idx: int, filename: str, data: bytes) -> None:
+        """Traite un fichier du job (chaque fichier est une tâche du pool)."""
+        with self._lock:
+            if self.status == "queued":
+                self.status = "running"
+                self.started_at = datetime.utcnow().isoformat()
+        trace = None
+        try:
+            with PROFILER.request("ingest"), start_trace(
+                "ingest", enabled=self.trace, job_id=self.id, filename=filename, bytes=len(data),
+            ) as trace:
+                result = ingest_file(filename, data, progress=self._progress_for(idx))
+            with self._lock:
+                self.results.append(result)
+                self.files[idx].update(stage="done", document_id=result["document_id"])
+        except Exception as e:
+            print(f"[JOB ERROR] job={self.id} file={filename}: {e}")
+            with self._lock:
+                self.files[idx].update(stage="error", error=str(e))
+        finally:
+            if trace is not None:
+                self.traces[idx] = trace.to_dict()
+            with self._lock:
+                self._remaining -= 1
+                if self._remaining == 0:
+                    failed = any(f["stage"] == "error" for f in self.files)
+                    self.status = "error" if failed else "done"
+                    if failed:
+                        self.error = "Au moins un fichier n'a pas pu être indexé"
+                    self.finished_at = datetime.utcnow().isoformat()
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            out = {
+                "job_id": self.id,
+                "status": self.status,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+                "files": [dict(f) for f in self.files],
+                "results": list(self.results),
+                "document_ids": [r["document_id"] for r in self.results],
+            }
+            if self.trace:
+                out["traces"] = list(self.traces)
+            return out
+
+
+class JobManager:
+    def __init__(self, max_workers: int, max_pending: int, history: int):
+        self.max_pending = max_pending
+        self.history = history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest")
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def pending(self) -> int:
+        return sum(1 for j in list(self._jobs.values()) if j.status in {"queued", "running"})
+
+    def submit(self, files: List[Tuple[str, bytes]], trace: bool = False) -> IngestionJob:
+        with self._lock:
+            if self.pending() >= self.max_pending:
+                raise QueueFullError("File d'ingestion pleine, réessayez plus tard")
+            job = IngestionJob(files, trace=trace)
+            self._jobs[job.id] = job
+            # Historique borné: on oublie les jobs terminés les plus anciens
+            for old_id in list(self._jobs):
+                if len(self._jobs) <= self.history:
+                    break
+                if self._jobs[old_id].status in {"done", "error"}:
+                    del self._jobs[old_id]
+        for idx, (filename, data) in enumerate(job.take_payloads()):
+            self._executor.submit(job.run_file, idx, filename, data)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id)
+
+
+JOBS = JobManager(INGEST_WORKERS, INGEST_MAX_PENDING, JOBS_HISTORY)
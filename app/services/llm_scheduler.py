@@ -0,0 +1,165 @@
+from __future__ import annotations
+from typing import Any, AsyncIterator, Dict, List
+from contextlib import asynccontextmanager
+import asyncio
+import heapq
+import itertools
+import os
+import time
+
+from app.services.metrics import STAGE_SECONDS
+
+# Admission devant l'unique modèle Ollama local
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "50"))
+LLM_MAX_QUEUE_WAIT = float(os.getenv("LLM_MAX_QUEUE_WAIT", "30"))
+
+# Priorités (plus petit = servi d'abord)
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+PRIORITY_BACKGROUND = 20
+
+
+class LLMBusyError(Exception):
+    """Requête refusée par l'admission LLM. reason: "queue_full" | "queue_timeout"."""
+
+    def __init__(self, message: str, *, reason: str, retry_after: int = 5):
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"error": "llm_busy", "reason": self.reason, "message": str(self)}
+
+
+class Ticket:
+    """Place d'une requête dans la file LLM; `wait()` donne la position jusqu'à l'admission."""
+
+    def __init__(self, scheduler: "LLMScheduler", priority: int, seq: int):
+        self.scheduler = scheduler
+        self.priority = priority
+        self.seq = seq
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.released = False
+        self.enqueued_at = time.perf_counter()
+
+    def __lt__(self, other: "Ticket") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+    @property
+    def granted(self) -> bool:
+        return self.future.done() and not self.future.cancelled()
+
+    def position(self) -> int:
+        """Rang dans la file (1 = prochain servi), 0 si déjà admis."""
+        if self.granted:
+            return 0
+        return 1 + sum(1 for t in self.scheduler._waiting if t < self)
+
+    async def wait(self, poll_interval: float = 1.0) -> AsyncIterator[int]:
+        """Produit la position courante tant que la requête attend; se termine une fois admise.
+
+        Lève LLMBusyError au-delà de l'attente maximale, sauf en priorité de fond (aucun
+        client n'attend: la requête patiente jusqu'à ce que la charge interactive baisse).
+        Si l'attente est abandonnée (client parti, annulation), la place est libérée.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if self.priority >= PRIORITY_BACKGROUND else loop.time() + self.scheduler.max_wait
+        try:
+            while not self.future.done():
+                yield self.position()
+                remaining = poll_interval if deadline is None else deadline - loop.time()
+                if remaining <= 0:
+                    raise LLMBusyError(
+                        f"Attente LLM > {self.scheduler.max_wait:.0f}s", reason="queue_timeout",
+                    )
+                try:
+                    await asyncio.wait_for(asyncio.shield(self.future), timeout=min(poll_interval, remaining))
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            self.release()
+            raise
+
+    def release(self) -> None:
+        if self.released:
+            return
+        self.released = True
+        self.scheduler._release(self)
+
+
+class LLMScheduler:
+    """Concurrence bornée + file de priorité (FIFO à priorité égale) + rejet rapide."""
+
+    def __init__(self, max_concurrency: int, max_queue: int, max_wait: float):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._active = 0
+        self._waiting: List[Ticket] = []
+        self._seq = itertools.count()
+        self.rejected = 0
+
+    def check_admission(self) -> None:
+        """Rejet rapide (sans réserver de place) si la file est déjà pleine."""
+        if self._active >= self.max_concurrency and len(self._waiting) >= self.max_queue:
+            self.rejected += 1
+            raise LLMBusyError("File LLM pleine, réessayez plus tard", reason="queue_full")
+
+    def enqueue(self, priority: int = PRIORITY_INTERACTIVE) -> Ticket:
+        ticket = Ticket(self, priority, next(self._seq))
+        if self._active < self.max_concurrency and not self._waiting:
+            self._grant(ticket)
+            return ticket
+        if len(self._waiting) >= self.max_queue:
+            self.rejected += 1
+            raise LLMBusyError("File LLM pleine, réessayez plus tard", reason="queue_full")
+        heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _release(self, ticket: Ticket) -> None:
+        if ticket.granted:
+            self._active -= 1
+        else:
+            # Abandon avant admission: retrait de la file
+            if not ticket.future.done():
+                ticket.future.cancel()
+            if ticket in self._waiting:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+        self._grant_next()
+
+    def _grant_next(self) -> None:
+        while self._waiting and self._active < self.max_concurrency:
+            nxt = heapq.heappop(self._waiting)
+            if nxt.future.done():
+                continue
+            self._grant(nxt)
+
+    def _grant(self, ticket: Ticket) -> None:
+        self._active += 1
+        ticket.future.set_result(True)
+        STAGE_SECONDS.observe(time.perf_counter() - ticket.enqueued_at, stage="llm.queue_wait")
+
+    @asynccontextmanager
+    async def slot(self, priority: int = PRIORITY_INTERACTIVE):
+        ticket = self.enqueue(priority)
+        async for _ in ticket.wait():
+            pass
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "active": self._active,
+            "waiting": len(self._waiting),
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "max_wait_s": self.max_wait,
+            "rejected": self.rejected,
+        }
+
+
+LLM_SCHEDULER = LLMScheduler(LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_MAX_QUEUE_WAIT)
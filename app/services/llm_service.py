@@ -1,9 +1,47 @@
-import os, requests, json
+import asyncio
+import json
+import os
+import time
+from typing import AsyncIterator
+
+import httpx
+
+from app.services.metrics import REGISTRY, STAGE_SECONDS
+from app.services.tracing import annotate
 
 OLLAMA_BASE = os.getenv("OLLAMA_BASE_URL", "http://ollama:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen2.5:1.5b-instruct")
 OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "5m")
 OLLAMA_TEMPERATURE = float(os.getenv("OLLAMA_TEMPERATURE", "0.1"))
+# Client HTTP: timeouts (s), retries sur erreurs de connexion, taille du pool keep-alive
+OLLAMA_CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+OLLAMA_READ_TIMEOUT = float(os.getenv("OLLAMA_READ_TIMEOUT", "120"))
+OLLAMA_TOTAL_TIMEOUT = float(os.getenv("OLLAMA_TOTAL_TIMEOUT", "300"))
+OLLAMA_MAX_RETRIES = int(os.getenv("OLLAMA_MAX_RETRIES", "2"))
+OLLAMA_MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "10"))
+
+LLM_TOKENS = REGISTRY.counter("aorisk_llm_tokens_total", "Tokens traités par Ollama (prompt / completion)", ("kind",))
+LLM_TOKENS_PER_SECOND = REGISTRY.histogram(
+    "aorisk_llm_tokens_per_second", "Débit de génération Ollama (eval_count / eval_duration)",
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300),
+)
+LLM_ERRORS = REGISTRY.counter("aorisk_llm_errors_total", "Échecs d'appel Ollama par type", ("kind",))
+LLM_RETRIES = REGISTRY.counter("aorisk_llm_retries_total", "Retries de connexion vers Ollama")
+
+
+def _record_eval_stats(chunk: dict) -> None:
+    """Statistiques du dernier fragment Ollama (durées en nanosecondes)."""
+    prompt_tokens = chunk.get("prompt_eval_count")
+    eval_count = chunk.get("eval_count")
+    eval_duration = chunk.get("eval_duration")
+    # Comptes réels côté Ollama, rattachés à l'étape de génération si la requête est tracée
+    annotate(prompt_eval_count=prompt_tokens, eval_count=eval_count)
+    if isinstance(prompt_tokens, int):
+        LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+    if isinstance(eval_count, int):
+        LLM_TOKENS.inc(eval_count, kind="completion")
+        if isinstance(eval_duration, (int, float)) and eval_duration > 0:
+            LLM_TOKENS_PER_SECOND.observe(eval_count / (eval_duration / 1e9))
 
 
 SYSTEM_ROLE_QA = """
@@ -36,10 +74,9 @@ Réponds maintenant.
 """
 
 
-def query_ollama_sync(prompt: str, *, model: str | None = None, task: str = "qa") -> str | dict:
-    model = model or OLLAMA_MODEL
-    body = {
-        "model": model,
+def _chat_body(prompt: str, model: str | None = None) -> dict:
+    return {
+        "model": model or OLLAMA_MODEL,
         "messages": [
             {"role": "system", "content": SYSTEM_ROLE_QA},
             {"role": "user", "content": prompt},
@@ -50,24 +87,145 @@ def query_ollama_sync(prompt: str, *, model: str | None = None, task: str = "qa"
             "temperature": OLLAMA_TEMPERATURE,
         },
     }
-    try:
-        # Streaming: on accumule le contenu et on renvoie le texte final
-        resp = requests.post(f"{OLLAMA_BASE}/api/chat", json=body, stream=True, timeout=None)
-        resp.raise_for_status()
-        full_text_parts: list[str] = []
-        for line in resp.iter_lines(decode_unicode=True):
-            if not line:
-                continue
+
+
+class LLMError(Exception):
+    """Échec d'appel au LLM.
+
+    kind: "connect" (Ollama injoignable), "timeout", "http" (statut d'erreur), "protocol".
+    """
+
+    def __init__(self, message: str, *, kind: str, status_code: int | None = None):
+        super().__init__(message)
+        self.kind = kind
+        self.status_code = status_code
+
+    def to_dict(self) -> dict:
+        return {"error": "llm_" + self.kind, "message": str(self), "status_code": self.status_code}
+
+
+class OllamaClient:
+    """Client Ollama asynchrone: pool de connexions keep-alive partagé, timeouts et retries.
+
+    Les retries ne portent que sur les erreurs de connexion survenues avant le premier
+    fragment reçu: une génération entamée n'est jamais rejouée.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        connect_timeout: float,
+        read_timeout: float,
+        total_timeout: float,
+        max_retries: int,
+        max_connections: int,
+    ):
+        self.base_url = base_url
+        self.timeout = httpx.Timeout(connect=connect_timeout, read=read_timeout, write=connect_timeout, pool=connect_timeout)
+        self.total_timeout = total_timeout
+        self.max_retries = max_retries
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._client: httpx.AsyncClient | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        # Un client httpx est lié à la boucle qui l'a créé
+        if self._client is None or self._loop is not loop or self._client.is_closed:
+            self._client = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout, limits=self.limits)
+            self._loop = loop
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    async def stream_chat(self, prompt: str, *, model: str | None = None) -> AsyncIterator[str]:
+        """Fragments de la réponse au fil de l'eau. Fermer l'itérateur ferme la connexion,
+        ce qui interrompt la génération côté Ollama."""
+        t0 = time.perf_counter()
+        first = True
+        inner = self._stream_chat(prompt, model)
+        try:
+            async for piece in inner:
+                if first:
+                    STAGE_SECONDS.observe(time.perf_counter() - t0, stage="llm.first_token")
+                    first = False
+                yield piece
+        except LLMError as e:
+            LLM_ERRORS.inc(kind=e.kind)
+            raise
+        finally:
+            await inner.aclose()
+            STAGE_SECONDS.observe(time.perf_counter() - t0, stage="llm.generate")
+
+    async def _stream_chat(self, prompt: str, model: str | None) -> AsyncIterator[str]:
+        body = _chat_body(prompt, model)
+        deadline = time.monotonic() + self.total_timeout
+        attempt = 0
+        while True:
+            started = False
             try:
-                chunk = json.loads(line)
-            except Exception:
-                continue
-            msg = chunk.get("message") or {}
-            content = msg.get("content")
-            if isinstance(content, str) and content:
-                full_text_parts.append(content)
-            if chunk.get("done") is True:
-                break
-        return ("".join(full_text_parts)).strip()
-    except Exception as e:
-        return {"error": f"❌ Erreur Ollama sync: {str(e)}"}
+                async with self._get_client().stream("POST", "/api/chat", json=body) as resp:
+                    if resp.status_code >= 400:
+                        detail = (await resp.aread()).decode("utf-8", errors="ignore")[:300]
+                        raise LLMError(f"Ollama HTTP {resp.status_code}: {detail}", kind="http", status_code=resp.status_code)
+                    async for line in resp.aiter_lines():
+                        if time.monotonic() > deadline:
+                            raise LLMError(f"Génération > {self.total_timeout:.0f}s", kind="timeout")
+                        if not line:
+                            continue
+                        try:
+                            chunk = json.loads(line)
+                        except Exception:
+                            continue
+                        if chunk.get("error"):
+                            raise LLMError(f"Ollama: {chunk['error']}", kind="protocol")
+                        msg = chunk.get("message") or {}
+                        content = msg.get("content")
+                        if isinstance(content, str) and content:
+                            started = True
+                            yield content
+                        if chunk.get("done") is True:
+                            _record_eval_stats(chunk)
+                            return
+                return
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError, httpx.PoolTimeout) as e:
+                if started or attempt >= self.max_retries:
+                    raise LLMError(f"Ollama injoignable ({self.base_url}): {e}", kind="connect") from e
+                attempt += 1
+                LLM_RETRIES.inc()
+                print(f"[LLM][RETRY] tentative {attempt}/{self.max_retries} après: {e!r}")
+                await asyncio.sleep(min(0.5 * 2 ** (attempt - 1), 4.0))
+            except httpx.TimeoutException as e:
+                raise LLMError(f"Timeout Ollama: {e!r}", kind="timeout") from e
+            except httpx.HTTPError as e:
+                raise LLMError(f"Erreur Ollama: {e!r}", kind="protocol") from e
+
+    async def chat(self, prompt: str, *, model: str | None = None) -> str:
+        parts = [piece async for piece in self.stream_chat(prompt, model=model)]
+        return "".join(parts).strip()
+
+    async def keep_alive(self, *, model: str | None = None) -> None:
+        """Charge le modèle en mémoire côté Ollama (requête sans prompt) et l'y maintient."""
+        body = {"model": model or OLLAMA_MODEL, "keep_alive": OLLAMA_KEEP_ALIVE}
+        try:
+            resp = await self._get_client().post("/api/generate", json=body)
+        except httpx.TimeoutException as e:
+            raise LLMError(f"Timeout Ollama: {e!r}", kind="timeout") from e
+        except httpx.HTTPError as e:
+            raise LLMError(f"Ollama injoignable ({self.base_url}): {e}", kind="connect") from e
+        if resp.status_code >= 400:
+            raise LLMError(f"Ollama HTTP {resp.status_code}: {resp.text[:300]}", kind="http", status_code=resp.status_code)
+
+
+LLM_CLIENT = OllamaClient(
+    OLLAMA_BASE,
+    connect_timeout=OLLAMA_CONNECT_TIMEOUT,
+    read_timeout=OLLAMA_READ_TIMEOUT,
+    total_timeout=OLLAMA_TOTAL_TIMEOUT,
+    max_retries=OLLAMA_MAX_RETRIES,
+    max_connections=OLLAMA_MAX_CONNECTIONS,
+)
@@ -1,18 +1,126 @@
 import pytesseract
-from pdf2image import convert_from_bytes
+from pdf2image import convert_from_path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Optional
+import hashlib
+import multiprocessing
 import os
+import tempfile
+import threading
+
+from app.services.metrics import count_error
 
 # === Configuration Tesseract path & langues ===
-pytesseract.pytesseract.tesseract_cmd = "/opt/homebrew/bin/tesseract"
-os.environ["TESSDATA_PREFIX"] = "/opt/homebrew/share/tessdata"
+# Par défaut: tesseract du PATH. Surcharger via TESSERACT_CMD / TESSDATA_PREFIX (ex. Homebrew).
+TESSERACT_CMD = os.getenv("TESSERACT_CMD", "")
+TESSDATA_PREFIX = os.getenv("TESSDATA_PREFIX", "")
+OCR_LANG = os.getenv("OCR_LANG", "fra")
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+# Pool de processus Tesseract (0 = OCR séquentiel dans le process courant)
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(min(4, os.cpu_count() or 1))))
+# Cache disque des résultats OCR par (hash du PDF, page, dpi, langue) (vide pour désactiver)
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join("storage", "ocr_cache"))
+
+
+def _configure_tesseract():
+    if TESSERACT_CMD:
+        pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+    if TESSDATA_PREFIX:
+        os.environ["TESSDATA_PREFIX"] = TESSDATA_PREFIX
+
+_configure_tesseract()
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: pas de fork d'un process qui porte déjà torch et ses threads
+            _pool = ProcessPoolExecutor(
+                max_workers=OCR_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_configure_tesseract,
+            )
+        return _pool
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(OCR_CACHE_DIR, key[:2], f"{key}.txt")
+
+
+def _cache_key(pdf_sha256: str, page_number: int) -> str:
+    return hashlib.sha256(f"{pdf_sha256}|{page_number}|{OCR_DPI}|{OCR_LANG}".encode()).hexdigest()
+
+
+def _cached_text(key: str) -> Optional[str]:
+    try:
+        with open(_cache_path(key), "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _ocr_page(pdf_path: str, page_number: int, key: Optional[str] = None) -> str:
+    """Rasterise UNE page puis OCR (exécuté dans un worker); résultat mis en cache sous `key`."""
+    images = convert_from_path(pdf_path, dpi=OCR_DPI, first_page=page_number, last_page=page_number)
+    if not images:
+        return ""
+    text = pytesseract.image_to_string(images[0], lang=OCR_LANG)
+
+    if key:
+        path = _cache_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp, path)
+    return text
+
+
+def ocr_pages(file_bytes: bytes, page_numbers: Iterable[int]) -> Dict[int, str]:
+    """OCR des pages demandées (numérotation 1-based), une page rasterisée à la fois.
+
+    Cache consulté avant toute rastérisation (clé: contenu du PDF + page + dpi + langue).
+    Les pages en échec sont absentes du résultat.
+    """
+    page_numbers = sorted(set(page_numbers))
+    if not page_numbers:
+        return {}
+    results: Dict[int, str] = {}
+    keys: Dict[int, Optional[str]] = {n: None for n in page_numbers}
+    if OCR_CACHE_DIR:
+        pdf_sha256 = hashlib.sha256(file_bytes).hexdigest()
+        for n in page_numbers:
+            keys[n] = _cache_key(pdf_sha256, n)
+            cached = _cached_text(keys[n])
+            if cached is not None:
+                results[n] = cached
+    todo = [n for n in page_numbers if n not in results]
+    if not todo:
+        return results
 
-def ocr_pdf(file_bytes: bytes) -> str:
-    """Effectue OCR sur un PDF scanné."""
-    text = []
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(file_bytes)
+        pdf_path = tmp.name
     try:
-        images = convert_from_bytes(file_bytes)
-        for img in images:
-            text.append(pytesseract.image_to_string(img, lang="fra"))
-    except Exception as e:
-        print(f"[OCR ERROR] {e}")
-    return "\n".join(text)
+        if OCR_WORKERS > 0 and len(todo) > 1:
+            pool = _get_pool()
+            futures = {n: pool.submit(_ocr_page, pdf_path, n, keys[n]) for n in todo}
+            for n, fut in futures.items():
+                try:
+                    results[n] = fut.result()
+                except Exception as e:
+                    count_error("parse.ocr")
+                    print(f"[OCR ERROR] page {n}: {e}")
+        else:
+            for n in todo:
+                try:
+                    results[n] = _ocr_page(pdf_path, n, keys[n])
+                except Exception as e:
+                    count_error("parse.ocr")
+                    print(f"[OCR ERROR] page {n}: {e}")
+    finally:
+        os.remove(pdf_path)
+    return results
@@ -1,12 +1,21 @@
 import io
 import mimetypes
+from bisect import bisect_right
 from pathlib import Path
-from typing import Protocol
+from typing import Protocol, List, Dict, Any, Tuple
 import pdfplumber
 from docx import Document
-from app.services.ocr_helper import ocr_pdf
+from app.services.ocr_helper import ocr_pages
+from app.services.metrics import REGISTRY, timed, count_error
+from app.services.tracing import annotate
+import os
 import re
 
+# En dessous de ce nombre de caractères extraits, une page avec image est OCRisée
+OCR_MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", "20"))
+
+PARSED_PAGES = REGISTRY.counter("aorisk_parsed_pages_total", "Pages extraites (method: text | ocr)", ("method",))
+
 
 def clean_ocr_noise(text: str) -> str:
     """Nettoyage léger des artefacts OCR et césures.
@@ -36,56 +45,115 @@ def clean_ocr_noise(text: str) -> str:
     return text.strip()
 
 
+class ParsedDocument:
+    """Document extrait: textes de pages nettoyés + offsets cumulés dans `full_text`.
+
+    `full_text` est la concaténation des pages (séparateur "\n"); `page_starts[i]` est
+    l'offset caractère du début de la page i+1. Page d'un offset = bisect sur ces offsets.
+    """
+
+    PAGE_SEPARATOR = "\n"
+
+    def __init__(self, pages: List[str]):
+        self.pages = list(pages) or [""]
+        self.page_starts: List[int] = []
+        offset = 0
+        for text in self.pages:
+            self.page_starts.append(offset)
+            offset += len(text) + len(self.PAGE_SEPARATOR)
+        self.full_text = self.PAGE_SEPARATOR.join(self.pages)
+
+    def __len__(self) -> int:
+        return len(self.pages)
+
+    def page_at(self, char_offset: int) -> int:
+        """Numéro de page (1-based) contenant l'offset caractère."""
+        return max(1, bisect_right(self.page_starts, char_offset))
+
+    def page_span(self, char_start: int, char_end: int) -> Tuple[int, int]:
+        """(première, dernière) page couvertes par [char_start, char_end)."""
+        return self.page_at(char_start), self.page_at(max(char_start, char_end - 1))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Format historique { "full_text": str, "pages": [ { "page": int, "text": str } ] }."""
+        return {
+            "full_text": self.full_text,
+            "pages": [
+                {"page": i + 1, "text": text, "char_start": start}
+                for i, (text, start) in enumerate(zip(self.pages, self.page_starts))
+            ],
+        }
+
+
 class Parser(Protocol):
-    def extract(self, file_bytes: bytes) -> str: ...
+    def parse(self, file_bytes: bytes) -> ParsedDocument: ...
 
 
 # ---------- Implémentations ----------
 class TxtParser:
-    def extract(self, file_bytes: bytes) -> str:
-        return file_bytes.decode("utf-8", errors="ignore")
+    def parse(self, file_bytes: bytes) -> ParsedDocument:
+        with timed("parse.txt"):
+            text = file_bytes.decode("utf-8", errors="ignore")
+        with timed("parse.clean"):
+            return ParsedDocument([clean_ocr_noise(text)])
 
 
 class PdfParser:
-    def extract(self, file_bytes: bytes, with_pages: bool = False):
-        texts = []
-        pages = []
+    def parse(self, file_bytes: bytes) -> ParsedDocument:
+        page_texts: list[str] = []
         try:
-            with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+            to_ocr: list[int] = []
+            with timed("parse.pdfplumber"), pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
                 for i, page in enumerate(pdf.pages):
                     page_text = page.extract_text() or ""
-                    if page_text:
-                        texts.append(page_text)
-                    if with_pages:
-                        pages.append({"page": i + 1, "text": page_text})
-
-            # OCR fallback si aucun texte détecté
-            if not texts or not "".join(texts).strip():
-                print("[INFO] Aucun texte détecté, fallback OCR…")
-                ocr_text = ocr_pdf(file_bytes)
-                texts = [ocr_text]
-                if with_pages:
-                    pages = [{"page": i + 1, "text": t} for i, t in enumerate(ocr_text.split("\f"))]
+                    page_texts.append(page_text)
+                    # OCR décidé page par page: annexe scannée sans couche texte
+                    if len(page_text.strip()) < OCR_MIN_CHARS and page.images:
+                        to_ocr.append(i + 1)
+                annotate(bytes=len(file_bytes), pages=len(page_texts))
+
+            # Aucun texte nulle part: tout le document passe en OCR
+            if not "".join(page_texts).strip():
+                to_ocr = list(range(1, len(page_texts) + 1))
+
+            if to_ocr:
+                print(f"[INFO] OCR de {len(to_ocr)}/{len(page_texts)} page(s) sans texte…")
+                with timed("parse.ocr"):
+                    ocr_results = ocr_pages(file_bytes, to_ocr)
+                    # Seules les pages listées sont rastérisées puis OCRisées
+                    annotate(
+                        pages=len(to_ocr),
+                        page_numbers=to_ocr,
+                        chars=sum(len(t or "") for t in ocr_results.values()),
+                    )
+                for num, ocr_text in ocr_results.items():
+                    page_texts[num - 1] = ocr_text
+                PARSED_PAGES.inc(len(to_ocr), method="ocr")
+            PARSED_PAGES.inc(len(page_texts) - len(to_ocr), method="text")
 
         except Exception as e:
+            count_error("parse.pdf")
             print(f"[PDF ERROR] {e}")
 
-        result = {"full_text": clean_ocr_noise("\n".join(texts).strip())}
-        if with_pages:
-            # Nettoyage page par page
-            result["pages"] = [{"page": p["page"], "text": clean_ocr_noise(p.get("text", ""))} for p in pages]
-        return result
+        # Nettoyage une seule fois, page par page (le texte complet en est la concaténation)
+        with timed("parse.clean"):
+            annotate(chars=sum(len(t) for t in page_texts))
+            return ParsedDocument([clean_ocr_noise(t) for t in page_texts])
 
 
 class DocxParser:
-    def extract(self, file_bytes: bytes) -> str:
-        text = []
-        try:
-            doc = Document(io.BytesIO(file_bytes))
-            text = [p.text for p in doc.paragraphs if p.text.strip()]
-        except Exception as e:
-            print(f"[DOCX ERROR] {e}")
-        return "\n".join(text)
+    def parse(self, file_bytes: bytes) -> ParsedDocument:
+        paragraphs = []
+        with timed("parse.docx"):
+            try:
+                doc = Document(io.BytesIO(file_bytes))
+                paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
+            except Exception as e:
+                count_error("parse.docx")
+                print(f"[DOCX ERROR] {e}")
+            text = "\n".join(paragraphs)
+        with timed("parse.clean"):
+            return ParsedDocument([clean_ocr_noise(text)])
 
 
 # Factory
@@ -112,31 +180,9 @@ def parser_factory(filename: str) -> Parser:
     raise ValueError(f"Format non supporté : {filename}")
 
 
-# Façade compat pour upload_routes
-def extract_text_from_file(file) -> dict:
-    """
-    Extraction texte et pages depuis un UploadFile (FastAPI).
-    Retourne { "full_text": str, "pages": [ { "page": int, "text": str } ] }
-    """
-    filename = file.filename.lower()
-    file_bytes = file.file.read()
-    file.file.seek(0)              
-
-    if filename.endswith(".pdf"):
-        parser = PdfParser()
-        return parser.extract(file_bytes, with_pages=True)
-
-    elif filename.endswith(".docx") or filename.endswith(".doc"):
-        parser = DocxParser()
-        text = parser.extract(file_bytes)
-        clean = clean_ocr_noise(text)
-        return {"full_text": clean, "pages": [{"page": 1, "text": clean}]}
-
-    elif filename.endswith(".txt"):
-        parser = TxtParser()
-        text = parser.extract(file_bytes)
-        clean = clean_ocr_noise(text)
-        return {"full_text": clean, "pages": [{"page": 1, "text": clean}]}
-
-    else:
+def parse_document(filename: str, file_bytes: bytes) -> ParsedDocument:
+    """Extraction structurée (pages nettoyées + offsets) à partir du contenu brut."""
+    name = (filename or "").lower()
+    if not name.endswith((".pdf", ".docx", ".doc", ".txt")):
         raise ValueError("Format non supporté. Utilisez PDF, DOCX ou TXT.")
+    return parser_factory(name).parse(file_bytes)
@@ -0,0 +1,157 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+import os
+import sys
+import threading
+import time
+
+# Profilage par échantillonnage (admin): armé pour N requêtes, puis piles agrégées au format
+# "collapsed" (une ligne "frame;frame;... compte"), lisible par flamegraph.pl / speedscope
+PROFILE_DIR = os.getenv("PROFILE_DIR", "storage/profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_REQUESTS = int(os.getenv("PROFILE_MAX_REQUESTS", "1000"))
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__") or os.path.basename(code.co_filename)
+    return f"{module}:{code.co_name}"
+
+
+def _collapse(frame, thread_name: str) -> str:
+    stack: List[str] = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.append(thread_name)
+    return ";".join(reversed(stack))
+
+
+class SamplingProfiler:
+    """Échantillonne les piles de tous les threads tant qu'une requête profilée est en cours.
+
+    `arm(n)` profile les n prochaines requêtes (/query*, fichiers d'ingestion); à la fin de
+    la n-ième, les piles sont écrites dans PROFILE_DIR/<horodatage>.collapsed.
+    Sans profil armé, `request()` ne coûte qu'un test de booléen.
+    """
+
+    def __init__(self, out_dir: str = PROFILE_DIR):
+        self.out_dir = out_dir
+        self.armed = False
+        self.target = 0
+        self.started = 0
+        self.finished = 0
+        self.active = 0
+        self.interval = PROFILE_INTERVAL_MS / 1000
+        self.samples = 0
+        self.armed_at: Optional[str] = None
+        self.dumps: List[Dict[str, Any]] = []
+        self._stacks: Counter = Counter()
+        self._thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+
+    def arm(self, requests: int, interval_ms: Optional[float] = None) -> Dict[str, Any]:
+        if requests < 1 or requests > PROFILE_MAX_REQUESTS:
+            raise ValueError(f"requests doit être entre 1 et {PROFILE_MAX_REQUESTS}")
+        # Échantillonneur du profil précédent: arrêt signalé par _finish, attendu hors verrou
+        previous = self._thread
+        if previous is not None and not self.armed:
+            previous.join(timeout=1.0)
+        with self._lock:
+            if self.armed:
+                raise RuntimeError("Un profil est déjà en cours")
+            if self._thread is not None and self._thread.is_alive():
+                raise RuntimeError("L'échantillonneur précédent ne s'est pas encore arrêté")
+            self.armed = True
+            self.target = requests
+            self.started = self.finished = self.active = self.samples = 0
+            self.interval = max(0.001, (interval_ms or PROFILE_INTERVAL_MS) / 1000)
+            self.armed_at = datetime.utcnow().isoformat()
+            self._stacks = Counter()
+            self._wake.clear()
+            self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+            self._thread.start()
+        print(f"[PROFILE] armé pour {requests} requête(s), intervalle={self.interval * 1000:.1f}ms")
+        return self.status()
+
+    def cancel(self) -> Dict[str, Any]:
+        with self._lock:
+            if self.armed:
+                self._finish()
+        return self.status()
+
+    @contextmanager
+    def request(self, label: str):
+        if not self.armed:
+            yield
+            return
+        with self._lock:
+            counted = self.armed and self.started < self.target
+            if counted:
+                self.started += 1
+                self.active += 1
+        try:
+            yield
+        finally:
+            if counted:
+                with self._lock:
+                    self.active -= 1
+                    self.finished += 1
+                    if self.armed and self.finished >= self.target:
+                        self._finish()
+
+    def _sample_loop(self) -> None:
+        own = threading.get_ident()
+        while not self._wake.wait(self.interval):
+            if not self.active:
+                continue
+            names = {t.ident: t.name for t in threading.enumerate()}
+            batch = [
+                _collapse(frame, names.get(tid, str(tid)))
+                for tid, frame in sys._current_frames().items()
+                if tid != own
+            ]
+            with self._lock:
+                self._stacks.update(batch)
+                self.samples += 1
+
+    def _finish(self) -> None:
+        """Appelé sous verrou: arrêt de l'échantillonneur et écriture des piles."""
+        self.armed = False
+        self._wake.set()
+        stacks, self._stacks = self._stacks, Counter()
+        os.makedirs(self.out_dir, exist_ok=True)
+        name = datetime.utcnow().strftime("%Y%m%dT%H%M%S_%f") + ".collapsed"
+        path = os.path.join(self.out_dir, name)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        self.dumps.append({
+            "path": path,
+            "requests": self.finished,
+            "samples": self.samples,
+            "stacks": len(stacks),
+            "armed_at": self.armed_at,
+            "finished_at": datetime.utcnow().isoformat(),
+        })
+        print(f"[PROFILE] {self.finished} requête(s), {self.samples} échantillons → {path}")
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "armed": self.armed,
+                "target": self.target,
+                "started": self.started,
+                "finished": self.finished,
+                "interval_ms": round(self.interval * 1000, 2),
+                "samples": self.samples,
+                "armed_at": self.armed_at,
+                "dumps": list(self.dumps),
+            }
+
+
+PROFILER = SamplingProfiler()
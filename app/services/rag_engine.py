@@ -1,49 +1,30 @@
 from __future__ import annotations
-from typing import List, Dict, Any, Optional
-from fastapi.concurrency import run_in_threadpool
-from app.services.llm_service import query_ollama_sync
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from app.services.llm_service import LLM_CLIENT, OLLAMA_MODEL, SYSTEM_ROLE_QA
+from app.services.llm_scheduler import LLM_SCHEDULER, PRIORITY_INTERACTIVE, PRIORITY_BATCH, LLM_MAX_CONCURRENCY
 from app.services.retriever import retrieve_top_chunks
-from app.services.chunker import tokenizer
+from app.services.context_packer import (
+    CONTEXT_SEPARATOR,
+    LLM_CONTEXT_BUDGET,
+    estimate_tokens,
+    fixed_tokens,
+    normalize_chunk,
+    pack_context,
+)
+from app.services.answer_cache import ANSWER_CACHE
+from app.services.embedder import embed_query
+from app.services.metrics import timed
+from app.services.tracing import annotate, span
+from fastapi.concurrency import run_in_threadpool
+import asyncio
+import os
 import re
 
-def clean_chunk(text: str, max_tokens: int = 300) -> str:
-    """Nettoie et tronque un chunk avant injection."""
-    # Suppression des espaces et retours multiples
-    text = " ".join(text.split())
-
-    # Tronquage à max_tokens tokens
-    tokens = tokenizer.encode(text, add_special_tokens=False)
-    if len(tokens) > max_tokens:
-        tokens = tokens[:max_tokens]
-        text = tokenizer.decode(tokens)
-
-    return text.strip()
-
-def make_context(chunks: List[str]) -> str:
-    """Nettoie + concatène les chunks en un seul contexte texte."""
-    cleaned = [clean_chunk(ch) for ch in chunks]
-    # Séparateur visuel clair pour aider le LLM à distinguer les extraits
-    return "\n\n---\n\n".join(cleaned)
-
-async def generate_answer(
-    question: str,
-    document_id: Optional[str],
-    *,
-    chunks: Optional[List[str]] = None,
-    metas: Optional[List[Dict[str, Any]]] = None,
-    ids: Optional[List[str]] = None,
-) -> Dict[str, Any]:
-    # Utiliser les résultats déjà récupérés si fournis; sinon, appeler le retriever
-    if chunks is None or metas is None or ids is None:
-        chunks, metas, ids, _ = retrieve_top_chunks(
-            question,
-            target_doc_id=document_id,
-        )
-
-    # Contexte nettoyé et tronqué (ce que le LLM voit)
-    context = make_context(chunks)
+# Appels LLM simultanés pour un même lot de questions (/query/batch)
+QUERY_BATCH_CONCURRENCY = int(os.getenv("QUERY_BATCH_CONCURRENCY", str(LLM_MAX_CONCURRENCY)))
+QUERY_BATCH_MAX_QUESTIONS = int(os.getenv("QUERY_BATCH_MAX_QUESTIONS", "50"))
 
-    qa_prompt = f"""
+PROMPT_TEMPLATE = """
 RÔLE: Assistant AO Risk.
 Réponds STRICTEMENT avec le contenu ci-dessous.
 
@@ -56,16 +37,53 @@ QUESTION:
 Réponse:
 """.strip()
 
-    llm_text = await run_in_threadpool(query_ollama_sync, qa_prompt, task="qa")
+def clean_chunk(text: str) -> str:
+    """Nettoie un chunk avant injection (la taille est gérée par le budget de contexte)."""
+    return normalize_chunk(text)
+
+def make_context(chunks: List[str]) -> str:
+    """Concatène les chunks (déjà nettoyés) en un seul contexte texte."""
+    # Séparateur visuel clair pour aider le LLM à distinguer les extraits
+    return CONTEXT_SEPARATOR.join(chunks)
 
-    # Sélection de source 'evidence-based': choisir le chunk avec le plus d'overlap lexical
+def build_qa_prompt(question: str, chunks: List[str]) -> str:
+    return PROMPT_TEMPLATE.format(context=make_context(chunks), question=question)
+
+def prepare_prompt(
+    question: str,
+    chunks: List[str],
+    metas: List[Dict[str, Any]],
+) -> Tuple[str, List[str], List[Dict[str, Any]], Dict[str, int]]:
+    """Sélection des chunks dans le budget de tokens LLM puis prompt.
+
+    Aucun appel tokenizer ici: comptes des chunks lus dans les métadonnées (indexation),
+    question estimée par sa longueur. Retourne (prompt, textes injectés, metas retenues, usage).
+    """
+    with timed("rag.pack_context"):
+        packed = pack_context(chunks, metas)
+        usage = {
+            "context_tokens": packed["context_tokens"],
+            # Message système (envoyé à chaque appel) et gabarit comptés une fois (mis en cache)
+            "prompt_tokens": fixed_tokens(SYSTEM_ROLE_QA)
+            + fixed_tokens(PROMPT_TEMPLATE.format(context="", question=""))
+            + packed["context_tokens"] + estimate_tokens(question),
+            "context_budget": LLM_CONTEXT_BUDGET,
+        }
+        annotate(candidates=len(chunks), used_chunks=len(packed["indices"]), truncated=packed["truncated"], **usage)
+    # Textes vus par le LLM (premier chunk éventuellement tronqué): base de la sélection de source
+    used_chunks = packed["texts"]
+    used_metas = [metas[i] for i in packed["indices"]]
+    return build_qa_prompt(question, used_chunks), used_chunks, used_metas, usage
+
+def select_source(question: str, answer_text: str, chunks: List[str], metas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Sélection de source 'evidence-based': choisir le chunk avec le plus d'overlap lexical."""
     source_obj: Dict[str, Any] = {}
     try:
         if chunks and metas:
             def tok(s: str) -> set[str]:
                 return set(re.findall(r"[A-Za-zÀ-ÖØ-öø-ÿ0-9]+", (s or "").lower()))
 
-            ans_tokens = tok(llm_text if isinstance(llm_text, str) else str(llm_text))
+            ans_tokens = tok(answer_text)
             q_tokens = tok(question)
             best_i = 0
             best_score = -1.0
@@ -100,9 +118,153 @@ Réponse:
             }
     except Exception:
         source_obj = {}
+    return source_obj
 
-    return {
-        "reponse": llm_text if isinstance(llm_text, str) else str(llm_text),
-        "used_chunks": len(chunks),
-        "source": source_obj,
+async def _cached_answer(document_id: Optional[str], question: str, ids: List[str]) -> Optional[Dict[str, Any]]:
+    # Niveau sémantique: embedding de la question (modèle) hors de la boucle d'événements
+    if ANSWER_CACHE.semantic:
+        return await run_in_threadpool(ANSWER_CACHE.get, document_id, question, ids, OLLAMA_MODEL, embed_query)
+    return ANSWER_CACHE.get(document_id, question, ids, OLLAMA_MODEL)
+
+async def _cache_answer(document_id: Optional[str], question: str, ids: List[str], answer: Dict[str, Any]) -> None:
+    if ANSWER_CACHE.semantic:
+        await run_in_threadpool(ANSWER_CACHE.put, document_id, question, ids, OLLAMA_MODEL, answer, embed_query)
+    else:
+        ANSWER_CACHE.put(document_id, question, ids, OLLAMA_MODEL, answer)
+
+async def generate_answer(
+    question: str,
+    document_id: Optional[str],
+    *,
+    chunks: Optional[List[str]] = None,
+    metas: Optional[List[Dict[str, Any]]] = None,
+    ids: Optional[List[str]] = None,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> Dict[str, Any]:
+    # Utiliser les résultats déjà récupérés si fournis; sinon, appeler le retriever
+    if chunks is None or metas is None or ids is None:
+        chunks, metas, ids, _ = retrieve_top_chunks(
+            question,
+            target_doc_id=document_id,
+        )
+
+    with timed("rag.answer_cache"):
+        cached = await _cached_answer(document_id, question, ids)
+        annotate(hit=cached is not None)
+    if cached is not None:
+        cached["cached"] = True
+        return cached
+
+    qa_prompt, used_chunks, used_metas, usage = prepare_prompt(question, chunks, metas)
+
+    # Admission LLM (LLMBusyError si file pleine / attente trop longue);
+    # LLMError remonte à l'appelant (réponse HTTP structurée)
+    with span("llm", priority=priority):
+        async with LLM_SCHEDULER.slot(priority):
+            with span("llm.generate", model=OLLAMA_MODEL):
+                answer_text = await LLM_CLIENT.chat(qa_prompt)
+
+    with timed("rag.select_source"):
+        source = select_source(question, answer_text, used_chunks, used_metas)
+    answer = {
+        "reponse": answer_text,
+        "used_chunks": len(used_chunks),
+        "source": source,
+        **usage,
     }
+    if answer_text:
+        await _cache_answer(document_id, question, ids, answer)
+    return answer
+
+async def generate_answer_stream(
+    question: str,
+    document_id: Optional[str] = None,
+    *,
+    chunks: List[str],
+    metas: List[Dict[str, Any]],
+    ids: List[str],
+    priority: int = PRIORITY_INTERACTIVE,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """Variante streaming de `generate_answer`.
+
+    Produit ("queue", position) tant que la requête attend son tour, ("token", fragment)
+    au fil de la génération puis ("done", réponse complète au même format que
+    `generate_answer`). Fermer l'itérateur libère la place ou interrompt la génération.
+    Une réponse en cache est renvoyée directement par ("done", ...).
+    """
+    with timed("rag.answer_cache"):
+        cached = await _cached_answer(document_id, question, ids)
+        annotate(hit=cached is not None)
+    if cached is not None:
+        cached["cached"] = True
+        yield "done", cached
+        return
+
+    qa_prompt, used_chunks, used_metas, usage = prepare_prompt(question, chunks, metas)
+    ticket = LLM_SCHEDULER.enqueue(priority)
+    try:
+        async for position in ticket.wait():
+            yield "queue", position
+    except BaseException:
+        ticket.release()
+        raise
+
+    parts: List[str] = []
+    llm_stream = LLM_CLIENT.stream_chat(qa_prompt)
+    try:
+        async for piece in llm_stream:
+            parts.append(piece)
+            yield "token", piece
+    finally:
+        # Ferme la connexion Ollama (client parti ou génération terminée)
+        await llm_stream.aclose()
+        ticket.release()
+
+    answer_text = "".join(parts).strip()
+    with timed("rag.select_source"):
+        source = select_source(question, answer_text, used_chunks, used_metas)
+    answer = {
+        "reponse": answer_text,
+        "used_chunks": len(used_chunks),
+        "source": source,
+        **usage,
+    }
+    if answer_text:
+        await _cache_answer(document_id, question, ids, answer)
+    yield "done", answer
+
+async def generate_answers_batch(
+    questions: List[str],
+    document_id: Optional[str],
+    retrievals: List[Tuple[List[str], List[Dict[str, Any]], List[str], Dict[str, Any]]],
+    *,
+    concurrency: int = QUERY_BATCH_CONCURRENCY,
+    priority: int = PRIORITY_BATCH,
+) -> AsyncIterator[Tuple[int, Optional[Dict[str, Any]], Optional[Exception]]]:
+    """Génère les réponses d'un lot (retrievals déjà calculés, un par question).
+
+    Au plus `concurrency` appels en vol; produit (index, réponse, None) ou (index, None, erreur)
+    dans l'ordre de fin. Fermer l'itérateur annule les appels restants.
+    """
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def one(i: int):
+        chunks, metas, ids, _ = retrievals[i]
+        if not chunks:
+            return i, {"reponse": "❌ Aucun extrait trouvé", "used_chunks": 0, "source": {}}, None
+        async with sem:
+            try:
+                answer = await generate_answer(
+                    questions[i], document_id, chunks=chunks, metas=metas, ids=ids, priority=priority,
+                )
+                return i, answer, None
+            except Exception as e:
+                return i, None, e
+
+    tasks = [asyncio.ensure_future(one(i)) for i in range(len(questions))]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        for t in tasks:
+            t.cancel()
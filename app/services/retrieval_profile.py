@@ -0,0 +1,92 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import os
+
+# Profil de recherche hybride (JSON, produit par `python -m tools.retrieval_sweep`);
+# vide = valeurs historiques ci-dessous
+RETRIEVAL_PROFILE_PATH = os.getenv("RETRIEVAL_PROFILE_PATH", "")
+
+# Paliers selon le nombre de chunks du périmètre (max_doc_chunks inclus, None = sans borne)
+DEFAULT_TIERS: List[Dict[str, Any]] = [
+    {"max_doc_chunks": 30, "top_k": 8, "min_keep": 4},
+    {"max_doc_chunks": 80, "top_k": 14, "min_keep": 5},
+    {"max_doc_chunks": None, "top_k": 17, "min_keep": 6},
+]
+
+
+class RetrievalProfile:
+    """Paramètres de la recherche hybride: paliers top_k, fusion RRF pondérée, plafond de chunks.
+
+    `min_similarity` (similarité cosinus) filtre les résultats vectoriels avant la fusion;
+    None = pas de filtre.
+    """
+
+    def __init__(
+        self,
+        tiers: Optional[List[Dict[str, Any]]] = None,
+        rrf_k: int = 60,
+        vector_weight: float = 1.0,
+        bm25_weight: float = 1.0,
+        max_chunks: int = 10,
+        min_similarity: Optional[float] = None,
+        name: str = "default",
+    ):
+        self.tiers = [dict(t) for t in (tiers or DEFAULT_TIERS)]
+        # Dernier palier sans borne: tout périmètre trouve un palier
+        self.tiers.sort(key=lambda t: float("inf") if t.get("max_doc_chunks") is None else t["max_doc_chunks"])
+        if self.tiers[-1].get("max_doc_chunks") is not None:
+            self.tiers[-1]["max_doc_chunks"] = None
+        self.rrf_k = int(rrf_k)
+        self.vector_weight = float(vector_weight)
+        self.bm25_weight = float(bm25_weight)
+        self.max_chunks = int(max_chunks)
+        self.min_similarity = None if min_similarity is None else float(min_similarity)
+        self.name = name
+
+    def tier_for(self, total_chunks: int) -> Dict[str, Any]:
+        for tier in self.tiers:
+            limit = tier.get("max_doc_chunks")
+            if limit is None or total_chunks <= limit:
+                return tier
+        return self.tiers[-1]
+
+    def params_for(self, total_chunks: int) -> Tuple[int, int, Optional[float]]:
+        """(top_k, min_keep, min_similarity) pour un périmètre de `total_chunks` chunks."""
+        tier = self.tier_for(total_chunks)
+        return int(tier["top_k"]), int(tier.get("min_keep", 0)), self.min_similarity
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "tiers": self.tiers,
+            "rrf_k": self.rrf_k,
+            "vector_weight": self.vector_weight,
+            "bm25_weight": self.bm25_weight,
+            "max_chunks": self.max_chunks,
+            "min_similarity": self.min_similarity,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RetrievalProfile":
+        return cls(
+            tiers=data.get("tiers"),
+            rrf_k=data.get("rrf_k", 60),
+            vector_weight=data.get("vector_weight", 1.0),
+            bm25_weight=data.get("bm25_weight", 1.0),
+            max_chunks=data.get("max_chunks", 10),
+            min_similarity=data.get("min_similarity"),
+            name=data.get("name", "custom"),
+        )
+
+
+def load_profile(path: str = RETRIEVAL_PROFILE_PATH) -> RetrievalProfile:
+    if not path:
+        return RetrievalProfile()
+    with open(path, "r", encoding="utf-8") as f:
+        profile = RetrievalProfile.from_dict(json.load(f))
+    print(f"[RAG] profil de recherche '{profile.name}' chargé depuis {path}")
+    return profile
+
+
+RETRIEVAL_PROFILE = load_profile()
@@ -1,30 +1,28 @@
 from __future__ import annotations
 from typing import List, Tuple, Dict, Any, Optional
-from app.services.embedder import embed_query
+from app.services.embedder import embed_queries
 from app.services.vector_service import get_chroma_collection
 from app.services.bm25_service import bm25_query  # ⚡ import BM25
+from app.services.catalog import CATALOG
+from app.services.flat_index import FLAT_CACHE, FLAT_INDEX_ENABLED
+from app.services.metrics import timed
+from app.services.tracing import annotate
+from app.services.retrieval_profile import RETRIEVAL_PROFILE, RetrievalProfile
 
-collection = get_chroma_collection()
+def adjust_retrieval_params(total_chunks: int, profile: Optional[RetrievalProfile] = None) -> Tuple[int, int, Optional[float]]:
+    """(top_k, min_keep, similarité min) du palier correspondant (profil chargé par défaut)."""
+    return (profile or RETRIEVAL_PROFILE).params_for(total_chunks)
 
-def adjust_retrieval_params(total_chunks: int) -> Tuple[int, int, float]:
-    if total_chunks <= 30:
-        return 8, 4, 0.29
-    elif total_chunks <= 80:
-        return 14, 5, 0.32
-    else:
-        return 17, 6, 0.36
-
-def reciprocal_rank_fusion(vec_results, bm25_results, k: int = 60):
-    """RRF fusion entre résultats vectoriels et BM25."""
+def reciprocal_rank_fusion(vec_results, bm25_results, k: int = 60, vector_weight: float = 1.0, bm25_weight: float = 1.0):
+    """RRF (pondérée) entre résultats vectoriels et BM25."""
     scores = {}
     # Vector part
     for rank, (doc, dist, meta, hid) in enumerate(vec_results, start=1):
-        scores[hid] = scores.get(hid, 0) + 1 / (k + rank)
+        scores[hid] = scores.get(hid, 0) + vector_weight / (k + rank)
     # BM25 part
     for rank, r in enumerate(bm25_results, start=1):
         hid = r["id"]
-        doc, meta = r["document"], r["metadata"]
-        scores[hid] = scores.get(hid, 0) + 1 / (k + rank)
+        scores[hid] = scores.get(hid, 0) + bm25_weight / (k + rank)
     # Fusion
     fused = []
     for hid, score in scores.items():
@@ -38,69 +36,161 @@ def reciprocal_rank_fusion(vec_results, bm25_results, k: int = 60):
                 fused.append((match_bm25["document"], score, match_bm25["metadata"], hid))
     return sorted(fused, key=lambda x: x[1], reverse=True)
 
-def retrieve_top_chunks(
-    query: str,
-    target_doc_id: Optional[str] = None,
-    base_top_k: Optional[int] = None,
-    min_keep: Optional[int] = None,
-    similarity_threshold: Optional[float] = None,
-):
-    # Ne jamais utiliser de fallback implicite: si aucun document_id fourni,
-    # la recherche se fait sur l'ensemble de la collection (comportement explicite).
-    # Pour éviter les mélanges, l'API peut exiger un document_id côté routeur.
-    where_filter = {"document_id": target_doc_id} if target_doc_id else None
+def _flat_entry(document_id: str):
+    """Matrice d'embeddings du document (cache LRU, chargée depuis Chroma au premier accès)."""
+    entry = FLAT_CACHE.get(document_id)
+    if entry is not None:
+        return entry
+    res = get_chroma_collection().get(where={"document_id": document_id}, include=["embeddings", "documents", "metadatas"])
+    ids = res.get("ids") or []
+    embeddings = res.get("embeddings")
+    if not ids or embeddings is None or len(embeddings) == 0:
+        return None
+    return FLAT_CACHE.put(document_id, ids, res.get("documents") or [], res.get("metadatas") or [], embeddings)
 
-    # Compter chunks
+def _retrieval_params(
+    target_doc_id: Optional[str],
+    base_top_k: Optional[int],
+    min_keep: Optional[int],
+    similarity_threshold: Optional[float],
+    profile: RetrievalProfile,
+) -> Tuple[int, int, Optional[float]]:
+    collection = get_chroma_collection()
+    # Compter chunks (catalogue O(1); repli sur les seuls ids Chroma si document inconnu)
     if target_doc_id:
-        res = collection.get(where=where_filter)
-        ids_field = res.get("ids", [])
-        total_chunks = sum(len(sub) for sub in ids_field) if ids_field and isinstance(ids_field[0], list) else len(ids_field)
+        total_chunks = CATALOG.chunk_count(target_doc_id)
+        if total_chunks is None:
+            total_chunks = len(collection.get(where={"document_id": target_doc_id}, include=[]).get("ids") or [])
     else:
         total_chunks = collection.count()
+    annotate(chunks_scored=total_chunks)
 
-    auto_base_top_k, auto_min_keep, auto_similarity_threshold = adjust_retrieval_params(total_chunks)
-    base_top_k = base_top_k or auto_base_top_k
-    min_keep = min_keep or auto_min_keep
-    similarity_threshold = similarity_threshold or auto_similarity_threshold
+    auto_base_top_k, auto_min_keep, auto_similarity_threshold = adjust_retrieval_params(total_chunks, profile)
+    return (
+        base_top_k or auto_base_top_k,
+        min_keep or auto_min_keep,
+        similarity_threshold if similarity_threshold is not None else auto_similarity_threshold,
+    )
 
-    print(f"[RAG] Params → base_top_k={base_top_k}, min_keep={min_keep}, threshold={similarity_threshold}, where={where_filter}")
+def search_candidates(queries: List[str], target_doc_id: Optional[str], top_k: int):
+    """Candidats de chaque question: (résultats vectoriels triés par distance, résultats BM25),
+    top_k de chaque côté. Embeddings en un appel modèle, recherche vectorielle en une requête
+    (matrice en cache ou Chroma multi-requêtes), BM25 par question."""
+    # Ne jamais utiliser de fallback implicite: si aucun document_id fourni,
+    # la recherche se fait sur l'ensemble de la collection (comportement explicite).
+    # Pour éviter les mélanges, l'API peut exiger un document_id côté routeur.
+    where_filter = {"document_id": target_doc_id} if target_doc_id else None
 
-    # 1) Vector search
-    query_embedding = embed_query(query)
-    results = collection.query(
-        query_embeddings=[query_embedding],
-        n_results=base_top_k,
-        where=where_filter
-    )
-    docs_vec = results["documents"][0]
-    dists_vec = results["distances"][0]
-    metas_vec = results["metadatas"][0]
-    ids_vec = results["ids"][0]
-    ranked_vec = sorted(zip(docs_vec, dists_vec, metas_vec, ids_vec), key=lambda x: x[1])
-
-    # 2) BM25 search
-    bm25_results = bm25_query(query, top_k=base_top_k)
-    # Filtrer BM25 sur le document ciblé si défini
-    if target_doc_id:
-        bm25_results = [
-            r for r in bm25_results
-            if r.get("metadata", {}).get("document_id") == target_doc_id
+    # 1) Vector search (exacte en mémoire si le cache par document est actif, sinon Chroma)
+    with timed("retrieve.embed_query"):
+        query_embeddings = embed_queries(queries)
+        annotate(queries=len(queries))
+    ranked_vecs = None
+    if FLAT_INDEX_ENABLED and target_doc_id:
+        with timed("retrieve.vector_flat"):
+            entry = _flat_entry(target_doc_id)
+            if entry is not None:
+                ranked_vecs = FLAT_CACHE.search_many(entry, query_embeddings, top_k)
+                annotate(chunks_scored=len(entry.ids), top_k=top_k)
+    if ranked_vecs is None:
+        with timed("retrieve.vector_chroma"):
+            results = get_chroma_collection().query(
+                query_embeddings=query_embeddings,
+                n_results=top_k,
+                where=where_filter
+            )
+            annotate(top_k=top_k)
+        ranked_vecs = [
+            sorted(zip(docs_vec, dists_vec, metas_vec, ids_vec), key=lambda x: x[1])
+            for docs_vec, dists_vec, metas_vec, ids_vec in zip(
+                results["documents"], results["distances"], results["metadatas"], results["ids"],
+            )
         ]
 
-    # 3) Fusion RRF
-    fused = reciprocal_rank_fusion(ranked_vec, bm25_results)
+    out = []
+    for query, ranked_vec in zip(queries, ranked_vecs):
+        # 2) BM25 search (scoré uniquement sur les chunks du document ciblé si défini)
+        with timed("retrieve.bm25"):
+            bm25_results = bm25_query(
+                query,
+                top_k=top_k,
+                document_ids=[target_doc_id] if target_doc_id else None,
+            )
+            annotate(results=len(bm25_results))
+        out.append((ranked_vec, bm25_results))
+    return out
 
-    # 4) Prendre top N limité
-    MAX_CHUNKS = 10  # ⚡ plafond dur
-    top_slice = fused[:min(MAX_CHUNKS, max(min_keep, len(fused)))]
+def select_chunks(
+    ranked_vec,
+    bm25_results,
+    profile: RetrievalProfile,
+    min_keep: int = 0,
+    min_similarity: Optional[float] = None,
+):
+    """Filtre de similarité, fusion RRF pondérée puis plafond `max_chunks` du profil."""
+    if min_similarity is not None:
+        # Distance cosinus Chroma / cache = 1 - similarité
+        ranked_vec = [r for r in ranked_vec if 1.0 - r[1] >= min_similarity]
+    fused = reciprocal_rank_fusion(
+        ranked_vec, bm25_results,
+        k=profile.rrf_k, vector_weight=profile.vector_weight, bm25_weight=profile.bm25_weight,
+    )
+    annotate(vector=len(ranked_vec), bm25=len(bm25_results), fused=len(fused))
+    return fused[:min(profile.max_chunks, max(min_keep, len(fused)))]
+
+def retrieve_top_chunks_batch(
+    queries: List[str],
+    target_doc_id: Optional[str] = None,
+    base_top_k: Optional[int] = None,
+    min_keep: Optional[int] = None,
+    similarity_threshold: Optional[float] = None,
+    profile: Optional[RetrievalProfile] = None,
+):
+    """Recherche hybride pour plusieurs questions sur le même périmètre, en une passe:
+    paramètres calculés une fois (profil de recherche), candidats vectoriels + BM25,
+    puis fusion RRF et plafond par question.
 
-    top_chunks = [doc for (doc, _, _, _) in top_slice]
-    top_metadatas = [meta for (_, _, meta, _) in top_slice]
-    top_ids = [hid for (_, _, _, hid) in top_slice]
+    Retourne une liste de (chunks, metas, ids, params) dans l'ordre des questions.
+    """
+    if not queries:
+        return []
+    profile = profile or RETRIEVAL_PROFILE
 
-    return top_chunks, top_metadatas, top_ids, {
+    with timed("retrieve.params"):
+        base_top_k, min_keep, similarity_threshold = _retrieval_params(
+            target_doc_id, base_top_k, min_keep, similarity_threshold, profile,
+        )
+    params = {
         "base_top_k": base_top_k,
         "min_keep": min_keep,
         "similarity_threshold": similarity_threshold,
+        "rrf_k": profile.rrf_k,
+        "max_chunks": profile.max_chunks,
         "hybrid": True,
     }
+
+    print(f"[RAG] Params → base_top_k={base_top_k}, min_keep={min_keep}, threshold={similarity_threshold}, profile={profile.name}, document_id={target_doc_id}, queries={len(queries)}")
+
+    out = []
+    for ranked_vec, bm25_results in search_candidates(queries, target_doc_id, base_top_k):
+        # 3) Fusion RRF + 4) top N limité (max_chunks du profil)
+        with timed("retrieve.fusion"):
+            top_slice = select_chunks(ranked_vec, bm25_results, profile, min_keep, similarity_threshold)
+
+        top_chunks = [doc for (doc, _, _, _) in top_slice]
+        top_metadatas = [meta for (_, _, meta, _) in top_slice]
+        top_ids = [hid for (_, _, _, hid) in top_slice]
+        out.append((top_chunks, top_metadatas, top_ids, dict(params)))
+    return out
+
+def retrieve_top_chunks(
+    query: str,
+    target_doc_id: Optional[str] = None,
+    base_top_k: Optional[int] = None,
+    min_keep: Optional[int] = None,
+    similarity_threshold: Optional[float] = None,
+):
+    with timed("retrieve"):
+        return retrieve_top_chunks_batch(
+            [query], target_doc_id, base_top_k, min_keep, similarity_threshold,
+        )[0]
@@ -0,0 +1,232 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+from concurrent.futures import Future
+from datetime import datetime
+import asyncio
+import hashlib
+import json
+import os
+import threading
+
+from app.services.catalog import CATALOG
+from app.services.llm_service import OLLAMA_MODEL
+from app.services.llm_scheduler import PRIORITY_BACKGROUND
+from app.services.rag_engine import generate_answers_batch
+from app.services.retriever import retrieve_top_chunks_batch
+
+# Rapport de risques pré-calculé après indexation (désactivé par défaut: occupe le LLM)
+RISK_REPORT_ENABLED = os.getenv("RISK_REPORT_ENABLED", "false").lower() == "true"
+# Checklist JSON: [{"id": "duree", "question": "..."}]; vide = checklist par défaut
+RISK_CHECKLIST_PATH = os.getenv("RISK_CHECKLIST_PATH", "")
+RISK_REPORT_DIR = os.getenv("RISK_REPORT_DIR", os.path.join("storage", "risk_reports"))
+# Appels LLM simultanés pour un rapport (priorité basse derrière les requêtes interactives)
+RISK_REPORT_CONCURRENCY = int(os.getenv("RISK_REPORT_CONCURRENCY", "1"))
+
+DEFAULT_RISK_CHECKLIST: List[Dict[str, str]] = [
+    {"id": "duree", "question": "Quelle est la durée du marché ?"},
+    {"id": "reconduction", "question": "Le marché est-il reconductible, combien de fois et selon quelles modalités ?"},
+    {"id": "penalites", "question": "Quelles sont les pénalités de retard et leurs plafonds ?"},
+    {"id": "garanties", "question": "Quelles garanties financières sont exigées (retenue de garantie, caution, garantie à première demande) ?"},
+    {"id": "delais_intervention", "question": "Quels sont les délais d'intervention ou d'exécution imposés ?"},
+    {"id": "criteres", "question": "Quels sont les critères de jugement des offres et leur pondération ?"},
+    {"id": "paiement", "question": "Quels sont les délais et modalités de paiement (avance, acomptes) ?"},
+    {"id": "resiliation", "question": "Dans quels cas le marché peut-il être résilié ?"},
+    {"id": "revision_prix", "question": "Les prix sont-ils fermes ou révisables, et selon quelle formule ?"},
+    {"id": "sous_traitance", "question": "Quelles sont les conditions de sous-traitance ?"},
+]
+
+
+def load_checklist(path: str = RISK_CHECKLIST_PATH) -> List[Dict[str, str]]:
+    if not path:
+        return list(DEFAULT_RISK_CHECKLIST)
+    with open(path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    checklist = []
+    for i, item in enumerate(items):
+        if isinstance(item, str):
+            item = {"id": f"q{i + 1}", "question": item}
+        checklist.append({"id": str(item["id"]), "question": str(item["question"])})
+    return checklist
+
+
+def _document_version(document_id: str) -> Optional[str]:
+    """Change à chaque (ré)indexation du document."""
+    entry = CATALOG.get(document_id)
+    if not entry or not entry.get("chunk_count"):
+        return None
+    return f"{entry.get('created_at')}|{entry.get('chunk_count')}|{entry.get('content_sha256')}"
+
+
+def _fingerprint(document_version: str, question: str, model: str) -> str:
+    return hashlib.sha256("\x1f".join([document_version, question, model]).encode("utf-8")).hexdigest()
+
+
+class RiskReportStore:
+    """Rapports de risques par document (un fichier JSON par document, écriture atomique).
+
+    Chaque entrée porte l'empreinte (version du document, question, modèle) qui l'a produite:
+    un rafraîchissement ne recalcule que les entrées dont l'empreinte a changé.
+    """
+
+    def __init__(self, directory: str, checklist: List[Dict[str, str]], concurrency: int = 1):
+        self.directory = directory
+        self.checklist = checklist
+        self.concurrency = concurrency
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._serial: Optional[asyncio.Semaphore] = None
+        self._running: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, document_id: str) -> str:
+        return os.path.join(self.directory, f"{document_id}.json")
+
+    def get(self, document_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._path(document_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _save(self, report: Dict[str, Any]) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(report["document_id"])
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+    def remove(self, document_id: str) -> None:
+        try:
+            os.remove(self._path(document_id))
+        except FileNotFoundError:
+            pass
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Boucle asyncio de l'application (le LLM et sa file d'admission y vivent)."""
+        self._loop = loop
+        # Un rapport à la fois: la file LLM reste disponible pour les requêtes interactives
+        self._serial = asyncio.Semaphore(1)
+
+    def schedule(self, document_id: str) -> bool:
+        """Demande (depuis n'importe quel thread) le rafraîchissement du rapport d'un document."""
+        if self._loop is None or self._loop.is_closed():
+            print(f"[RISK] boucle non démarrée, rapport ignoré document_id={document_id}")
+            return False
+        with self._lock:
+            running = self._running.get(document_id)
+            if running is not None and not running.done():
+                return False
+            fut = asyncio.run_coroutine_threadsafe(self._refresh_serial(document_id), self._loop)
+            self._running[document_id] = fut
+        fut.add_done_callback(lambda f: self._done(document_id, f))
+        return True
+
+    def is_pending(self, document_id: str) -> bool:
+        with self._lock:
+            running = self._running.get(document_id)
+            return running is not None and not running.done()
+
+    def _done(self, document_id: str, fut: Future) -> None:
+        with self._lock:
+            if self._running.get(document_id) is fut:
+                del self._running[document_id]
+        if not fut.cancelled() and fut.exception() is not None:
+            print(f"[RISK ERROR] document_id={document_id}: {fut.exception()}")
+
+    def stale_items(self, document_id: str, report: Optional[Dict[str, Any]]) -> List[Dict[str, str]]:
+        version = _document_version(document_id)
+        if version is None:
+            return []
+        known = {e["id"]: e for e in (report or {}).get("entries", [])}
+        stale = []
+        for item in self.checklist:
+            entry = known.get(item["id"])
+            if (
+                entry is None
+                or entry.get("error")
+                or entry.get("fingerprint") != _fingerprint(version, item["question"], OLLAMA_MODEL)
+            ):
+                stale.append(item)
+        return stale
+
+    async def _refresh_serial(self, document_id: str) -> Optional[Dict[str, Any]]:
+        async with self._serial:
+            return await self.refresh(document_id)
+
+    async def refresh(self, document_id: str) -> Optional[Dict[str, Any]]:
+        version = _document_version(document_id)
+        if version is None:
+            return None
+        previous = self.get(document_id) or {}
+        stale = self.stale_items(document_id, previous)
+        known = {e["id"]: e for e in previous.get("entries", [])}
+        if not stale and set(known) == {item["id"] for item in self.checklist}:
+            return previous
+
+        report = {
+            "document_id": document_id,
+            "status": "running",
+            "model": OLLAMA_MODEL,
+            "updated_at": datetime.utcnow().isoformat(),
+            "entries": [known[item["id"]] for item in self.checklist if item["id"] in known],
+        }
+        self._save(report)
+        print(f"[RISK] document_id={document_id} | entrées à calculer={len(stale)}/{len(self.checklist)}")
+
+        questions = [item["question"] for item in stale]
+        retrievals = await asyncio.to_thread(retrieve_top_chunks_batch, questions, document_id)
+        results = generate_answers_batch(
+            questions, document_id, retrievals,
+            concurrency=self.concurrency, priority=PRIORITY_BACKGROUND,
+        )
+        try:
+            async for idx, answer, error in results:
+                _, metas, ids, _ = retrievals[idx]
+                item = stale[idx]
+                known[item["id"]] = {
+                    "id": item["id"],
+                    "question": item["question"],
+                    "answer": (answer or {}).get("reponse"),
+                    "source": (answer or {}).get("source") or {},
+                    "evidence": [
+                        {
+                            "id": cid,
+                            "page": (m or {}).get("page"),
+                            "chunk_index": (m or {}).get("chunk_index"),
+                            "section_title": (m or {}).get("section_title"),
+                        }
+                        for m, cid in zip(metas, ids)
+                    ],
+                    "fingerprint": _fingerprint(version, item["question"], OLLAMA_MODEL),
+                    "computed_at": datetime.utcnow().isoformat(),
+                    "error": str(error) if error is not None else None,
+                }
+        finally:
+            await results.aclose()
+
+        if document_id not in CATALOG:
+            # Document supprimé pendant le calcul
+            return None
+        report["entries"] = [known[item["id"]] for item in self.checklist if item["id"] in known]
+        report["status"] = "error" if any(e.get("error") for e in report["entries"]) else "done"
+        report["updated_at"] = datetime.utcnow().isoformat()
+        self._save(report)
+        print(f"[RISK] OK document_id={document_id} | status={report['status']}")
+        return report
+
+    def schedule_all(self) -> int:
+        """Rafraîchit les rapports de tous les documents dont une entrée est périmée
+        (checklist, modèle ou document modifiés)."""
+        count = 0
+        for entry in CATALOG.list():
+            doc_id = entry.get("document_id")
+            if doc_id and self.stale_items(doc_id, self.get(doc_id)) and self.schedule(doc_id):
+                count += 1
+        return count
+
+
+RISK_REPORTS = RiskReportStore(
+    RISK_REPORT_DIR,
+    load_checklist() if RISK_REPORT_ENABLED else list(DEFAULT_RISK_CHECKLIST),
+    concurrency=RISK_REPORT_CONCURRENCY,
+)
@@ -0,0 +1,130 @@
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+import json
+import os
+import threading
+import time
+import uuid
+
+# Traces par requête (opt-in: ?trace=1 ou en-tête X-Trace: 1), arbre d'étapes avec durées et tailles
+TRACE_HEADER = "x-trace"
+# Fichier JSON lines des traces terminées (vide = pas d'écriture)
+TRACE_LOG_PATH = os.getenv("TRACE_LOG_PATH", "")
+
+
+class Span:
+    def __init__(self, name: str, attrs: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.attrs: Dict[str, Any] = dict(attrs or {})
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+        self.children: List["Span"] = []
+        self._lock = threading.Lock()
+
+    def child(self, name: str, attrs: Optional[Dict[str, Any]] = None) -> "Span":
+        span = Span(name, attrs)
+        # Des threads (pool, to_thread) peuvent ajouter des enfants au même parent
+        with self._lock:
+            self.children.append(span)
+        return span
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        end = self.end if self.end is not None else time.perf_counter()
+        out: Dict[str, Any] = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 2),
+            "duration_ms": round((end - self.start) * 1000, 2),
+        }
+        if self.attrs:
+            out["attrs"] = self.attrs
+        if self.error:
+            out["error"] = self.error
+        with self._lock:
+            children = list(self.children)
+        if children:
+            out["children"] = [c.to_dict(origin) for c in children]
+        return out
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("aorisk_span", default=None)
+_log_lock = threading.Lock()
+
+
+def trace_requested(request) -> bool:
+    """?trace=1 ou en-tête X-Trace: 1."""
+    flag = request.query_params.get("trace") or request.headers.get(TRACE_HEADER) or ""
+    return flag.lower() in {"1", "true", "yes"}
+
+
+def _write(trace: Dict[str, Any]) -> None:
+    if not TRACE_LOG_PATH:
+        return
+    try:
+        os.makedirs(os.path.dirname(TRACE_LOG_PATH) or ".", exist_ok=True)
+        line = json.dumps(trace, ensure_ascii=False)
+        with _log_lock, open(TRACE_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except Exception as e:
+        print(f"[TRACE][WARN] écriture {TRACE_LOG_PATH}: {e}")
+
+
+class Trace:
+    def __init__(self, name: str, attrs: Optional[Dict[str, Any]] = None):
+        self.id = uuid.uuid4().hex
+        self.created_at = datetime.utcnow().isoformat()
+        self.root = Span(name, attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"trace_id": self.id, "created_at": self.created_at, **self.root.to_dict(self.root.start)}
+
+
+@contextmanager
+def start_trace(name: str, enabled: bool = True, **attrs: Any):
+    """Ouvre une trace (racine) pour le contexte courant; produit None si désactivée."""
+    if not enabled:
+        yield None
+        return
+    trace = Trace(name, attrs)
+    token = _current.set(trace.root)
+    try:
+        yield trace
+    except Exception as e:
+        trace.root.error = str(e)
+        raise
+    finally:
+        trace.root.end = time.perf_counter()
+        _current.reset(token)
+        _write(trace.to_dict())
+
+
+@contextmanager
+def span(name: str, **attrs: Any):
+    """Étape enfant de l'étape courante; sans trace active, ne fait rien (coût ~nul)."""
+    parent = _current.get()
+    if parent is None:
+        yield None
+        return
+    current = parent.child(name, attrs)
+    token = _current.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.error = str(e)
+        raise
+    finally:
+        current.end = time.perf_counter()
+        _current.reset(token)
+
+
+def annotate(**attrs: Any) -> None:
+    """Ajoute des tailles / compteurs à l'étape courante (si une trace est active)."""
+    current = _current.get()
+    if current is not None:
+        current.set(**attrs)
@@ -1,24 +1,44 @@
 from __future__ import annotations
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 from datetime import datetime
 import json
-import chromadb
+import os
+import threading
 
-from app.services.chunker import chunk_text
+from app.services.chunker import chunk_document
+from app.services.parsers import ParsedDocument
+from app.services.context_packer import count_llm_tokens, normalize_chunk
 from app.services.embedder import generate_embeddings
-from app.services.bm25_service import bm25_add
+from app.services.bm25_service import bm25_add, bm25_remove, BM25_GLOBAL
+from app.services.catalog import CATALOG
+from app.services.flat_index import FLAT_CACHE, FLAT_INDEX_ENABLED
+from app.services.answer_cache import ANSWER_CACHE
+from app.services.metrics import REGISTRY, timed
+from app.services.tracing import annotate
 
+INDEXED_CHUNKS = REGISTRY.counter("aorisk_indexed_chunks_total", "Chunks indexés (Chroma + BM25)")
 
-# Connexion Chroma unique
-chroma_client = chromadb.PersistentClient(path="./chroma_db")
-collection = chroma_client.get_or_create_collection(
-    "ao-risk",
-    metadata={"hnsw:space": "cosine"},
-)
+
+# Connexion Chroma unique, ouverte au premier accès (warm-up au démarrage)
+_collection = None
+_chroma_lock = threading.Lock()
+
+# Taille des tranches d'embedding entre deux notifications de progression
+EMBED_PROGRESS_STEP = 32
 
 def get_chroma_collection():
-    """Expose la collection Chroma partagée."""
-    return collection
+    """Expose la collection Chroma partagée (client ouvert au premier appel)."""
+    global _collection
+    if _collection is None:
+        with _chroma_lock:
+            if _collection is None:
+                import chromadb
+                chroma_client = chromadb.PersistentClient(path="./chroma_db")
+                _collection = chroma_client.get_or_create_collection(
+                    "ao-risk",
+                    metadata={"hnsw:space": "cosine"},
+                )
+    return _collection
 
 def _sanitize_metadata(meta: Dict[str, Any]) -> Dict[str, Any]:
     clean: Dict[str, Any] = {}
@@ -33,20 +53,35 @@ def _sanitize_metadata(meta: Dict[str, Any]) -> Dict[str, Any]:
 
 def index_document_in_chroma(
     document_id: str,
-    content: str,
+    document: ParsedDocument,
     doc_type: Optional[str] = None,
     filename: Optional[str] = None,
-    pages: Optional[list[dict]] = None,
+    progress: Optional[Callable[..., None]] = None,
 ) -> int:
-    # 1) Chunking
-    chunks: List[str] = chunk_text(content)
+    progress = progress or (lambda stage, **info: None)
+
+    # Ré-indexation: les réponses en cache ne correspondent plus au contenu
+    ANSWER_CACHE.invalidate_document(document_id)
+
+    # 1) Chunking (une tokenisation du document; offsets caractères/tokens par chunk)
+    content = document.full_text
+    with timed("index.chunk"):
+        spans = chunk_document(content)
+        annotate(chars=len(content), chunks=len(spans))
+    chunks: List[str] = [c["text"] for c in spans]
     chunk_count = len(chunks)
     print(f"[INDEX] document_id={document_id} | chunks={chunk_count}")
+    progress("chunked", total_chunks=chunk_count)
     if chunk_count == 0:
         return 0
 
-    # 2) Embeddings
-    embeddings: List[List[float]] = generate_embeddings(chunks)
+    # 2) Embeddings (par tranches pour suivre l'avancement)
+    embeddings: List[List[float]] = []
+    for start in range(0, chunk_count, EMBED_PROGRESS_STEP):
+        with timed("index.embed"):
+            embeddings.extend(generate_embeddings(chunks[start:start + EMBED_PROGRESS_STEP]))
+            annotate(chunks=len(chunks[start:start + EMBED_PROGRESS_STEP]))
+        progress("embedding", embedded=len(embeddings), total_chunks=chunk_count)
     if len(embeddings) != chunk_count:
         raise RuntimeError("Embeddings count != chunks count")
 
@@ -60,35 +95,7 @@ def index_document_in_chroma(
         "created_at": created_at,
     }
 
-    # Helpers pour page et titre de section
-    def _normalize(s: str) -> str:
-        return " ".join((s or "").lower().split())
-
-    page_lookup: list[tuple[int, str]] = []
-    if pages:
-        for p in pages:
-            try:
-                page_lookup.append((int(p.get("page")), _normalize(p.get("text", ""))))
-            except Exception:
-                continue
-
-    def _guess_page_for_chunk(ch: str) -> Optional[int]:
-        if not page_lookup:
-            return None
-        probe = _normalize(ch[:200])
-        for num, text_norm in page_lookup:
-            if probe and probe in text_norm:
-                return num
-        # fallback: cherche des mots rares du début
-        words = [w for w in probe.split() if len(w) > 4][:6]
-        if not words:
-            return None
-        for num, text_norm in page_lookup:
-            hits = sum(1 for w in words if w in text_norm)
-            if hits >= max(2, len(words)//2):
-                return num
-        return None
-
+    # Helper pour le titre de section (la page vient des offsets: bisect sur les débuts de pages)
     def _extract_section_title(ch: str) -> Optional[str]:
         head = ch.strip().splitlines()[0] if ch.strip() else ""
         head = head.strip()
@@ -96,18 +103,27 @@ def index_document_in_chroma(
             return None
         return head[:140]
 
+    # Comptes de tokens stockés une fois pour toutes (le packer de contexte ne tokenise pas)
+    with timed("index.llm_token_count"):
+        llm_tokens = count_llm_tokens([normalize_chunk(ch) for ch in chunks])
+        annotate(tokens=sum(llm_tokens))
+
     ids: List[str] = [f"{document_id}_{i}" for i in range(chunk_count)]
     metadatas: List[Dict[str, Any]] = []
-    for i, ch in enumerate(chunks):
+    for i, (ch, span) in enumerate(zip(chunks, spans)):
+        page, page_end = document.page_span(span["char_start"], span["char_end"])
         meta = {
             **base_meta,
             "chunk_index": i,
-            "page": _guess_page_for_chunk(ch),
+            "page": page,
+            "page_end": page_end,
             "section_title": _extract_section_title(ch),
-            "char_start": None,
-            "char_end": None,
-            "token_start": None,
-            "token_end": None,
+            "char_start": span["char_start"],
+            "char_end": span["char_end"],
+            "token_start": span["token_start"],
+            "token_end": span["token_end"],
+            "n_tokens": span["token_end"] - span["token_start"],
+            "n_llm_tokens": llm_tokens[i],
         }
         metadatas.append(_sanitize_metadata(meta))
 
@@ -122,12 +138,13 @@ def index_document_in_chroma(
         batch_ids = ids[start:end]
 
         print(f"[INDEX] add batch {start}:{end} size={end-start}")
-        collection.add(
-            documents=batch_docs,
-            embeddings=batch_embs,
-            metadatas=batch_meta,
-            ids=batch_ids,
-        )
+        with timed("index.chroma_add"):
+            get_chroma_collection().add(
+                documents=batch_docs,
+                embeddings=batch_embs,
+                metadatas=batch_meta,
+                ids=batch_ids,
+            )
 
         total += (end - start)
 
@@ -135,9 +152,127 @@ def index_document_in_chroma(
 
     # 5) Index BM25
     try:
-        bm25_add(ids, chunks, metadatas)
+        with timed("index.bm25"):
+            bm25_add(ids, chunks, metadatas)
         print(f"[INDEX] BM25 OK document_id={document_id} | added={total}")
     except Exception as e:
         print(f"[INDEX][BM25 ERROR] {e}")
 
+    # 6) Cache de recherche exacte (optionnel): on a déjà les embeddings en main
+    if FLAT_INDEX_ENABLED:
+        FLAT_CACHE.put(document_id, ids, chunks, metadatas, embeddings)
+
+    # 7) Catalogue documents (lectures O(1) côté retriever / endpoints)
+    token_total = sum(c["token_end"] - c["token_start"] for c in spans)
+    CATALOG.upsert(
+        document_id,
+        filename=filename,
+        doc_type=(doc_type or "unknown"),
+        chunk_count=total,
+        page_count=len(document),
+        token_total=token_total,
+        char_total=len(content),
+        created_at=created_at,
+    )
+    INDEXED_CHUNKS.inc(total)
+
     return total
+
+
+def delete_document(document_id: str) -> bool:
+    """Retire un document de tous les index (Chroma, BM25, cache exact, catalogue,
+    réponses en cache) et supprime ses fichiers de storage/."""
+    known = document_id in CATALOG
+    get_chroma_collection().delete(where={"document_id": document_id})
+    try:
+        removed = bm25_remove(document_id)
+    except Exception as e:
+        print(f"[DELETE][BM25 ERROR] {e}")
+        removed = 0
+    FLAT_CACHE.invalidate(document_id)
+    ANSWER_CACHE.invalidate_document(document_id)
+    CATALOG.remove(document_id)
+    for suffix in (".txt", "_pages.json", ".pdf"):
+        try:
+            os.remove(os.path.join("storage", f"{document_id}{suffix}"))
+        except FileNotFoundError:
+            pass
+    print(f"[DELETE] document_id={document_id} | bm25_chunks={removed}")
+    return known or removed > 0
+
+
+def _sync_bm25(document_ids: set[str]) -> None:
+    # Segments BM25 relus en mmap (leurs en-têtes listent les documents couverts)
+    loaded = BM25_GLOBAL.load(keep_document_ids=document_ids)
+    missing = sorted(document_ids - BM25_GLOBAL.document_ids())
+    print(f"[BM25] segments chargés={loaded} | documents à reconstruire={len(missing)}")
+
+    for document_id in missing:
+        got = get_chroma_collection().get(where={"document_id": document_id}, include=["documents", "metadatas"])
+        rows = sorted(
+            zip(got.get("ids") or [], got.get("documents") or [], got.get("metadatas") or []),
+            key=lambda r: (r[2] or {}).get("chunk_index", 0),
+        )
+        if not rows:
+            continue
+        ids, docs, metas = (list(x) for x in zip(*rows))
+        try:
+            bm25_add(ids, docs, metas)
+            print(f"[BM25] reconstruit document_id={document_id} | chunks={len(ids)}")
+        except Exception as e:
+            print(f"[BM25 ERROR] reconstruction {document_id}: {e}")
+
+
+def _sync_catalog(metadatas: list[dict]) -> None:
+    # Rattrapage des documents indexés avant l'existence du catalogue
+    found: Dict[str, Dict[str, Any]] = {}
+    for m in metadatas:
+        doc_id = (m or {}).get("document_id")
+        if not doc_id or doc_id in CATALOG:
+            continue
+        entry = found.setdefault(doc_id, {
+            "filename": m.get("filename"),
+            "doc_type": m.get("doc_type", "unknown"),
+            "created_at": m.get("created_at"),
+            "chunk_count": 0,
+            "page_count": None,
+        })
+        entry["chunk_count"] += 1
+        page = m.get("page")
+        if isinstance(page, int):
+            entry["page_count"] = max(entry["page_count"] or 0, page)
+    for doc_id, entry in found.items():
+        CATALOG.upsert(doc_id, **entry)
+    if found:
+        print(f"[CATALOG] documents rattrapés depuis Chroma={len(found)}")
+
+
+def _in_chroma(document_id: str) -> bool:
+    got = get_chroma_collection().get(where={"document_id": document_id}, limit=1, include=[])
+    return bool(got.get("ids"))
+
+
+def sync_indexes_with_chroma() -> None:
+    """Aligne les index dérivés (BM25 persistant, catalogue) sur Chroma, qui fait foi:
+    recharge les segments BM25 et ne reconstruit que les documents manquants.
+
+    Documents candidats: catalogue + en-têtes des segments BM25, chacun vérifié dans
+    Chroma (une requête limitée par document, pas de scan des chunks). Le scan complet
+    des métadonnées n'a lieu qu'une fois, si le catalogue est absent ou vide."""
+    if not len(CATALOG):
+        res = get_chroma_collection().get(include=["metadatas"])
+        _sync_catalog(res.get("metadatas") or [])
+
+    cataloged = {entry["document_id"] for entry in CATALOG.list()}
+    chroma_doc_ids = {d for d in cataloged | BM25_GLOBAL.stored_document_ids() if _in_chroma(d)}
+
+    # Catalogue complété depuis Chroma (crash entre l'ajout Chroma et le catalogue,
+    # rattrapage partiel), entrées sans chunks dans Chroma retirées
+    for document_id in sorted(chroma_doc_ids - cataloged):
+        got = get_chroma_collection().get(where={"document_id": document_id}, include=["metadatas"])
+        _sync_catalog(got.get("metadatas") or [])
+    for document_id in sorted(cataloged - chroma_doc_ids):
+        CATALOG.remove(document_id)
+        print(f"[CATALOG] document absent de Chroma retiré: {document_id}")
+
+    _sync_bm25(chroma_doc_ids)
@@ -0,0 +1,97 @@
+from __future__ import annotations
+from typing import Any, Awaitable, Callable, Dict, Optional
+from datetime import datetime
+import asyncio
+import os
+import time
+
+from app.services.chunker import get_tokenizer
+from app.services.context_packer import get_llm_tokenizer
+from app.services.embedder import get_model
+from app.services.llm_service import LLM_CLIENT
+from app.services.risk_report import RISK_REPORTS, RISK_REPORT_ENABLED
+from app.services.vector_service import sync_indexes_with_chroma
+
+# Warm-up au démarrage (modèles, index, Ollama) avant de se déclarer prêt (/readyz)
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+# Prêt seulement si Ollama répond (sinon Ollama injoignable = prêt mais dégradé)
+WARMUP_REQUIRE_LLM = os.getenv("WARMUP_REQUIRE_LLM", "false").lower() == "true"
+
+
+class Readiness:
+    """État du warm-up: une entrée par étape (ok, durée, erreur)."""
+
+    def __init__(self):
+        self.status = "starting"  # starting | warming | ready | error
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self.required = {"indexes", "chunker_tokenizer", "embedder"}
+        if WARMUP_REQUIRE_LLM:
+            self.required.add("ollama")
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    async def _step(self, name: str, fn: Callable[[], Awaitable[Any]]) -> bool:
+        t0 = time.perf_counter()
+        try:
+            await fn()
+            self.steps[name] = {"ok": True, "ms": round((time.perf_counter() - t0) * 1000, 1)}
+            return True
+        except Exception as e:
+            self.steps[name] = {"ok": False, "ms": round((time.perf_counter() - t0) * 1000, 1), "error": str(e)}
+            print(f"[WARMUP][{name.upper()} ERROR] {e}")
+            return False
+
+    async def load_indexes(self) -> bool:
+        """Index BM25 et catalogue: rechargement depuis le disque + rattrapage depuis Chroma.
+
+        Attendu dans le lifespan avant de servir: une requête ou un upload concurrent
+        verrait sinon un index BM25 partiel (résultats vectoriels seuls, segments en double).
+        """
+        self.status = "warming"
+        self.started_at = datetime.utcnow().isoformat()
+        return await self._step("indexes", lambda: asyncio.to_thread(sync_indexes_with_chroma))
+
+    async def run(self) -> None:
+        # Modèles et Ollama (les index sont déjà chargés par load_indexes)
+        await self._step("chunker_tokenizer", lambda: asyncio.to_thread(get_tokenizer))
+        await self._step("llm_tokenizer", lambda: asyncio.to_thread(get_llm_tokenizer))
+        # Chargement du modèle + un embedding factice (premières allocations, kernels)
+        await self._step("embedder", lambda: asyncio.to_thread(lambda: get_model().encode(["Durée du marché"])))
+        await self._step("ollama", LLM_CLIENT.keep_alive)
+
+        failed = [n for n in self.required if not self.steps.get(n, {}).get("ok")]
+        self.status = "error" if failed else "ready"
+        self.finished_at = datetime.utcnow().isoformat()
+        print(f"[WARMUP] status={self.status} | " + " ".join(f"{n}={s['ms']}ms" for n, s in self.steps.items()))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "ready": self.ready,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "required": sorted(self.required),
+            "steps": self.steps,
+        }
+
+
+READINESS = Readiness()
+
+
+async def warm_up() -> None:
+    if WARMUP_ENABLED:
+        await READINESS.run()
+    else:
+        # Modèles chargés paresseusement à la première requête; seuls les index sont alignés
+        READINESS.status = "ready" if READINESS.steps.get("indexes", {}).get("ok") else "error"
+
+    # Rapports de risques: rattrapage des documents/checklist modifiés depuis le dernier calcul
+    if RISK_REPORT_ENABLED and READINESS.steps.get("indexes", {}).get("ok"):
+        try:
+            print(f"[WARMUP] rapports de risques à rafraîchir={RISK_REPORTS.schedule_all()}")
+        except Exception as e:
+            print(f"[WARMUP][RISK ERROR] {e}")
@@ -1,6 +1,6 @@
 'use client';
 import { useEffect, useState } from 'react';
-import { ask } from '@/lib/api';
+import { askStream } from '@/lib/api';
 import Spinner from '@/components/Spinner';
 import { getSessionDocs, type UploadedDoc } from '@/lib/sessionDocs';
 
@@ -17,6 +17,7 @@ export default function QueryPage() {
   const [data, setData] = useState<QueryResponse | null>(null);
   const [error, setError] = useState<string | null>(null);
   const [loading, setLoading] = useState(false);
+  const [queuePosition, setQueuePosition] = useState(0);
 
   useEffect(() => {
     const d = getSessionDocs();
@@ -31,12 +32,21 @@ export default function QueryPage() {
     setData(null);
     try {
       if (!documentId) throw new Error('Aucun document sélectionné. Uploade un PDF dans Upload.');
-      const res = await ask(question, documentId);
+      let partial = '';
+      const res = await askStream(question, documentId, {
+        onSources: (sources) => setData({ question, sources, answer: { reponse: '' } }),
+        onQueue: (position) => setQueuePosition(position),
+        onToken: (text) => {
+          partial += text;
+          setData((prev) => ({ question, sources: prev?.sources, answer: { reponse: partial } }));
+        },
+      });
       setData(res);
     } catch (e: any) {
       setError(e.message || 'Erreur');
     } finally {
       setLoading(false);
+      setQueuePosition(0);
     }
   }
 
@@ -73,10 +83,10 @@ export default function QueryPage() {
         </form>
       </div>
 
-      {loading && (
+      {loading && !answerText && (
         <div className="card row" style={{ justifyContent: 'center' }}>
           <Spinner size={18} />
-          <span>Génération de la réponse…</span>
+          <span>{queuePosition > 0 ? `En file d’attente (position ${queuePosition})…` : 'Génération de la réponse…'}</span>
         </div>
       )}
 
@@ -29,9 +29,33 @@ export async function upload(files: File[], token?: string) {
       throw new Error(`Upload échoué (${res.status})`);
     }
   }
+  // L'indexation tourne en tâche de fond: on suit le job jusqu'à la fin
+  const { job_id } = await res.json();
+  return waitForJob(job_id, token);
+}
+
+export async function getJob(jobId: string, token?: string) {
+  const headers: Record<string, string> = {};
+  if (token) headers['Authorization'] = `Bearer ${token}`;
+  const res = await fetch(`${API_BASE}/jobs/${jobId}`, { headers });
+  if (!res.ok) throw new Error(`Suivi du job échoué (${res.status})`);
   return res.json();
 }
 
+export async function waitForJob(jobId: string, token?: string, intervalMs = 1000) {
+  for (;;) {
+    const job = await getJob(jobId, token);
+    if (job.status === 'done' || job.status === 'error') {
+      if (job.status === 'error' && !job.results?.length) {
+        const failed = (job.files || []).find((f: any) => f.error);
+        throw new Error(failed?.error || job.error || 'Indexation échouée');
+      }
+      return { status: job.status === 'done' ? 'success' : 'partial', job_id: job.job_id, files: job.files, results: job.results };
+    }
+    await new Promise((r) => setTimeout(r, intervalMs));
+  }
+}
+
 export async function ask(question: string, documentId: string) {
   const res = await fetch(`${API_BASE}/query`, {
     method: 'POST',
@@ -51,3 +75,52 @@ export async function ask(question: string, documentId: string) {
     }>;
   }>;
 }
+
+type StreamHandlers = {
+  onSources?: (sources: any[]) => void;
+  onQueue?: (position: number) => void;
+  onToken?: (text: string) => void;
+  signal?: AbortSignal;
+};
+
+// Réponse en streaming (SSE sur POST): sources → tokens → réponse finale
+export async function askStream(question: string, documentId: string, handlers: StreamHandlers = {}) {
+  const res = await fetch(`${API_BASE}/query/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify({ question, document_id: documentId }),
+    signal: handlers.signal,
+  });
+  if (res.status === 503) throw new Error('Serveur occupé, réessayez dans quelques secondes');
+  if (!res.ok || !res.body) throw new Error('Requête échouée');
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let sources: any[] = [];
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffer.indexOf('\n\n')) >= 0) {
+      const raw = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      const event = /^event: (.*)$/m.exec(raw)?.[1];
+      const data = JSON.parse(/^data: (.*)$/m.exec(raw)?.[1] || 'null');
+      if (event === 'sources') {
+        sources = data.sources || [];
+        handlers.onSources?.(sources);
+      } else if (event === 'queue') {
+        handlers.onQueue?.(data.position);
+      } else if (event === 'token') {
+        handlers.onToken?.(data.text);
+      } else if (event === 'error') {
+        throw new Error(data.detail?.message || data.detail || 'Erreur');
+      } else if (event === 'done') {
+        return { question, answer: data, sources };
+      }
+    }
+  }
+  throw new Error('Flux interrompu');
+}
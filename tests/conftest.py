@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Tests hors ligne: aucun modèle Hugging Face téléchargé
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,84 @@
+from app.services import answer_cache
+from app.services.answer_cache import AnswerCache
+
+ANSWER = {"reponse": "12 mois reconductibles", "used_chunks": 2, "source": {"page": 3}}
+
+
+def _embed(vectors):
+    return lambda question: vectors[question]
+
+
+def test_exact_hit_returns_a_copy():
+    cache = AnswerCache(max_entries=10, ttl=60)
+    cache.put("doc", "Durée du marché ?", ["c2", "c1"], "m", ANSWER)
+    hit = cache.get("doc", "  durée du MARCHÉ ? ", ["c1", "c2"], "m")
+    assert hit == ANSWER
+    hit["reponse"] = "modifié"
+    assert cache.get("doc", "Durée du marché ?", ["c1", "c2"], "m")["reponse"] == ANSWER["reponse"]
+
+
+def test_key_includes_chunks_and_model():
+    cache = AnswerCache(max_entries=10, ttl=60)
+    cache.put("doc", "Durée ?", ["c1"], "m", ANSWER)
+    assert cache.get("doc", "Durée ?", ["c1", "c3"], "m") is None
+    assert cache.get("doc", "Durée ?", ["c1"], "autre") is None
+    assert cache.get("autre-doc", "Durée ?", ["c1"], "m") is None
+
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    cache = AnswerCache(max_entries=10, ttl=60)
+    cache.put("doc", "Durée ?", ["c1"], "m", ANSWER)
+    now[0] += 59
+    assert cache.get("doc", "Durée ?", ["c1"], "m") is not None
+    now[0] += 2
+    assert cache.get("doc", "Durée ?", ["c1"], "m") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_invalidate_document_after_reindexing():
+    cache = AnswerCache(max_entries=10, ttl=60)
+    cache.put("doc", "Durée ?", ["c1"], "m", ANSWER)
+    cache.put("doc", "Prix ?", ["c2"], "m", ANSWER)
+    cache.put("autre", "Durée ?", ["c1"], "m", ANSWER)
+    assert cache.invalidate_document("doc") == 2
+    assert cache.get("doc", "Durée ?", ["c1"], "m") is None
+    assert cache.get("doc", "Prix ?", ["c2"], "m") is None
+    assert cache.get("autre", "Durée ?", ["c1"], "m") is not None
+
+
+def test_lru_eviction():
+    cache = AnswerCache(max_entries=2, ttl=60)
+    cache.put("doc", "q1", ["c"], "m", ANSWER)
+    cache.put("doc", "q2", ["c"], "m", ANSWER)
+    assert cache.get("doc", "q1", ["c"], "m") is not None
+    cache.put("doc", "q3", ["c"], "m", ANSWER)
+    assert cache.get("doc", "q2", ["c"], "m") is None
+    assert cache.get("doc", "q1", ["c"], "m") is not None
+
+
+def test_semantic_threshold():
+    embed = _embed({
+        "Quelle est la durée du marché ?": [1.0, 0.0],
+        "Combien de temps dure le marché ?": [0.99, 0.141],  # cos ≈ 0.99
+        "Quel est le montant des pénalités ?": [0.6, 0.8],    # cos = 0.6
+    })
+    cache = AnswerCache(max_entries=10, ttl=60, semantic=True, semantic_threshold=0.95)
+    cache.put("doc", "Quelle est la durée du marché ?", ["c1"], "m", ANSWER, embed=embed)
+
+    # Paraphrase au-dessus du seuil: réutilisée même si les chunks récupérés diffèrent
+    assert cache.get("doc", "Combien de temps dure le marché ?", ["c9"], "m", embed=embed) == ANSWER
+    assert cache.get("doc", "Quel est le montant des pénalités ?", ["c1"], "m", embed=embed) is None
+    # Jamais entre documents ou modèles
+    assert cache.get("autre", "Combien de temps dure le marché ?", ["c1"], "m", embed=embed) is None
+    assert cache.get("doc", "Combien de temps dure le marché ?", ["c1"], "autre", embed=embed) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_semantic_tier_respects_invalidation():
+    embed = _embed({"Durée ?": [1.0, 0.0], "Durée du marché ?": [1.0, 0.01]})
+    cache = AnswerCache(max_entries=10, ttl=60, semantic=True)
+    cache.put("doc", "Durée ?", ["c1"], "m", ANSWER, embed=embed)
+    cache.invalidate_document("doc")
+    assert cache.get("doc", "Durée du marché ?", ["c1"], "m", embed=embed) is None
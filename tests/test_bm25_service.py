@@ -0,0 +1,113 @@
+from app.services.bm25_service import BM25Store
+
+
+def _meta(document_id, i):
+    return {"document_id": document_id, "chunk_index": i}
+
+
+def _store(index_dir=None):
+    store = BM25Store(index_dir=index_dir)
+    store.add_batch(
+        ["a_0", "a_1"],
+        ["pénalités de retard applicables au titulaire", "durée du marché et reconduction"],
+        [_meta("A", 0), _meta("A", 1)],
+    )
+    store.add_batch(
+        ["b_0", "b_1"],
+        ["pénalités pour retard de livraison", "assurance responsabilité civile"],
+        [_meta("B", 0), _meta("B", 1)],
+    )
+    return store
+
+
+def test_add_and_query_ranks_matching_chunks():
+    store = _store()
+    assert len(store) == 4
+    assert store.document_ids() == {"A", "B"}
+
+    results = store.query("pénalités retard", top_k=10)
+    assert {r["id"] for r in results} == {"a_0", "b_0"}
+    assert results[0]["score"] >= results[1]["score"] > 0
+    assert results[0]["metadata"]["document_id"] in {"A", "B"}
+    assert results[0]["document"].startswith("pénalités")
+
+
+def test_query_top_k_and_unknown_terms():
+    store = _store()
+    assert len(store.query("pénalités retard", top_k=1)) == 1
+    assert store.query("inexistant", top_k=5) == []
+    assert store.query("pénalités", top_k=0) == []
+
+
+def test_scoped_query_only_returns_target_document():
+    store = _store()
+    results = store.query("pénalités retard", top_k=10, document_ids=["B"])
+    assert [r["id"] for r in results] == ["b_0"]
+    assert store.query("pénalités", top_k=10, document_ids=["inconnu"]) == []
+
+
+def test_scoped_scores_match_global_scores():
+    # Même IDF / avgdl (statistiques du corpus entier) en requête ciblée ou globale
+    store = _store()
+    global_scores = {r["id"]: r["score"] for r in store.query("pénalités retard", top_k=10)}
+    scoped = store.query("pénalités retard", top_k=10, document_ids=["A"])
+    assert scoped[0]["score"] == global_scores["a_0"]
+
+
+def test_remove_document_updates_statistics():
+    store = _store()
+    assert store.remove_document("A") == 2
+    assert store.document_ids() == {"B"}
+    assert len(store) == 2
+    assert [r["id"] for r in store.query("pénalités", top_k=10)] == ["b_0"]
+    assert store.query("reconduction", top_k=10) == []
+
+
+def test_persist_and_reload(tmp_path):
+    store = _store(str(tmp_path))
+    expected = [(r["id"], r["score"]) for r in store.query("pénalités retard", top_k=10)]
+
+    reloaded = BM25Store(index_dir=str(tmp_path))
+    assert reloaded.load() == 2
+    assert reloaded.document_ids() == {"A", "B"}
+    assert [(r["id"], r["score"]) for r in reloaded.query("pénalités retard", top_k=10)] == expected
+    assert reloaded.query("assurance", top_k=1)[0]["document"] == "assurance responsabilité civile"
+
+
+def test_load_drops_documents_missing_from_keep_set(tmp_path):
+    store = BM25Store(index_dir=str(tmp_path))
+    # Segment mixte: A reste indexé, B a été supprimé pendant l'arrêt
+    store.add_batch(
+        ["a_0", "b_0"],
+        ["pénalités de retard", "durée du marché"],
+        [_meta("A", 0), _meta("B", 0)],
+    )
+    store.add_batch(["c_0"], ["assurance"], [_meta("C", 0)])
+
+    reloaded = BM25Store(index_dir=str(tmp_path))
+    assert reloaded.load(keep_document_ids={"A"}) == 1
+    assert reloaded.document_ids() == {"A"}
+    assert len(reloaded) == 1
+    assert reloaded.query("durée", top_k=10) == []
+
+    # Nettoyage persistant: un rechargement sans filtre ne revoit pas B ni C
+    again = BM25Store(index_dir=str(tmp_path))
+    again.load()
+    assert again.document_ids() == {"A"}
+
+
+def test_remove_document_deletes_segment_from_disk(tmp_path):
+    store = _store(str(tmp_path))
+    store.remove_document("A")
+    reloaded = BM25Store(index_dir=str(tmp_path))
+    reloaded.load()
+    assert reloaded.document_ids() == {"B"}
+
+
+def test_load_skips_segments_already_registered(tmp_path):
+    # Upload concurrent du chargement: son segment est déjà en mémoire et sur disque
+    store = _store(str(tmp_path))
+    before = [(r["id"], r["score"]) for r in store.query("pénalités retard", top_k=10)]
+    assert store.load() == 0
+    assert len(store) == 4
+    assert [(r["id"], r["score"]) for r in store.query("pénalités retard", top_k=10)] == before
@@ -0,0 +1,65 @@
+import pytest
+
+from app.services import chunker
+from app.services.chunker import chunk_document
+from tools.stubs import StubTokenizer
+
+TEXT = (
+    "CAHIER DES CLAUSES ADMINISTRATIVES PARTICULIÈRES\n\n"
+    "Article 1 – Objet du marché\n"
+    "Le présent marché porte sur la maintenance des équipements.\n\n"
+    "Article 2 – Durée\n"
+    + " ".join(f"mot{i}" for i in range(120))
+    + "\n"
+)
+
+
+@pytest.fixture(autouse=True)
+def stub_tokenizer(monkeypatch):
+    monkeypatch.setattr(chunker, "_tokenizer", StubTokenizer())
+
+
+def _offsets(text):
+    return StubTokenizer()(text)["offset_mapping"]
+
+
+def test_empty_text_has_no_chunks():
+    assert chunk_document("") == []
+    assert chunk_document("   \n") == []
+
+
+def test_chunks_are_slices_of_the_original_text():
+    chunks = chunk_document(TEXT, max_tokens=40, overlap_tokens=5)
+    assert chunks
+    for ch in chunks:
+        assert ch["text"] == TEXT[ch["char_start"]:ch["char_end"]]
+        assert ch["text"] == ch["text"].strip()
+
+
+def test_sections_follow_dce_structure():
+    chunks = chunk_document(TEXT)
+    assert [c["text"].split("\n")[0] for c in chunks] == [
+        "CAHIER DES CLAUSES ADMINISTRATIVES PARTICULIÈRES",
+        "Article 1 – Objet du marché",
+        "Article 2 – Durée",
+    ]
+
+
+def test_token_offsets_match_the_document_tokenization():
+    offsets = _offsets(TEXT)
+    for ch in chunk_document(TEXT, max_tokens=40, overlap_tokens=5):
+        tokens = offsets[ch["token_start"]:ch["token_end"]]
+        assert tokens[0][0] == ch["char_start"]
+        assert tokens[-1][1] == ch["char_end"]
+        assert ch["token_end"] - ch["token_start"] <= 40
+
+
+def test_long_sections_use_overlapping_windows():
+    chunks = chunk_document(TEXT, max_tokens=40, overlap_tokens=5)
+    windows = [c for c in chunks if c["text"].startswith("Article 2") or c["text"].startswith("mot")]
+    assert len(windows) > 1
+    for prev, nxt in zip(windows, windows[1:]):
+        assert nxt["token_start"] == prev["token_start"] + 35
+        assert nxt["token_start"] < prev["token_end"]
+    # La dernière fenêtre couvre la fin de la section
+    assert windows[-1]["char_end"] == len(TEXT.rstrip())
@@ -0,0 +1,54 @@
+import pytest
+
+from app.services import context_packer
+from app.services.context_packer import CONTEXT_SEPARATOR, fixed_tokens, pack_context
+
+
+@pytest.fixture(autouse=True)
+def char_estimate(monkeypatch):
+    # Pas de tokenizer LLM: estimation par caractères (déterministe)
+    monkeypatch.setattr(context_packer, "get_llm_tokenizer", lambda: None)
+    fixed_tokens.cache_clear()
+    yield
+    fixed_tokens.cache_clear()
+
+
+def _meta(n):
+    return {"n_llm_tokens": n}
+
+
+def test_everything_fits():
+    packed = pack_context(["un", "deux", "trois"], [_meta(10), _meta(10), _meta(10)], budget=100)
+    sep = fixed_tokens(CONTEXT_SEPARATOR)
+    assert packed["indices"] == [0, 1, 2]
+    assert packed["texts"] == ["un", "deux", "trois"]
+    assert packed["context_tokens"] == 30 + 2 * sep
+    assert packed["truncated"] is False
+
+
+def test_skips_chunks_over_budget_and_keeps_shorter_ones():
+    sep = fixed_tokens(CONTEXT_SEPARATOR)
+    metas = [_meta(50), _meta(60), _meta(20)]
+    packed = pack_context(["a", "b", "c"], metas, budget=50 + sep + 20)
+    assert packed["indices"] == [0, 2]
+    assert packed["context_tokens"] <= 50 + sep + 20
+
+
+def test_first_chunk_is_truncated_to_the_budget():
+    text = "mot " * 400
+    packed = pack_context([text, "court"], [_meta(400), _meta(2)], budget=100)
+    assert packed["indices"] == [0]
+    assert packed["truncated"] is True
+    assert packed["context_tokens"] == 100
+    assert 0 < len(packed["texts"][0]) < len(text)
+    assert text.startswith(packed["texts"][0])
+
+
+def test_texts_are_normalized_and_counts_fall_back_to_estimate():
+    packed = pack_context(["  Article 4 \n\n  Durée  "], [{}], budget=100)
+    assert packed["texts"] == ["Article 4 Durée"]
+    assert packed["context_tokens"] == context_packer.estimate_tokens("Article 4 Durée")
+
+
+def test_empty_input():
+    assert pack_context([], [], budget=100) == {"indices": [], "texts": [], "context_tokens": 0, "truncated": False}
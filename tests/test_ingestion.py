@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from app.services import ingestion
+from app.services.catalog import DocumentCatalog
+from app.services.parsers import ParsedDocument
+
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path):
+    """Ingestion sans modèles: parsing et indexation remplacés, catalogue en mémoire."""
+    monkeypatch.chdir(tmp_path)
+    catalog = DocumentCatalog(None)
+    monkeypatch.setattr(ingestion, "CATALOG", catalog)
+    monkeypatch.setattr(ingestion, "classify_piece", lambda text: "CCAP")
+
+    state = {"parsed": 0, "indexed": 0, "entered": threading.Event(), "release": threading.Event()}
+
+    def parse(filename, file_bytes):
+        state["parsed"] += 1
+        state["entered"].set()
+        state["release"].wait(5)
+        if file_bytes == b"corrompu":
+            raise ValueError("PDF illisible")
+        return ParsedDocument(["Article 1 – Objet du marché"])
+
+    def index(document_id, document, doc_type, filename, progress=None):
+        state["indexed"] += 1
+        catalog.upsert(document_id, filename=filename, doc_type=doc_type, chunk_count=1)
+        return 1
+
+    monkeypatch.setattr(ingestion, "parse_document", parse)
+    monkeypatch.setattr(ingestion, "index_document_in_chroma", index)
+    return state
+
+
+def _run_concurrently(first, second, state):
+    results = {}
+    errors = {}
+
+    def run(name, payload):
+        try:
+            results[name] = ingestion.ingest_file(f"{name}.pdf", payload)
+        except Exception as e:
+            errors[name] = e
+
+    t1 = threading.Thread(target=run, args=("first", first))
+    t1.start()
+    assert state["entered"].wait(5)
+    t2 = threading.Thread(target=run, args=("second", second))
+    t2.start()
+    time.sleep(0.1)  # le second upload trouve le hash réservé et attend
+    state["release"].set()
+    t1.join(5)
+    t2.join(5)
+    return results, errors
+
+
+def test_concurrent_duplicate_upload_is_indexed_once(pipeline):
+    results, errors = _run_concurrently(b"%PDF-meme-contenu", b"%PDF-meme-contenu", pipeline)
+    assert not errors
+    assert pipeline["parsed"] == 1
+    assert pipeline["indexed"] == 1
+    assert results["first"]["deduplicated"] is False
+    assert results["second"]["deduplicated"] is True
+    assert results["second"]["document_id"] == results["first"]["document_id"]
+    assert ingestion._inflight == {}
+
+
+def test_failed_ingestion_releases_the_hash(pipeline):
+    results, errors = _run_concurrently(b"corrompu", b"corrompu", pipeline)
+    # Le premier échoue; le second, en attente, reprend l'ingestion (et échoue à son tour)
+    assert set(errors) == {"first", "second"}
+    assert pipeline["parsed"] == 2
+    assert ingestion._inflight == {}
+
+
+def test_sequential_duplicate_is_deduplicated(pipeline):
+    pipeline["release"].set()
+    first = ingestion.ingest_file("a.pdf", b"%PDF-x")
+    second = ingestion.ingest_file("b.pdf", b"%PDF-x")
+    assert second["deduplicated"] is True
+    assert second["document_id"] == first["document_id"]
+    assert pipeline["indexed"] == 1
@@ -0,0 +1,139 @@
+import asyncio
+
+import pytest
+
+from app.services.llm_scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_BATCH,
+    PRIORITY_INTERACTIVE,
+    LLMBusyError,
+    LLMScheduler,
+)
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_grants_by_priority_then_fifo():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=10, max_wait=5)
+        holder = scheduler.enqueue(PRIORITY_INTERACTIVE)
+        assert holder.granted
+
+        order = []
+        tickets = {
+            "background": scheduler.enqueue(PRIORITY_BACKGROUND),
+            "batch_1": scheduler.enqueue(PRIORITY_BATCH),
+            "interactive": scheduler.enqueue(PRIORITY_INTERACTIVE),
+            "batch_2": scheduler.enqueue(PRIORITY_BATCH),
+        }
+        assert tickets["interactive"].position() == 1
+        assert tickets["background"].position() == 4
+
+        holder.release()
+        while len(order) < len(tickets):
+            name = next(n for n, t in tickets.items() if t.granted and n not in order)
+            order.append(name)
+            tickets[name].release()
+        return order
+
+    assert _run(scenario()) == ["interactive", "batch_1", "batch_2", "background"]
+
+
+def test_concurrency_is_bounded():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=2, max_queue=10, max_wait=5)
+        active = peak = 0
+
+        async def job():
+            nonlocal active, peak
+            async with scheduler.slot():
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        await asyncio.gather(*(job() for _ in range(6)))
+        return peak, scheduler.stats()
+
+    peak, stats = _run(scenario())
+    assert peak == 2
+    assert stats["active"] == 0 and stats["waiting"] == 0
+
+
+def test_rejects_when_queue_is_full():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=1, max_wait=5)
+        scheduler.enqueue()
+        scheduler.enqueue()
+        with pytest.raises(LLMBusyError) as exc:
+            scheduler.check_admission()
+        assert exc.value.reason == "queue_full"
+        with pytest.raises(LLMBusyError):
+            scheduler.enqueue()
+        return scheduler.rejected
+
+    assert _run(scenario()) == 2
+
+
+def test_wait_times_out_and_frees_the_place():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=5, max_wait=0.05)
+        holder = scheduler.enqueue()
+        waiting = scheduler.enqueue()
+        with pytest.raises(LLMBusyError) as exc:
+            async for _ in waiting.wait(poll_interval=0.01):
+                pass
+        assert exc.value.reason == "queue_timeout"
+        assert scheduler.stats()["waiting"] == 0
+        holder.release()
+        return scheduler.stats()
+
+    stats = _run(scenario())
+    assert stats["active"] == 0
+
+
+def test_cancelled_waiter_is_skipped():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=5, max_wait=5)
+        holder = scheduler.enqueue()
+        abandoned = scheduler.enqueue(PRIORITY_INTERACTIVE)
+        next_in_line = scheduler.enqueue(PRIORITY_BATCH)
+
+        task = asyncio.ensure_future(_consume(abandoned))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert abandoned.released and not abandoned.granted
+
+        holder.release()
+        assert next_in_line.granted
+        next_in_line.release()
+        return scheduler.stats()
+
+    stats = _run(scenario())
+    assert stats["active"] == 0 and stats["waiting"] == 0
+
+
+async def _consume(ticket):
+    async for _ in ticket.wait(poll_interval=0.01):
+        pass
+
+
+def test_background_tickets_ignore_the_max_wait():
+    async def scenario():
+        scheduler = LLMScheduler(max_concurrency=1, max_queue=5, max_wait=0.02)
+        holder = scheduler.enqueue()
+        background = scheduler.enqueue(PRIORITY_BACKGROUND)
+        task = asyncio.ensure_future(_consume(background))
+        await asyncio.sleep(0.1)
+        assert not task.done()
+        holder.release()
+        await task
+        granted = background.granted
+        background.release()
+        return granted
+
+    assert _run(scenario()) is True
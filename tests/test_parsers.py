@@ -0,0 +1,66 @@
+from app.services.parsers import ParsedDocument
+
+PAGES = ["Article 1 – Objet", "Article 2 – Durée du marché", "Article 3 – Prix"]
+
+
+def _doc(pages=PAGES):
+    return ParsedDocument(list(pages))
+
+
+def test_full_text_and_page_starts():
+    doc = _doc()
+    assert doc.full_text == "\n".join(PAGES)
+    for start, text in zip(doc.page_starts, PAGES):
+        assert doc.full_text[start:start + len(text)] == text
+    assert len(doc) == 3
+
+
+def test_offset_exactly_at_page_start():
+    doc = _doc()
+    for number, start in enumerate(doc.page_starts, start=1):
+        assert doc.page_at(start) == number
+    # Dernier caractère d'une page et séparateur qui la suit: encore la même page
+    assert doc.page_at(doc.page_starts[1] - 2) == 1
+    assert doc.page_at(doc.page_starts[1] - 1) == 1
+
+
+def test_chunk_within_one_page():
+    doc = _doc()
+    start = doc.page_starts[1]
+    assert doc.page_span(start, start + len(PAGES[1])) == (2, 2)
+
+
+def test_chunk_crossing_a_page_boundary():
+    doc = _doc()
+    start = doc.full_text.index("Objet")
+    end = doc.full_text.index("Durée") + len("Durée")
+    assert doc.page_span(start, end) == (1, 2)
+    assert doc.page_span(0, len(doc.full_text)) == (1, 3)
+
+
+def test_chunk_ending_on_a_separator_stays_on_its_page():
+    # Fin exclusive: un chunk qui s'arrête juste avant la page suivante n'y déborde pas
+    doc = _doc()
+    assert doc.page_span(0, doc.page_starts[1]) == (1, 1)
+
+
+def test_empty_pages_keep_the_numbering():
+    doc = _doc(["Article 1", "", "", "Article 4"])
+    assert doc.page_starts == [0, 10, 11, 12]
+    start = doc.full_text.index("Article 4")
+    assert doc.page_at(start) == 4
+    assert doc.page_span(start, len(doc.full_text)) == (4, 4)
+    assert doc.page_span(0, len(doc.full_text)) == (1, 4)
+
+
+def test_empty_and_single_page_documents():
+    assert ParsedDocument([]).full_text == ""
+    assert ParsedDocument([]).page_at(0) == 1
+    single = _doc(["Acte d'engagement"])
+    assert single.page_span(0, len(single.full_text)) == (1, 1)
+
+
+def test_to_dict_exposes_page_offsets():
+    pages = _doc().to_dict()["pages"]
+    assert [p["page"] for p in pages] == [1, 2, 3]
+    assert [p["char_start"] for p in pages] == _doc().page_starts
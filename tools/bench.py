@@ -0,0 +1,249 @@
+"""Micro-benchmarks CPU des chemins chauds d'ingestion et de recherche (sans réseau).
+
+    python -m tools.bench [--sizes 10,100,1000] [--stub] [--save-baseline]
+    python -m tools.bench --sizes 10,100,1000,10000 --baseline tools/bench_baseline.json
+
+Mesure, sur un corpus DCE synthétique (`tools.synthetic_dce`):
+  - clean_ocr_noise (par page), chunk_text (par document), ParsedDocument.page_span
+    (par chunk), reciprocal_rank_fusion (par requête), generate_embeddings (par chunk);
+  - BM25Store: ajout par document puis requêtes ciblées (un document) et globales,
+    pour chaque taille de corpus (10 → 10 000 documents).
+Temps = médiane des répétitions par opération; pic mémoire = tracemalloc sur une
+exécution séparée (allocations Python/NumPy, hors mémoire native torch/tokenizers).
+
+`--stub` remplace le modèle d'embedding et le tokenizer du chunker par ceux de
+`tools.stubs` (poids absents, exécution rapide): les temps de ces étapes
+ne sont alors comparables qu'à une baseline elle-même mesurée avec `--stub`.
+
+Comparaison à la baseline: code de sortie 1 si une mesure dépasse la référence de plus
+de `--threshold` (temps) ou `--mem-threshold` (pic mémoire).
+"""
+from __future__ import annotations
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+# Aucun accès réseau (Hugging Face) ni cache disque d'embeddings: on mesure le calcul
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+os.environ["CHUNK_CACHE_PATH"] = ""
+os.environ["QUERY_CACHE_PATH"] = ""
+
+from tools.stubs import install_stubs
+from tools.synthetic_dce import SAMPLE_QUESTIONS as QUESTIONS, generate_corpus, generate_document
+
+DEFAULT_BASELINE = os.path.join("tools", "bench_baseline.json")
+
+
+# ---------- Mesure ----------
+def measure(fn: Callable[[], Any], ops: int, repeat: int, memory: bool = True) -> Dict[str, Any]:
+    """Médiane / min en µs par opération sur `repeat` exécutions, puis pic mémoire (une exécution)."""
+    fn()  # warm-up (imports, caches regex, chargement paresseux)
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    result = {
+        "ops": ops,
+        "median_us": statistics.median(runs) / ops * 1e6,
+        "min_us": min(runs) / ops * 1e6,
+    }
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def _fake_rrf_inputs(rng: random.Random, top_k: int) -> Tuple[list, list]:
+    """Résultats vectoriels et BM25 de taille top_k, recouvrement ~50 % (cas réel)."""
+    pool = [f"doc_{i}" for i in range(top_k * 2)]
+    vec_ids = rng.sample(pool, top_k)
+    bm25_ids = rng.sample(pool, top_k)
+    vec = [(f"texte {h}", rng.random(), {"chunk_index": i}, h) for i, h in enumerate(vec_ids)]
+    bm25 = [{"id": h, "document": f"texte {h}", "metadata": {"chunk_index": i}, "score": rng.random()}
+            for i, h in enumerate(bm25_ids)]
+    return vec, bm25
+
+
+def bench_functions(args) -> Dict[str, Dict[str, Any]]:
+    """Fonctions dont le coût ne dépend pas de la taille du corpus (échantillon de documents)."""
+    from app.services.chunker import chunk_document, chunk_text
+    from app.services.embedder import generate_embeddings
+    from app.services.parsers import ParsedDocument, clean_ocr_noise
+    from app.services.retriever import reciprocal_rank_fusion
+
+    sample = [generate_document(i, pages=args.pages, chars_per_page=args.chars_per_page, noise=1.0)
+              for i in range(args.sample)]
+    raw_pages = [p for d in sample for p in d["pages"]]
+    parsed = [ParsedDocument([clean_ocr_noise(p) for p in d["pages"]]) for d in sample]
+    texts = [doc.full_text for doc in parsed]
+    spans = [chunk_document(t) for t in texts]
+    n_spans = sum(len(s) for s in spans)
+    chunks = [c["text"] for s in spans for c in s][:args.embed_chunks]
+    rng = random.Random(0)
+    rrf_inputs = [_fake_rrf_inputs(rng, 17) for _ in range(200)]
+
+    results = {}
+    results["clean_ocr_noise"] = measure(
+        lambda: [clean_ocr_noise(p) for p in raw_pages], len(raw_pages), args.repeat,
+    )
+    results["chunk_text"] = measure(lambda: [chunk_text(t) for t in texts], len(texts), args.repeat)
+    results["page_span"] = measure(
+        lambda: [doc.page_span(c["char_start"], c["char_end"]) for doc, s in zip(parsed, spans) for c in s],
+        n_spans, args.repeat,
+    )
+    results["reciprocal_rank_fusion"] = measure(
+        lambda: [reciprocal_rank_fusion(v, b) for v, b in rrf_inputs], len(rrf_inputs), args.repeat,
+    )
+    # Le modèle réel est lent sur CPU: moins de répétitions
+    results["generate_embeddings"] = measure(
+        lambda: generate_embeddings(chunks), len(chunks), min(args.repeat, 3),
+    )
+    return results
+
+
+def bench_bm25(size: int, args) -> Dict[str, Dict[str, Any]]:
+    """BM25 sur un corpus de `size` documents, un segment par document (comme à l'ingestion)."""
+    from app.services.bm25_service import BM25Store
+    from app.services.chunker import chunk_text
+    from app.services.parsers import clean_ocr_noise
+
+    t0 = time.perf_counter()
+    batches = []
+    for doc in generate_corpus(size, pages=args.pages, chars_per_page=args.chars_per_page):
+        chunks = chunk_text("\n".join(clean_ocr_noise(p) for p in doc["pages"]))
+        ids = [f"{doc['document_id']}_{i}" for i in range(len(chunks))]
+        metas = [{"document_id": doc["document_id"], "chunk_index": i} for i in range(len(chunks))]
+        batches.append((ids, chunks, metas))
+    n_chunks = sum(len(b[0]) for b in batches)
+    print(f"[BENCH] corpus {size} documents, {n_chunks} chunks ({time.perf_counter() - t0:.1f}s)")
+
+    def build() -> BM25Store:
+        store = BM25Store()  # en mémoire (pas d'index_dir): mesure du calcul, pas du disque
+        for ids, chunks, metas in batches:
+            store.add_batch(ids, chunks, metas)
+        return store
+
+    results = {f"bm25.add@{size}": measure(build, len(batches), max(1, min(args.repeat, 3)))}
+    store = build()
+    rng = random.Random(size)
+    targets = [batches[rng.randrange(len(batches))][2][0]["document_id"] for _ in range(50)]
+    results[f"bm25.query_document@{size}"] = measure(
+        lambda: [store.query(q, top_k=17, document_ids=[d]) for d in targets for q in QUESTIONS[:2]],
+        len(targets) * 2, args.repeat, memory=False,
+    )
+    results[f"bm25.query_all@{size}"] = measure(
+        lambda: [store.query(q, top_k=17) for q in QUESTIONS], len(QUESTIONS), args.repeat,
+    )
+    results[f"bm25.add@{size}"]["chunks"] = n_chunks
+    return results
+
+
+# ---------- Baseline ----------
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Any], threshold: float, mem_threshold: float) -> List[str]:
+    regressions = []
+    for name, cur in results.items():
+        ref = baseline.get("results", {}).get(name)
+        if not ref:
+            continue
+        if cur["median_us"] > ref["median_us"] * (1 + threshold):
+            regressions.append(f"{name}: {ref['median_us']:.1f} → {cur['median_us']:.1f} µs/op (x{cur['median_us'] / ref['median_us']:.2f})")
+        cur_mb, ref_mb = cur.get("peak_mb"), ref.get("peak_mb")
+        # Écart absolu minimal de 1 Mo pour ignorer le bruit des petites allocations
+        if cur_mb is not None and ref_mb is not None and cur_mb > ref_mb * (1 + mem_threshold) and cur_mb - ref_mb > 1:
+            regressions.append(f"{name}: pic mémoire {ref_mb:.1f} → {cur_mb:.1f} Mo")
+    return regressions
+
+
+def _print_table(results: Dict[str, Dict[str, Any]], baseline: Optional[Dict[str, Any]]) -> None:
+    ref = (baseline or {}).get("results", {})
+    print(f"{'mesure':<32} {'ops':>7} {'médiane µs/op':>14} {'min µs/op':>11} {'pic Mo':>8} {'vs baseline':>12}")
+    for name, r in results.items():
+        delta = ""
+        if name in ref:
+            delta = f"x{r['median_us'] / ref[name]['median_us']:.2f}"
+        peak = f"{r['peak_mb']:.1f}" if "peak_mb" in r else "-"
+        print(f"{name:<32} {r['ops']:>7} {r['median_us']:>14.1f} {r['min_us']:>11.1f} {peak:>8} {delta:>12}")
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="10,100,1000", help="tailles de corpus pour BM25 (ex: 10,100,1000,10000)")
+    ap.add_argument("--pages", type=int, default=6)
+    ap.add_argument("--chars-per-page", type=int, default=2000)
+    ap.add_argument("--sample", type=int, default=20, help="documents pour les mesures par fonction")
+    ap.add_argument("--embed-chunks", type=int, default=32)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--stub", action="store_true", help="modèle d'embedding et tokenizer factices")
+    ap.add_argument("--only", default="", help="préfixes de mesures à garder (ex: bm25,chunk_text)")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE)
+    ap.add_argument("--save-baseline", action="store_true", help="écrit les résultats comme nouvelle baseline")
+    ap.add_argument("--threshold", type=float, default=0.25, help="régression si temps > baseline × (1 + seuil)")
+    ap.add_argument("--mem-threshold", type=float, default=0.5)
+    args = ap.parse_args(argv)
+
+    if args.stub:
+        install_stubs()
+
+    only = [p for p in args.only.split(",") if p]
+    results: Dict[str, Dict[str, Any]] = {}
+    if not only or any(not p.startswith("bm25") for p in only):
+        results.update(bench_functions(args))
+    if not only or any(p.startswith("bm25") for p in only):
+        for size in [int(s) for s in args.sizes.split(",") if s]:
+            results.update(bench_bm25(size, args))
+    if only:
+        results = {k: v for k, v in results.items() if any(k.startswith(p) for p in only)}
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("stub") != args.stub:
+            print(f"[BENCH][WARN] baseline mesurée avec stub={baseline.get('stub')}, run actuel stub={args.stub}")
+
+    _print_table(results, baseline)
+    try:
+        import resource
+        print(f"[BENCH] RSS max du process: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} Mo")
+    except ImportError:
+        pass
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpu_count": os.cpu_count(),
+                "stub": args.stub,
+                "results": results,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"[BENCH] baseline écrite → {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print(f"[BENCH] pas de baseline ({args.baseline}); --save-baseline pour en créer une")
+        return 0
+    regressions = compare(results, baseline, args.threshold, args.mem_threshold)
+    for line in regressions:
+        print(f"[REGRESSION] {line}")
+    print("[BENCH] OK" if not regressions else f"[BENCH] {len(regressions)} régression(s)")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
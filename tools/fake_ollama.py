@@ -0,0 +1,144 @@
+"""Faux serveur Ollama pour les tests de charge (aucun modèle, aucun GPU).
+
+    python -m tools.fake_ollama --port 11435 --first-token-ms 300 --tokens-per-s 40
+
+Implémente ce que l'API utilise: POST /api/chat (NDJSON en streaming, ou une réponse
+unique si "stream": false), POST /api/generate (keep_alive du warm-up) et GET /api/tags.
+Latence du premier token, débit de tokens, gigue et taux d'erreur sont configurables;
+le dernier fragment porte prompt_eval_count / eval_count / eval_duration comme Ollama.
+"""
+from __future__ import annotations
+from typing import Any, Dict
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANSWER = (
+    "D'après l'article 4 du CCAP, le marché est conclu pour une durée initiale de 12 mois "
+    "reconductible tacitement 3 fois, soit une durée maximale de 4 ans. "
+)
+
+
+class FakeOllamaConfig:
+    def __init__(
+        self,
+        first_token_ms: float = 300,
+        tokens_per_s: float = 40,
+        tokens: int = 80,
+        jitter: float = 0.2,
+        error_rate: float = 0.0,
+    ):
+        self.first_token_ms = first_token_ms
+        self.tokens_per_s = tokens_per_s
+        self.tokens = tokens
+        self.jitter = jitter
+        self.error_rate = error_rate
+
+    def _vary(self, seconds: float) -> float:
+        return max(0.0, seconds * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def first_token_delay(self) -> float:
+        return self._vary(self.first_token_ms / 1000)
+
+    def token_delay(self) -> float:
+        return self._vary(1 / self.tokens_per_s) if self.tokens_per_s > 0 else 0.0
+
+
+def _answer_tokens(n: int):
+    words = ANSWER.split(" ")
+    return [words[i % len(words)] + " " for i in range(n)]
+
+
+def _prompt_tokens(body: Dict[str, Any]) -> int:
+    text = "".join(m.get("content", "") for m in body.get("messages") or [])
+    return max(1, len(text) // 4)
+
+
+def create_app(config: FakeOllamaConfig) -> FastAPI:
+    app = FastAPI(title="fake-ollama")
+    app.state.stats = {"chat": 0, "active": 0, "max_active": 0, "errors": 0}
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        stats = app.state.stats
+        stats["chat"] += 1
+        if random.random() < config.error_rate:
+            stats["errors"] += 1
+            return JSONResponse(status_code=500, content={"error": "fake-ollama: erreur injectée"})
+
+        async def stream():
+            stats["active"] += 1
+            stats["max_active"] = max(stats["max_active"], stats["active"])
+            t0 = time.perf_counter()
+            try:
+                await asyncio.sleep(config.first_token_delay())
+                tokens = _answer_tokens(config.tokens)
+                eval_start = time.perf_counter()
+                for i, tok in enumerate(tokens):
+                    if i:
+                        await asyncio.sleep(config.token_delay())
+                    yield json.dumps({"model": model, "message": {"role": "assistant", "content": tok}, "done": False}) + "\n"
+                now = time.perf_counter()
+                yield json.dumps({
+                    "model": model,
+                    "message": {"role": "assistant", "content": ""},
+                    "done": True,
+                    "total_duration": int((now - t0) * 1e9),
+                    "prompt_eval_count": _prompt_tokens(body),
+                    "eval_count": len(tokens),
+                    "eval_duration": int((now - eval_start) * 1e9),
+                }) + "\n"
+            finally:
+                stats["active"] -= 1
+
+        if body.get("stream", True) is False:
+            parts = [json.loads(line) async for line in stream()]
+            content = "".join(p["message"]["content"] for p in parts)
+            return {**parts[-1], "message": {"role": "assistant", "content": content}}
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+    @app.post("/api/generate")
+    async def generate(request: Request):
+        body = await request.json()
+        return {"model": body.get("model", "fake"), "response": "", "done": True}
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": "fake"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return app.state.stats
+
+    return app
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11435)
+    ap.add_argument("--first-token-ms", type=float, default=300)
+    ap.add_argument("--tokens-per-s", type=float, default=40)
+    ap.add_argument("--tokens", type=int, default=80, help="tokens par réponse")
+    ap.add_argument("--jitter", type=float, default=0.2, help="variation relative des délais (±)")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="part des appels en HTTP 500")
+    args = ap.parse_args(argv)
+
+    import uvicorn
+
+    config = FakeOllamaConfig(args.first_token_ms, args.tokens_per_s, args.tokens, args.jitter, args.error_rate)
+    print(f"[FAKE OLLAMA] http://{args.host}:{args.port} | premier token={args.first_token_ms}ms | {args.tokens_per_s} tokens/s × {args.tokens}")
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,424 @@
+"""Test de charge HTTP de bout en bout: /query et /upload-index à 5, 20 et 50 utilisateurs.
+
+    python -m tools.loadtest                      # lance l'API + un faux Ollama, puis les scénarios
+    python -m tools.loadtest --users 5,20 --duration 30 --out storage/loadtest/report.json
+    python -m tools.loadtest --base-url http://localhost:8000 --no-fake-ollama   # API déjà lancée
+
+Par défaut l'API réelle (uvicorn app.main:app) est démarrée dans un dossier de travail
+isolé (--workdir: chroma_db, bm25_index, storage) et branchée sur `tools.fake_ollama`
+(débit et latences configurables), cache de réponses désactivé pour que chaque requête
+passe par le LLM. Un document synthétique est indexé avant les scénarios.
+
+Scénarios, pour chaque niveau d'utilisateurs:
+  - query         : N utilisateurs enchaînent des POST /query;
+  - upload        : N utilisateurs enchaînent des POST /upload-index (PDF synthétiques),
+                    latence HTTP (202) et durée jusqu'à l'indexation (GET /jobs/{id});
+  - query+upload  : N utilisateurs en /query pendant que N/5 utilisateurs uploadent.
+Rapport: requêtes, erreurs, débit, p50/p90/p99/max. Une sonde GET /healthz (toutes les
+--probe-ms) mesure la latence de la boucle d'événements: /healthz ne fait rien, toute
+attente vient d'un traitement synchrone qui bloque la boucle. Au-delà de --block-ms
+(p99 de la sonde) ou si les requêtes ralentissent pendant les uploads (p99 query+upload /
+p99 query > --stall-ratio), le scénario est signalé; code de sortie 1.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from tools.synthetic_dce import SAMPLE_QUESTIONS, generate_document, to_pdf
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Percentile au rang le plus proche (valeurs en secondes)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(latencies: List[float], errors: Dict[str, int], elapsed: float) -> Dict[str, Any]:
+    ms = lambda v: None if v is None else round(v * 1000, 1)
+    return {
+        "requests": len(latencies) + sum(errors.values()),
+        "ok": len(latencies),
+        "errors": dict(errors),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p90_ms": ms(percentile(latencies, 90)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(max(latencies) if latencies else None),
+    }
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors: Dict[str, int] = {}
+
+    def ok(self, seconds: float) -> None:
+        self.latencies.append(seconds)
+
+    def error(self, kind: str) -> None:
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+# ---------- Processus (API, faux Ollama) ----------
+class Services:
+    """Démarre le faux Ollama et l'API réelle dans des sous-processus, les arrête à la sortie."""
+
+    def __init__(self, args):
+        self.args = args
+        self.procs: List[subprocess.Popen] = []
+        self.logs = []
+        self.base_url = args.base_url
+
+    def _spawn(self, cmd: List[str], env: Dict[str, str], cwd: str, log_name: str) -> subprocess.Popen:
+        log = open(os.path.join(cwd, log_name), "ab")
+        self.logs.append(log)
+        proc = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+        self.procs.append(proc)
+        return proc
+
+    def start(self) -> None:
+        args = self.args
+        if self.base_url:
+            # API externe: elle utilise son propre OLLAMA_BASE_URL
+            print(f"[LOADTEST] API existante → {self.base_url}")
+            return
+        workdir = os.path.abspath(args.workdir)
+        os.makedirs(workdir, exist_ok=True)
+        env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+
+        if not args.no_fake_ollama:
+            port = _free_port()
+            self._spawn([
+                sys.executable, "-m", "tools.fake_ollama", "--port", str(port),
+                "--first-token-ms", str(args.first_token_ms), "--tokens-per-s", str(args.tokens_per_s),
+                "--tokens", str(args.tokens), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate),
+            ], env, workdir, "fake_ollama.log")
+            env["OLLAMA_BASE_URL"] = f"http://127.0.0.1:{port}"
+            print(f"[LOADTEST] faux Ollama → {env['OLLAMA_BASE_URL']}")
+
+        if not args.answer_cache:
+            env["ANSWER_CACHE_SIZE"] = "0"
+        port = _free_port()
+        self._spawn([
+            sys.executable, "-m", "uvicorn", "app.main:app", "--app-dir", ROOT,
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+        ], env, workdir, "api.log")
+        self.base_url = f"http://127.0.0.1:{port}"
+        print(f"[LOADTEST] API → {self.base_url} (workdir={workdir}, logs: api.log)")
+
+    def stop(self) -> None:
+        for proc in self.procs:
+            proc.terminate()
+        for proc in self.procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        for log in self.logs:
+            log.close()
+
+
+# ---------- Client ----------
+class LoadClient:
+    def __init__(self, base_url: str, token: Optional[str], timeout: float):
+        headers = {"Authorization": f"Bearer {token}"} if token else {}
+        limits = httpx.Limits(max_connections=None, max_keepalive_connections=200)
+        self.http = httpx.AsyncClient(base_url=base_url, headers=headers, timeout=timeout, limits=limits)
+        # Sonde sur une connexion à part: jamais en attente derrière les requêtes de charge
+        self.probe_http = httpx.AsyncClient(base_url=base_url, timeout=timeout)
+        self.document_id: Optional[str] = None
+        self._docs = itertools.count(1000)
+
+    async def aclose(self) -> None:
+        await self.http.aclose()
+        await self.probe_http.aclose()
+
+    async def wait_ready(self, timeout: float) -> Dict[str, Any]:
+        deadline = time.monotonic() + timeout
+        last: Dict[str, Any] = {}
+        while time.monotonic() < deadline:
+            try:
+                resp = await self.probe_http.get("/readyz")
+                last = resp.json()
+                if resp.status_code == 200 or last.get("status") == "error":
+                    return last
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(1)
+        raise RuntimeError(f"API pas prête après {timeout:.0f}s: {last}")
+
+    def _pdf(self) -> tuple:
+        doc = generate_document(next(self._docs), pages=4)
+        return doc["filename"], to_pdf(doc["pages"])
+
+    async def upload(self) -> str:
+        filename, data = self._pdf()
+        resp = await self.http.post("/upload-index", files=[("files", (filename, data, "application/pdf"))])
+        resp.raise_for_status()
+        return resp.json()["job_id"]
+
+    async def wait_job(self, job_id: str, timeout: float) -> Dict[str, Any]:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = (await self.http.get(f"/jobs/{job_id}")).json()
+            if job["status"] in {"done", "error"}:
+                return job
+            await asyncio.sleep(0.5)
+        raise TimeoutError(f"job {job_id} non terminé après {timeout:.0f}s")
+
+    async def seed(self, timeout: float) -> str:
+        job = await self.wait_job(await self.upload(), timeout)
+        if job["status"] != "done" or not job["document_ids"]:
+            raise RuntimeError(f"Indexation du document de départ en échec: {job}")
+        self.document_id = job["document_ids"][0]
+        return self.document_id
+
+    async def query_user(self, stop_at: float, rec: Recorder) -> None:
+        while time.monotonic() < stop_at:
+            body = {"question": random.choice(SAMPLE_QUESTIONS), "document_id": self.document_id}
+            t0 = time.perf_counter()
+            try:
+                resp = await self.http.post("/query", json=body)
+            except httpx.HTTPError as e:
+                rec.error(type(e).__name__)
+                continue
+            if resp.status_code == 200:
+                rec.ok(time.perf_counter() - t0)
+            else:
+                rec.error(str(resp.status_code))
+                if resp.status_code == 503:
+                    await asyncio.sleep(float(resp.headers.get("Retry-After", "1")))
+
+    async def upload_user(self, stop_at: float, rec: Recorder, ingest: Recorder, jobs: List[asyncio.Task], drain: float) -> None:
+        while time.monotonic() < stop_at:
+            filename, data = self._pdf()
+            t0 = time.perf_counter()
+            try:
+                resp = await self.http.post("/upload-index", files=[("files", (filename, data, "application/pdf"))])
+            except httpx.HTTPError as e:
+                rec.error(type(e).__name__)
+                continue
+            if resp.status_code != 202:
+                rec.error(str(resp.status_code))
+                await asyncio.sleep(1)
+                continue
+            rec.ok(time.perf_counter() - t0)
+            jobs.append(asyncio.create_task(self._track_job(resp.json()["job_id"], t0, ingest, drain)))
+
+    async def _track_job(self, job_id: str, t0: float, ingest: Recorder, drain: float) -> None:
+        try:
+            job = await self.wait_job(job_id, drain)
+        except Exception as e:
+            ingest.error(type(e).__name__)
+            return
+        if job["status"] == "done":
+            ingest.ok(time.perf_counter() - t0)
+        else:
+            ingest.error("job_error")
+
+    async def probe(self, stop: asyncio.Event, interval: float, samples: List[float]) -> None:
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            try:
+                await self.probe_http.get("/healthz")
+                samples.append(time.perf_counter() - t0)
+            except httpx.HTTPError:
+                pass
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+async def run_scenario(client: LoadClient, name: str, users: int, args) -> Dict[str, Any]:
+    query_rec, upload_rec, ingest_rec = Recorder(), Recorder(), Recorder()
+    probe_samples: List[float] = []
+    jobs: List[asyncio.Task] = []
+    stop_probe = asyncio.Event()
+    probe_task = asyncio.create_task(client.probe(stop_probe, args.probe_ms / 1000, probe_samples))
+
+    t0 = time.monotonic()
+    stop_at = t0 + args.duration
+    tasks = []
+    if name in {"query", "query+upload"}:
+        tasks += [client.query_user(stop_at, query_rec) for _ in range(users)]
+    if name == "upload":
+        tasks += [client.upload_user(stop_at, upload_rec, ingest_rec, jobs, args.drain) for _ in range(users)]
+    if name == "query+upload":
+        tasks += [client.upload_user(stop_at, upload_rec, ingest_rec, jobs, args.drain) for _ in range(max(1, users // 5))]
+    if tasks:
+        await asyncio.gather(*tasks)
+    else:
+        await asyncio.sleep(args.duration)
+    elapsed = time.monotonic() - t0
+    stop_probe.set()
+    await probe_task
+    # Les jobs lancés pendant le scénario sont suivis jusqu'à leur fin (ou --drain)
+    if jobs:
+        await asyncio.gather(*jobs)
+
+    result: Dict[str, Any] = {"scenario": name, "users": users, "duration_s": round(elapsed, 1)}
+    if name in {"query", "query+upload"}:
+        result["query"] = summarize(query_rec.latencies, query_rec.errors, elapsed)
+    if name in {"upload", "query+upload"}:
+        result["upload"] = summarize(upload_rec.latencies, upload_rec.errors, elapsed)
+        result["ingest"] = summarize(ingest_rec.latencies, ingest_rec.errors, elapsed)
+    result["loop_probe"] = summarize(probe_samples, {}, elapsed)
+    return result
+
+
+def detect_blocking(results: List[Dict[str, Any]], block_ms: float, stall_ratio: float) -> List[str]:
+    alerts = []
+    query_p99 = {r["users"]: r["query"]["p99_ms"] for r in results if r["scenario"] == "query" and r["query"]["p99_ms"]}
+    for r in results:
+        probe_p99 = r["loop_probe"]["p99_ms"]
+        if probe_p99 is not None and probe_p99 > block_ms:
+            alerts.append(
+                f"{r['scenario']}@{r['users']}: boucle d'événements bloquée "
+                f"(sonde /healthz p99={probe_p99}ms, max={r['loop_probe']['max_ms']}ms > {block_ms}ms)"
+            )
+        if r["scenario"] == "query+upload" and r["users"] in query_p99 and r["query"]["p99_ms"]:
+            ratio = r["query"]["p99_ms"] / query_p99[r["users"]]
+            if ratio > stall_ratio:
+                alerts.append(
+                    f"query+upload@{r['users']}: requêtes ralenties pendant les uploads "
+                    f"(p99 {query_p99[r['users']]}ms → {r['query']['p99_ms']}ms, x{ratio:.1f})"
+                )
+    return alerts
+
+
+def print_report(results: List[Dict[str, Any]]) -> None:
+    print(f"{'scénario':<14} {'users':>5} {'mesure':<8} {'req':>6} {'err':>5} {'req/s':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for r in results:
+        for part in ("query", "upload", "ingest", "loop_probe"):
+            s = r.get(part)
+            if not s:
+                continue
+            label = "probe" if part == "loop_probe" else part
+            fmt = lambda v: "-" if v is None else f"{v:.1f}"
+            print(
+                f"{r['scenario']:<14} {r['users']:>5} {label:<8} {s['requests']:>6} {sum(s['errors'].values()):>5} "
+                f"{s['throughput_rps']:>7.2f} {fmt(s['p50_ms']):>8} {fmt(s['p90_ms']):>8} {fmt(s['p99_ms']):>8} {fmt(s['max_ms']):>8}"
+            )
+
+
+async def _login(base_url: str, username: str, password: str) -> str:
+    async with httpx.AsyncClient(base_url=base_url) as http:
+        resp = await http.post("/login", data={"username": username, "password": password})
+        resp.raise_for_status()
+        return resp.json()["access_token"]
+
+
+async def run(args) -> int:
+    services = Services(args)
+    services.start()
+    client: Optional[LoadClient] = None
+    try:
+        token = args.token
+        ready_probe = LoadClient(services.base_url, None, args.timeout)
+        try:
+            readiness = await ready_probe.wait_ready(args.ready_timeout)
+        finally:
+            await ready_probe.aclose()
+        print(f"[LOADTEST] readyz → {readiness.get('status')}")
+        if not token and args.username:
+            token = await _login(services.base_url, args.username, args.password)
+
+        client = LoadClient(services.base_url, token, args.timeout)
+        document_id = await client.seed(args.drain)
+        print(f"[LOADTEST] document de référence indexé: {document_id}")
+
+        # Référence de la sonde à vide
+        idle = await run_scenario(client, "idle", 0, argparse.Namespace(**{**vars(args), "duration": min(5.0, args.duration)}))
+        results: List[Dict[str, Any]] = [idle]
+        scenarios = [s for s in args.scenarios.split(",") if s]
+        for users in [int(u) for u in args.users.split(",") if u]:
+            for name in scenarios:
+                print(f"[LOADTEST] {name} × {users} utilisateurs ({args.duration:.0f}s)…")
+                results.append(await run_scenario(client, name, users, args))
+
+        print_report(results)
+        alerts = detect_blocking(results, args.block_ms, args.stall_ratio)
+        for alert in alerts:
+            print(f"[BLOCKING] {alert}")
+        print("[LOADTEST] OK" if not alerts else f"[LOADTEST] {len(alerts)} alerte(s)")
+
+        if args.out:
+            os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump({
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "base_url": services.base_url,
+                    "fake_ollama": None if args.no_fake_ollama else {
+                        "first_token_ms": args.first_token_ms,
+                        "tokens_per_s": args.tokens_per_s,
+                        "tokens": args.tokens,
+                        "jitter": args.jitter,
+                        "error_rate": args.error_rate,
+                    },
+                    "readiness": readiness,
+                    "results": results,
+                    "alerts": alerts,
+                }, f, indent=2, ensure_ascii=False)
+            print(f"[LOADTEST] rapport → {args.out}")
+        return 1 if alerts else 0
+    finally:
+        if client is not None:
+            await client.aclose()
+        services.stop()
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--base-url", default="", help="API déjà lancée (sinon démarrée par l'outil)")
+    ap.add_argument("--workdir", default=os.path.join("storage", "loadtest"))
+    ap.add_argument("--users", default="5,20,50")
+    ap.add_argument("--scenarios", default="query,upload,query+upload")
+    ap.add_argument("--duration", type=float, default=60.0, help="secondes par scénario")
+    ap.add_argument("--timeout", type=float, default=120.0, help="timeout HTTP par requête")
+    ap.add_argument("--ready-timeout", type=float, default=600.0)
+    ap.add_argument("--drain", type=float, default=600.0, help="attente max de fin d'indexation d'un job")
+    ap.add_argument("--probe-ms", type=float, default=50.0)
+    ap.add_argument("--block-ms", type=float, default=100.0)
+    ap.add_argument("--stall-ratio", type=float, default=2.0)
+    ap.add_argument("--answer-cache", action="store_true", help="garde le cache de réponses de l'API lancée")
+    ap.add_argument("--token", default="")
+    ap.add_argument("--username", default="")
+    ap.add_argument("--password", default="")
+    ap.add_argument("--out", default="")
+    # Faux Ollama
+    ap.add_argument("--no-fake-ollama", action="store_true", help="API lancée avec OLLAMA_BASE_URL tel quel")
+    ap.add_argument("--first-token-ms", type=float, default=300)
+    ap.add_argument("--tokens-per-s", type=float, default=40)
+    ap.add_argument("--tokens", type=int, default=80)
+    ap.add_argument("--jitter", type=float, default=0.2)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    args = ap.parse_args(argv)
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+"""Outils du backend d'embedding ONNX int8.
+
+    python -m tools.onnx_embeddings export [--out DIR]
+    python -m tools.onnx_embeddings parity [--corpus FICHIER] [--min-cosine 0.99]
+
+`export` convertit le modèle HF en ONNX puis le quantifie (int8 dynamique).
+`parity` compare les embeddings torch et onnx-int8 sur un corpus échantillon
+(une phrase par ligne) et affiche le débit de chaque backend. Code de sortie 1
+si la cosinus minimale est sous le seuil.
+"""
+from __future__ import annotations
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+from app.services.embedding_backends import (
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_ONNX_DIR,
+    ONNX_MODEL_FILE,
+    OnnxInt8Backend,
+    TorchBackend,
+)
+
+SAMPLE_CORPUS = [
+    "Article 4 – Durée du marché : le marché est conclu pour une durée initiale de 12 mois.",
+    "Le marché pourra être reconduit tacitement 3 fois par période de 12 mois.",
+    "Pénalités de retard : 1/1000e du montant HT par jour calendaire de retard.",
+    "Le délai d'intervention est de 4 heures ouvrables pour les pannes de niveau 1.",
+    "Critères d'attribution : prix 40 %, valeur technique 60 %.",
+    "Une retenue de garantie de 5 % est appliquée sur chaque acompte.",
+    "Le titulaire assure une astreinte 24h/24 et 7j/7 pendant toute la durée du marché.",
+    "Les prestations de maintenance préventive sont réalisées selon le planning annexé au CCTP.",
+    "Le règlement de consultation précise les modalités de remise des offres.",
+    "ACTE D'ENGAGEMENT – le candidat s'engage sur la base de son offre.",
+]
+
+
+def export(out_dir: str) -> None:
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(EMBEDDING_MODEL_NAME)
+    model = AutoModel.from_pretrained(EMBEDDING_MODEL_NAME).eval()
+    dummy = tokenizer(["Durée du marché"], return_tensors="pt")
+    fp32_path = os.path.join(out_dir, "model_fp32.onnx")
+
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            (dummy["input_ids"], dummy["attention_mask"]),
+            fp32_path,
+            input_names=["input_ids", "attention_mask"],
+            output_names=["last_hidden_state"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "seq"},
+                "attention_mask": {0: "batch", 1: "seq"},
+                "last_hidden_state": {0: "batch", 1: "seq"},
+            },
+            opset_version=17,
+        )
+    quantize_dynamic(fp32_path, os.path.join(out_dir, ONNX_MODEL_FILE), weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    tokenizer.save_pretrained(out_dir)
+    print(f"[EXPORT] OK → {os.path.join(out_dir, ONNX_MODEL_FILE)}")
+
+
+def _timed_encode(backend, texts, batch_size):
+    backend.encode(texts[:1], batch_size=1)  # warm-up
+    t0 = time.perf_counter()
+    vecs = backend.encode(texts, batch_size=batch_size)
+    return vecs, time.perf_counter() - t0
+
+
+def parity(corpus_path: str | None, onnx_dir: str, batch_size: int, min_cosine: float) -> int:
+    if corpus_path:
+        with open(corpus_path, "r", encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        texts = SAMPLE_CORPUS
+
+    ref, t_ref = _timed_encode(TorchBackend(EMBEDDING_MODEL_NAME), texts, batch_size)
+    cand, t_cand = _timed_encode(OnnxInt8Backend(onnx_dir), texts, batch_size)
+
+    ref_n = ref / np.linalg.norm(ref, axis=1, keepdims=True)
+    cand_n = cand / np.linalg.norm(cand, axis=1, keepdims=True)
+    cos = (ref_n * cand_n).sum(axis=1)
+    # Accord sur le plus proche voisin de chaque texte (hors lui-même)
+    sim_ref, sim_cand = ref_n @ ref_n.T, cand_n @ cand_n.T
+    np.fill_diagonal(sim_ref, -1)
+    np.fill_diagonal(sim_cand, -1)
+    nn_agree = float((sim_ref.argmax(axis=1) == sim_cand.argmax(axis=1)).mean())
+
+    print(f"[PARITY] textes={len(texts)} | batch_size={batch_size}")
+    print(f"[PARITY] cosinus torch/onnx-int8 → moyenne={cos.mean():.4f} min={cos.min():.4f}")
+    print(f"[PARITY] accord plus proche voisin={nn_agree:.2%}")
+    print(f"[THROUGHPUT] torch     : {len(texts) / t_ref:8.1f} textes/s ({t_ref:.2f}s)")
+    print(f"[THROUGHPUT] onnx-int8 : {len(texts) / t_cand:8.1f} textes/s ({t_cand:.2f}s) | x{t_ref / t_cand:.2f}")
+
+    ok = float(cos.min()) >= min_cosine
+    print("[PARITY] OK" if ok else f"[PARITY] ÉCHEC: cosinus min < {min_cosine}")
+    return 0 if ok else 1
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p_exp = sub.add_parser("export")
+    p_exp.add_argument("--out", default=EMBEDDING_ONNX_DIR)
+    p_par = sub.add_parser("parity")
+    p_par.add_argument("--corpus", default=None)
+    p_par.add_argument("--onnx-dir", default=EMBEDDING_ONNX_DIR)
+    p_par.add_argument("--batch-size", type=int, default=8)
+    p_par.add_argument("--min-cosine", type=float, default=0.99)
+    args = ap.parse_args(argv)
+
+    if args.cmd == "export":
+        export(args.out)
+        return 0
+    return parity(args.corpus, args.onnx_dir, args.batch_size, args.min_cosine)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
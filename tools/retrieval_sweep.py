@@ -0,0 +1,378 @@
+"""Balayage des paramètres de recherche: rappel vs tokens de prompt vs latence.
+
+    python -m tools.retrieval_sweep --golden golden.jsonl --out-profile config/retrieval_profile.json
+    python -m tools.retrieval_sweep --synthetic 20 --stub --workdir storage/sweep
+
+Jeu de référence (JSON lines), une question par ligne:
+    {"document_id": "...", "question": "...", "expected_pages": [3, 4]}
+    {"document_id": "...", "question": "...", "expected_chunks": [12]}   # chunk_index
+(`page` / `chunk_index` seuls acceptés aussi). Les documents doivent être indexés dans
+les stores du dossier courant (ou de --workdir). `--synthetic N` génère N documents
+(`tools.synthetic_dce`), les indexe dans --workdir et écrit golden.jsonl à côté.
+
+Grille: top_k (candidats vectoriels et BM25), k de la RRF, poids vecteur:BM25, plafond
+de chunks et similarité minimale. Pour chaque combinaison: rappel dans le prompt (une
+page/chunk attendu parmi les chunks retenus après le budget de tokens), rappel avant
+budget, MRR, tokens de prompt moyens et latence estimée de bout en bout:
+recherche mesurée + prefill (tokens / --prefill-tps) + génération (--answer-tokens /
+--decode-tps). `--llm` mesure la latence Ollama réelle pour le profil actuel et le gagnant.
+
+Gagnant: parmi les combinaisons à moins de --recall-tolerance du meilleur rappel, le moins
+de tokens de prompt (puis la latence la plus basse); top_k est ensuite choisi palier par
+palier (taille des documents). `--out-profile` écrit le profil, chargé par l'API via
+RETRIEVAL_PROFILE_PATH.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("HF_HUB_OFFLINE", "1")
+os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# ---------- Jeu de référence ----------
+def _as_list(value) -> List[int]:
+    if value is None:
+        return []
+    return [int(v) for v in (value if isinstance(value, list) else [value])]
+
+
+def load_golden(path: str) -> List[Dict[str, Any]]:
+    items = []
+    with open(path, "r", encoding="utf-8") as f:
+        for n, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            row = json.loads(line)
+            item = {
+                "document_id": row["document_id"],
+                "question": row["question"],
+                "expected_pages": _as_list(row.get("expected_pages", row.get("page"))),
+                "expected_chunks": _as_list(row.get("expected_chunks", row.get("chunk_index"))),
+            }
+            if not item["expected_pages"] and not item["expected_chunks"]:
+                raise ValueError(f"{path}:{n}: expected_pages ou expected_chunks requis")
+            items.append(item)
+    return items
+
+
+def build_synthetic(docs: int, pages: int, questions_per_doc: int, seed: int, golden_path: str) -> List[Dict[str, Any]]:
+    """Génère et indexe `docs` documents synthétiques; une question par article tiré au sort."""
+    from app.services.parsers import ParsedDocument, clean_ocr_noise
+    from app.services.vector_service import index_document_in_chroma
+    from tools.synthetic_dce import ARTICLE_QUESTIONS, generate_document
+
+    rng = random.Random(seed)
+    items = []
+    for i in range(docs):
+        # Tailles variées pour couvrir les paliers (petits et gros documents)
+        doc = generate_document(i, pages=rng.choice([1, 2, pages, pages * 3]), seed=seed)
+        document = ParsedDocument([clean_ocr_noise(p) for p in doc["pages"]])
+        index_document_in_chroma(doc["document_id"], document, doc["doc_type"], doc["filename"])
+        by_title: Dict[str, List[int]] = {}
+        for article in doc["articles"]:
+            by_title.setdefault(article["title"], []).append(article["page"])
+        for title in rng.sample(sorted(by_title), k=min(questions_per_doc, len(by_title))):
+            items.append({
+                "document_id": doc["document_id"],
+                "question": ARTICLE_QUESTIONS[title],
+                "expected_pages": sorted(set(by_title[title])),
+                "expected_chunks": [],
+            })
+    with open(golden_path, "w", encoding="utf-8") as f:
+        for item in items:
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+    print(f"[SWEEP] {docs} documents indexés, {len(items)} questions → {golden_path}")
+    return items
+
+
+def is_hit(meta: Dict[str, Any], item: Dict[str, Any]) -> bool:
+    if item["expected_chunks"] and meta.get("chunk_index") in item["expected_chunks"]:
+        return True
+    page = meta.get("page")
+    if page is None:
+        return False
+    page_end = meta.get("page_end") or page
+    return any(page <= p <= page_end for p in item["expected_pages"])
+
+
+# ---------- Évaluation ----------
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def _weights(value: str) -> List[Tuple[float, float]]:
+    out = []
+    for pair in value.split(","):
+        if pair:
+            vec, bm25 = pair.split(":")
+            out.append((float(vec), float(bm25)))
+    return out
+
+
+def _similarities(value: str) -> List[Optional[float]]:
+    return [None if v.lower() in {"none", ""} else float(v) for v in value.split(",")]
+
+
+class Sweep:
+    def __init__(self, items: List[Dict[str, Any]], args):
+        from app.services.catalog import CATALOG
+        from app.services.retrieval_profile import RETRIEVAL_PROFILE
+
+        self.items = items
+        self.args = args
+        self.current = RETRIEVAL_PROFILE
+        # Palier de chaque document (bornes du profil actuel, gardées dans le profil produit)
+        self.tier_of: Dict[str, int] = {}
+        for item in items:
+            doc_id = item["document_id"]
+            if doc_id not in self.tier_of:
+                total = CATALOG.chunk_count(doc_id) or 0
+                self.tier_of[doc_id] = self.current.tiers.index(self.current.tier_for(total))
+        self.candidates: Dict[int, List[Tuple[Any, Any]]] = {}
+        self.search_ms: Dict[int, List[float]] = {}
+
+    def collect(self, top_ks: List[int]) -> None:
+        """Candidats vectoriels + BM25 de chaque question pour chaque top_k (recherche chronométrée)."""
+        from app.services.embedder import embed_queries
+        from app.services.retriever import search_candidates
+
+        # Embeddings des questions en cache d'abord: la latence mesurée est celle de la recherche
+        embed_queries([item["question"] for item in self.items])
+        for top_k in top_ks:
+            results, timings = [], []
+            for item in self.items:
+                t0 = time.perf_counter()
+                results.append(search_candidates([item["question"]], item["document_id"], top_k)[0])
+                timings.append((time.perf_counter() - t0) * 1000)
+            self.candidates[top_k] = results
+            self.search_ms[top_k] = timings
+
+    def evaluate(self, top_k_of, profile) -> Dict[str, Any]:
+        """Métriques d'un profil; `top_k_of(item)` donne le top_k utilisé pour la question."""
+        from app.services.rag_engine import prepare_prompt
+        from app.services.retriever import select_chunks
+
+        args = self.args
+        rows = []
+        for i, item in enumerate(self.items):
+            top_k = top_k_of(item)
+            ranked_vec, bm25_results = self.candidates[top_k][i]
+            t0 = time.perf_counter()
+            top = select_chunks(ranked_vec, bm25_results, profile, 0, profile.min_similarity)
+            fusion_ms = (time.perf_counter() - t0) * 1000
+            chunks = [doc for (doc, _, _, _) in top]
+            metas = [meta or {} for (_, _, meta, _) in top]
+            _, _, used_metas, usage = prepare_prompt(item["question"], chunks, metas)
+            ranks = [r for r, meta in enumerate(metas, start=1) if is_hit(meta, item)]
+            retrieval_ms = self.search_ms[top_k][i] + fusion_ms
+            rows.append({
+                "tier": self.tier_of[item["document_id"]],
+                "hit": any(is_hit(m, item) for m in used_metas),
+                "hit_retrieved": bool(ranks),
+                "rr": 1.0 / ranks[0] if ranks else 0.0,
+                "chunks": len(used_metas),
+                "prompt_tokens": usage["prompt_tokens"],
+                "retrieval_ms": retrieval_ms,
+                "e2e_ms": retrieval_ms
+                + usage["prompt_tokens"] / args.prefill_tps * 1000
+                + args.answer_tokens / args.decode_tps * 1000,
+            })
+        return {"overall": _aggregate(rows), "tiers": {t: _aggregate([r for r in rows if r["tier"] == t]) for t in sorted({r["tier"] for r in rows})}}
+
+
+def _aggregate(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if not rows:
+        return {}
+    n = len(rows)
+    return {
+        "questions": n,
+        "recall": sum(r["hit"] for r in rows) / n,
+        "recall_retrieved": sum(r["hit_retrieved"] for r in rows) / n,
+        "mrr": sum(r["rr"] for r in rows) / n,
+        "chunks": sum(r["chunks"] for r in rows) / n,
+        "prompt_tokens": sum(r["prompt_tokens"] for r in rows) / n,
+        "retrieval_ms_p50": statistics.median(r["retrieval_ms"] for r in rows),
+        "e2e_ms_p50": statistics.median(r["e2e_ms"] for r in rows),
+    }
+
+
+def pick(candidates: List[Tuple[Any, Dict[str, Any]]], tolerance: float):
+    """Rappel dans la tolérance du meilleur, puis le moins de tokens, puis la latence."""
+    candidates = [c for c in candidates if c[1]]
+    best = max(m["recall"] for _, m in candidates)
+    eligible = [c for c in candidates if c[1]["recall"] >= best - tolerance]
+    return min(eligible, key=lambda c: (c[1]["prompt_tokens"], c[1]["e2e_ms_p50"]))
+
+
+def _row(label: str, m: Dict[str, Any]) -> str:
+    return (
+        f"{label:<44} {m['recall']:>6.1%} {m['recall_retrieved']:>7.1%} {m['mrr']:>5.2f} {m['chunks']:>6.1f} "
+        f"{m['prompt_tokens']:>7.0f} {m['retrieval_ms_p50']:>8.1f} {m['e2e_ms_p50']:>8.0f}"
+    )
+
+
+async def _llm_latency(items: List[Dict[str, Any]], profiles, sample: int) -> List[float]:
+    """Latence Ollama réelle (ms, médiane) de chaque profil sur un échantillon de questions."""
+    from app.services.llm_service import LLM_CLIENT
+    from app.services.rag_engine import prepare_prompt
+    from app.services.retriever import retrieve_top_chunks_batch
+
+    medians = []
+    try:
+        for profile in profiles:
+            timings = []
+            for item in items[:sample]:
+                t0 = time.perf_counter()
+                chunks, metas, _, _ = retrieve_top_chunks_batch([item["question"]], item["document_id"], profile=profile)[0]
+                prompt, _, _, _ = prepare_prompt(item["question"], chunks, metas)
+                await LLM_CLIENT.chat(prompt)
+                timings.append((time.perf_counter() - t0) * 1000)
+            medians.append(statistics.median(timings) if timings else 0.0)
+    finally:
+        await LLM_CLIENT.aclose()
+    return medians
+
+
+def run(args) -> int:
+    from app.services.retrieval_profile import RetrievalProfile
+
+    if args.synthetic:
+        items = build_synthetic(args.synthetic, args.pages, args.questions_per_doc, args.seed, args.golden or os.path.abspath("golden.jsonl"))
+    else:
+        items = load_golden(args.golden)
+    if not items:
+        print("[SWEEP] jeu de référence vide")
+        return 1
+
+    sweep = Sweep(items, args)
+    current = sweep.current
+    top_ks = _int_list(args.top_k)
+    current_top_ks = sorted({int(t["top_k"]) for t in current.tiers})
+    sweep.collect(sorted(set(top_ks) | set(current_top_ks)))
+    print(f"[SWEEP] {len(items)} questions, {len(sweep.tier_of)} documents, paliers={sorted(set(sweep.tier_of.values()))}")
+
+    def tiered(profile):
+        return lambda item: int(profile.tiers[sweep.tier_of[item["document_id"]]]["top_k"])
+
+    baseline = sweep.evaluate(tiered(current), current)
+
+    grid = list(itertools.product(
+        top_ks, _int_list(args.rrf_k), _weights(args.weights), _int_list(args.max_chunks), _similarities(args.min_similarity),
+    ))
+    print(f"[SWEEP] {len(grid)} combinaisons…")
+    results = []
+    for top_k, rrf_k, (w_vec, w_bm25), max_chunks, min_sim in grid:
+        profile = RetrievalProfile(
+            tiers=current.tiers, rrf_k=rrf_k, vector_weight=w_vec, bm25_weight=w_bm25,
+            max_chunks=max_chunks, min_similarity=min_sim,
+        )
+        metrics = sweep.evaluate(lambda item, k=top_k: k, profile)
+        results.append(({"top_k": top_k, "rrf_k": rrf_k, "weights": (w_vec, w_bm25), "max_chunks": max_chunks, "min_similarity": min_sim}, metrics))
+
+    # Gagnant global, puis top_k par palier à paramètres de fusion fixés
+    best_cfg, _ = pick([(cfg, m["overall"]) for cfg, m in results], args.recall_tolerance)
+    same_fusion = [
+        (cfg, m) for cfg, m in results
+        if (cfg["rrf_k"], cfg["weights"], cfg["max_chunks"], cfg["min_similarity"])
+        == (best_cfg["rrf_k"], best_cfg["weights"], best_cfg["max_chunks"], best_cfg["min_similarity"])
+    ]
+    tiers = [dict(t) for t in current.tiers]
+    for t in sorted(set(sweep.tier_of.values())):
+        tier_cfg, _ = pick([(cfg, m["tiers"].get(t, {})) for cfg, m in same_fusion], args.recall_tolerance)
+        tiers[t]["top_k"] = tier_cfg["top_k"]
+    winner = RetrievalProfile(
+        tiers=tiers, rrf_k=best_cfg["rrf_k"], vector_weight=best_cfg["weights"][0], bm25_weight=best_cfg["weights"][1],
+        max_chunks=best_cfg["max_chunks"], min_similarity=best_cfg["min_similarity"],
+        name="sweep-" + time.strftime("%Y%m%d"),
+    )
+    winner_metrics = sweep.evaluate(tiered(winner), winner)
+
+    header = f"{'configuration':<44} {'rappel':>6} {'avant':>7} {'MRR':>5} {'chunks':>6} {'tokens':>7} {'rech ms':>8} {'e2e ms':>8}"
+    print(header)
+    print(_row(f"actuel ({current.name})", baseline["overall"]))
+    ranked = sorted(results, key=lambda r: (-r[1]["overall"]["recall"], r[1]["overall"]["prompt_tokens"]))
+    for cfg, m in ranked[:args.show]:
+        label = (f"top_k={cfg['top_k']} rrf={cfg['rrf_k']} w={cfg['weights'][0]:g}:{cfg['weights'][1]:g} "
+                 f"max={cfg['max_chunks']} sim={cfg['min_similarity']}")
+        print(_row(label, m["overall"]))
+    print(_row(f"gagnant ({winner.name})", winner_metrics["overall"]))
+    for t, m in winner_metrics["tiers"].items():
+        limit = winner.tiers[t].get("max_doc_chunks")
+        print(_row(f"  palier ≤{limit if limit is not None else '∞'} chunks: top_k={winner.tiers[t]['top_k']}", m))
+
+    llm = {}
+    if args.llm:
+        llm["current_ms_p50"], llm["winner_ms_p50"] = asyncio.run(_llm_latency(items, [current, winner], args.llm_sample))
+        print(f"[SWEEP] latence LLM mesurée (médiane): actuel={llm['current_ms_p50']:.0f}ms gagnant={llm['winner_ms_p50']:.0f}ms")
+
+    if args.out_profile:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out_profile)), exist_ok=True)
+        with open(args.out_profile, "w", encoding="utf-8") as f:
+            json.dump({
+                **winner.to_dict(),
+                # Trace de l'évaluation (ignorée au chargement)
+                "sweep": {
+                    "golden": args.golden or None,
+                    "questions": len(items),
+                    "baseline": baseline["overall"],
+                    "winner": winner_metrics["overall"],
+                    "llm": llm or None,
+                },
+            }, f, indent=2, ensure_ascii=False)
+        print(f"[SWEEP] profil écrit → {args.out_profile} (RETRIEVAL_PROFILE_PATH={args.out_profile})")
+    return 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--golden", default="", help="jeu de référence JSON lines")
+    ap.add_argument("--workdir", default="", help="dossier des stores (chroma_db, bm25_index, storage)")
+    ap.add_argument("--synthetic", type=int, default=0, help="génère et indexe N documents synthétiques")
+    ap.add_argument("--pages", type=int, default=6)
+    ap.add_argument("--questions-per-doc", type=int, default=4)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--stub", action="store_true", help="modèle d'embedding et tokenizer factices (tools.stubs)")
+    ap.add_argument("--top-k", default="4,6,8,12,17,25")
+    ap.add_argument("--rrf-k", default="10,30,60,100")
+    ap.add_argument("--weights", default="1:1,1:0.5,0.5:1", help="poids vecteur:BM25")
+    ap.add_argument("--max-chunks", default="3,4,6,8,10")
+    ap.add_argument("--min-similarity", default="none", help="ex: none,0.3,0.4")
+    ap.add_argument("--recall-tolerance", type=float, default=0.02)
+    ap.add_argument("--prefill-tps", type=float, default=400.0, help="tokens de prompt/s du LLM (estimation)")
+    ap.add_argument("--decode-tps", type=float, default=25.0, help="tokens générés/s du LLM (estimation)")
+    ap.add_argument("--answer-tokens", type=int, default=120)
+    ap.add_argument("--llm", action="store_true", help="mesure la latence Ollama réelle (actuel vs gagnant)")
+    ap.add_argument("--llm-sample", type=int, default=10)
+    ap.add_argument("--show", type=int, default=15, help="combinaisons affichées")
+    ap.add_argument("--out-profile", default="")
+    args = ap.parse_args(argv)
+
+    if not args.golden and not args.synthetic:
+        ap.error("--golden ou --synthetic requis")
+    # Chemins relatifs au dossier de lancement, stores relatifs à --workdir
+    args.golden = os.path.abspath(args.golden) if args.golden else ""
+    args.out_profile = os.path.abspath(args.out_profile) if args.out_profile else ""
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+        os.chdir(args.workdir)
+        if ROOT not in sys.path:
+            sys.path.insert(0, ROOT)
+    if args.stub:
+        from tools.stubs import install_stubs
+        install_stubs()
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+"""Modèle d'embedding et tokenizer factices pour les outils hors ligne (`--stub`).
+
+Déterministes et sans poids à télécharger: les temps et la qualité de recherche ne sont
+pas ceux du vrai modèle, mais les chemins de code (chunking, index, fusion) sont les mêmes.
+"""
+from __future__ import annotations
+from typing import Any, Dict, List
+import re
+import zlib
+
+import numpy as np
+
+STUB_DIM = 1024
+
+
+class StubTokenizer:
+    """Tokenizer mot/ponctuation exposant `offset_mapping` comme le tokenizer rapide HF."""
+
+    _re = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+    def __call__(self, text: str, **_: Any) -> Dict[str, Any]:
+        return {"offset_mapping": [m.span() for m in self._re.finditer(text)]}
+
+
+class StubEmbeddingModel:
+    """Embeddings par hachage des mots (déterministes, normalisés), même interface qu'un backend."""
+
+    name = "stub"
+
+    def __init__(self, dim: int = STUB_DIM):
+        self.dim = dim
+
+    def encode(self, texts: List[str], batch_size: int = 8) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for word in text.lower().split():
+                out[i, zlib.crc32(word.encode("utf-8")) % self.dim] += 1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-9)
+
+
+def install_stubs() -> None:
+    """Remplace le tokenizer du chunker et le modèle d'embedding chargés paresseusement."""
+    from app.services import chunker, embedder
+
+    chunker._tokenizer = StubTokenizer()
+    embedder._model = StubEmbeddingModel()
@@ -0,0 +1,269 @@
+"""Corpus DCE synthétique (RC, CCAP, CCTP, AE), déterministe et sans réseau.
+
+    python -m tools.synthetic_dce --docs 10 --pages 6 --out storage/synthetic
+
+Chaque document est une suite d'articles ("Article N – Titre") répartis sur des pages
+de taille fixe, avec le bruit typique d'une extraction PDF/OCR (césures en fin de
+ligne, lettres espacées, espaces multiples) sur une partie des pages.
+Utilisé par les benchmarks (`tools.bench`) et le test de charge (`tools.loadtest`, via
+`to_pdf`); `--out` écrit un .txt par document (`--pdf`: un PDF texte par document).
+"""
+from __future__ import annotations
+from typing import Any, Dict, Iterator, List
+import argparse
+import os
+import random
+import sys
+import textwrap
+
+DOC_TYPES = {
+    "RC": "RÈGLEMENT DE LA CONSULTATION",
+    "CCAP": "CAHIER DES CLAUSES ADMINISTRATIVES PARTICULIÈRES",
+    "CCTP": "CAHIER DES CLAUSES TECHNIQUES PARTICULIÈRES",
+    "AE": "ACTE D'ENGAGEMENT",
+}
+
+# (titre d'article, phrases possibles); les champs {…} sont tirés au hasard
+ARTICLES = [
+    ("Objet du marché", [
+        "Le présent marché a pour objet la maintenance {maintenance} des installations {installation} du site de {ville}.",
+        "Les prestations comprennent la fourniture des pièces détachées et la main d'œuvre associée.",
+        "Le marché est passé selon la procédure {procedure} en application du code de la commande publique.",
+    ]),
+    ("Durée du marché", [
+        "Le marché est conclu pour une durée initiale de {mois} mois à compter de sa notification.",
+        "Il pourra être reconduit tacitement {reconductions} fois par période de {mois} mois.",
+        "La durée totale du marché ne pourra excéder {annees} ans.",
+    ]),
+    ("Pénalités de retard", [
+        "En cas de retard, le titulaire encourt une pénalité de {penalite} € HT par jour calendaire.",
+        "Les pénalités sont plafonnées à {plafond} % du montant total HT du marché.",
+        "Par dérogation à l'article 14 du CCAG, les pénalités ne sont pas exonérées en dessous de 1 000 €.",
+    ]),
+    ("Délais d'intervention", [
+        "Le délai d'intervention est de {heures} heures ouvrables pour les pannes bloquantes.",
+        "Le titulaire assure une astreinte 24h/24 et 7j/7 pendant toute la durée du marché.",
+        "La remise en service doit intervenir dans un délai de {jours} jours ouvrés.",
+    ]),
+    ("Prix et variation des prix", [
+        "Les prix sont fermes et actualisables selon l'indice {indice}.",
+        "Le prix forfaitaire annuel est révisé à chaque date anniversaire du marché.",
+        "Les prestations hors forfait sont rémunérées sur la base du bordereau des prix unitaires.",
+    ]),
+    ("Garanties financières", [
+        "Une retenue de garantie de {retenue} % est appliquée sur chaque acompte.",
+        "La retenue de garantie peut être remplacée par une garantie à première demande.",
+        "Une avance de {avance} % est accordée au titulaire sauf renonciation expresse.",
+    ]),
+    ("Assurances", [
+        "Le titulaire justifie d'une assurance de responsabilité civile professionnelle.",
+        "L'attestation d'assurance est produite dans un délai de {jours} jours à compter de la notification.",
+    ]),
+    ("Critères d'attribution", [
+        "Les offres sont jugées selon les critères suivants : prix {prix} %, valeur technique {technique} %.",
+        "La valeur technique est appréciée au regard du mémoire technique remis par le candidat.",
+    ]),
+    ("Résiliation", [
+        "Le pouvoir adjudicateur peut résilier le marché pour motif d'intérêt général.",
+        "En cas de résiliation aux torts du titulaire, aucune indemnité ne lui est due.",
+    ]),
+    ("Sous-traitance", [
+        "Le titulaire peut sous-traiter l'exécution de certaines parties du marché sous réserve d'acceptation.",
+        "La sous-traitance totale du marché est interdite.",
+    ]),
+]
+
+FIELDS = {
+    "maintenance": ["préventive", "curative", "préventive et curative"],
+    "installation": ["de chauffage", "de ventilation", "électriques", "d'ascenseurs", "de sécurité incendie"],
+    "ville": ["Lyon", "Nantes", "Lille", "Bordeaux", "Rennes", "Dijon"],
+    "procedure": ["adaptée", "d'appel d'offres ouvert", "négociée"],
+    "mois": ["6", "12", "24", "36"],
+    "reconductions": ["1", "2", "3"],
+    "annees": ["2", "3", "4"],
+    "penalite": ["100", "150", "300", "500"],
+    "plafond": ["5", "10"],
+    "heures": ["2", "4", "8", "24"],
+    "jours": ["5", "8", "15", "30"],
+    "indice": ["BT01", "ICHT-E", "TP01"],
+    "retenue": ["3", "5"],
+    "avance": ["5", "10", "20"],
+    "prix": ["40", "50", "60"],
+    "technique": ["40", "50", "60"],
+}
+
+
+# Questions types d'un chargé d'affaires (benchmarks, test de charge)
+SAMPLE_QUESTIONS = [
+    "Quelle est la durée du marché ?",
+    "Le marché est-il reconductible ?",
+    "Quel est le montant des pénalités de retard ?",
+    "Quel est le délai d'intervention en cas de panne ?",
+    "Y a-t-il une retenue de garantie ?",
+    "Quels sont les critères d'attribution ?",
+    "Les prix sont-ils révisables ?",
+    "La sous-traitance est-elle autorisée ?",
+]
+
+
+# Question dont la réponse est dans l'article du même titre (jeux de référence synthétiques)
+ARTICLE_QUESTIONS = {
+    "Objet du marché": "Quel est l'objet du marché ?",
+    "Durée du marché": "Quelle est la durée du marché ?",
+    "Pénalités de retard": "Quel est le montant des pénalités de retard ?",
+    "Délais d'intervention": "Quel est le délai d'intervention en cas de panne ?",
+    "Prix et variation des prix": "Les prix sont-ils révisables ?",
+    "Garanties financières": "Y a-t-il une retenue de garantie ?",
+    "Assurances": "Quelles assurances le titulaire doit-il fournir ?",
+    "Critères d'attribution": "Quels sont les critères d'attribution ?",
+    "Résiliation": "Dans quels cas le marché peut-il être résilié ?",
+    "Sous-traitance": "La sous-traitance est-elle autorisée ?",
+}
+
+
+def _fill(rng: random.Random, sentence: str) -> str:
+    return sentence.format(**{k: rng.choice(v) for k, v in FIELDS.items()})
+
+
+def _add_noise(rng: random.Random, page: str) -> str:
+    """Artefacts d'extraction: césures, lettres espacées, espaces multiples."""
+    lines = page.split("\n")
+    for i, line in enumerate(lines):
+        words = line.split(" ")
+        r = rng.random()
+        if r < 0.15 and len(words) > 3:
+            j = rng.randrange(len(words))
+            if len(words[j]) >= 6:
+                words[j] = " ".join(words[j])
+        elif r < 0.3:
+            words = [w + ("  " if rng.random() < 0.2 else "") for w in words]
+        lines[i] = " ".join(words)
+        if rng.random() < 0.2 and len(lines[i]) > 10 and lines[i][-1].isalpha():
+            cut = len(lines[i]) - rng.randint(2, 4)
+            lines[i] = lines[i][:cut] + "-\n" + lines[i][cut:]
+    return "\n".join(lines)
+
+
+def generate_document(
+    index: int,
+    pages: int = 6,
+    chars_per_page: int = 2000,
+    noise: float = 0.3,
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """Un document: {"document_id", "doc_type", "filename", "pages": [texte brut par page],
+    "articles": [{"number", "title", "page"}]} (page du titre de chaque article, avant bruit)."""
+    rng = random.Random(seed * 1_000_003 + index)
+    doc_type = list(DOC_TYPES)[index % len(DOC_TYPES)]
+    blocks: List[str] = [DOC_TYPES[doc_type]]
+    target = pages * chars_per_page
+    size, number = len(blocks[0]), 1
+    while size < target:
+        title, sentences = ARTICLES[(number - 1 + index) % len(ARTICLES)]
+        body = " ".join(_fill(rng, s) for s in rng.sample(sentences, k=rng.randint(1, len(sentences))))
+        block = f"Article {number} – {title}\n" + textwrap.fill(body, width=90)
+        blocks.append(block)
+        size += len(block) + 2
+        number += 1
+
+    # Pagination à taille fixe, en coupant entre deux lignes
+    out_pages: List[str] = []
+    current: List[str] = []
+    articles: List[Dict[str, Any]] = []
+    length = 0
+    for line in "\n\n".join(blocks).split("\n"):
+        if length + len(line) > chars_per_page and current and len(out_pages) < pages - 1:
+            out_pages.append("\n".join(current))
+            current, length = [], 0
+        if line.startswith("Article "):
+            number, title = line[len("Article "):].split(" – ", 1)
+            articles.append({"number": int(number), "title": title, "page": len(out_pages) + 1})
+        current.append(line)
+        length += len(line) + 1
+    out_pages.append("\n".join(current))
+    out_pages = [_add_noise(rng, p) if rng.random() < noise else p for p in out_pages]
+
+    document_id = f"synthetic-{index:05d}"
+    return {
+        "document_id": document_id,
+        "doc_type": doc_type,
+        "filename": f"{document_id}_{doc_type}.pdf",
+        "pages": out_pages,
+        "articles": articles,
+    }
+
+
+def generate_corpus(docs: int, **kwargs: Any) -> Iterator[Dict[str, Any]]:
+    """Documents générés un à un (un corpus de 10 000 documents n'est jamais tenu en mémoire)."""
+    for i in range(docs):
+        yield generate_document(i, **kwargs)
+
+
+def _pdf_string(line: str) -> bytes:
+    raw = line.encode("cp1252", errors="replace")  # WinAnsiEncoding des polices standard
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def to_pdf(pages: List[str]) -> bytes:
+    """PDF minimal à couche texte (Helvetica, une page A4 par page), lisible par pdfplumber."""
+    objects: List[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # /Pages, complété une fois les pages numérotées
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+    kids = []
+    for page in pages:
+        lines = [b"BT /F1 9 Tf 11 TL 40 800 Td"]
+        for line in page.split("\n"):
+            lines.append(_pdf_string(line) + b" Tj T*")
+        lines.append(b"ET")
+        stream = b"\n".join(lines)
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        kids.append(b"%d 0 R" % len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [" + b" ".join(kids) + b"] /Count %d >>" % len(kids)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for i, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % i + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for off in offsets:
+        out += b"%010d 00000 n \n" % off
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=10)
+    ap.add_argument("--pages", type=int, default=6)
+    ap.add_argument("--chars-per-page", type=int, default=2000)
+    ap.add_argument("--noise", type=float, default=0.3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--out", default=os.path.join("storage", "synthetic"))
+    ap.add_argument("--pdf", action="store_true")
+    args = ap.parse_args(argv)
+
+    os.makedirs(args.out, exist_ok=True)
+    for doc in generate_corpus(
+        args.docs, pages=args.pages, chars_per_page=args.chars_per_page, noise=args.noise, seed=args.seed,
+    ):
+        if args.pdf:
+            with open(os.path.join(args.out, doc["filename"]), "wb") as f:
+                f.write(to_pdf(doc["pages"]))
+            continue
+        with open(os.path.join(args.out, doc["document_id"] + ".txt"), "w", encoding="utf-8") as f:
+            f.write("\f".join(doc["pages"]))
+    print(f"[SYNTHETIC] {args.docs} document(s) → {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())